@@ -0,0 +1,150 @@
+"""Query plans and timings for the Shopify hot-path lookups.
+
+Seeds a disposable database with cloned partners and products, then prints
+``EXPLAIN ANALYZE`` output and median timings for the searches run by
+``sync_order``, ``sync_customer``, ``_missing_order_skus`` and the
+``handle_inventory_update`` webhook, first with the module's indexes and then
+with them dropped (inside a savepoint that is rolled back).
+
+Run it from an Odoo shell, never on a production database:
+
+    BENCH_PARTNERS=1000000 BENCH_PRODUCTS=200000 \
+        odoo-bin shell -d shopify_bench < benchmarks/index_benchmark.py
+"""
+import os
+import statistics
+import time
+
+PARTNERS = int(os.environ.get('BENCH_PARTNERS', 1000000))
+PRODUCTS = int(os.environ.get('BENCH_PRODUCTS', 200000))
+REPEAT = int(os.environ.get('BENCH_REPEAT', 20))
+
+MODULE_INDEXES = [
+    'res_partner__email_index',
+    'res_partner_email_shopify_trgm_index',
+    'product_product__shopify_product_id_index',
+    'product_product_default_code_shopify_trgm_index',
+]
+
+
+def clone_rows(cr, table, source_id, count, overrides):
+    """Insert ``count`` copies of ``source_id`` with per-row column overrides.
+
+    ``overrides`` maps column names to SQL expressions of ``n``, the row number.
+    Copying every other column keeps NOT NULL constraints of installed modules
+    satisfied without knowing them in advance.
+    """
+    cr.execute("""
+        SELECT column_name FROM information_schema.columns
+         WHERE table_name = %s AND column_name != 'id'
+    """, [table])
+    columns = [row[0] for row in cr.fetchall()]
+    select = [overrides.get(col, f'src."{col}"') for col in columns]
+    cr.execute(f"""
+        INSERT INTO "{table}" ({', '.join(f'"{col}"' for col in columns)})
+        SELECT {', '.join(select)}
+          FROM "{table}" src, generate_series(1, %s) AS n
+         WHERE src.id = %s
+    """, [count, source_id])
+
+
+def seed(env):
+    cr = env.cr
+    cr.execute("SELECT count(*) FROM res_partner WHERE shopify_customer_id LIKE 'bench-%'")
+    if cr.fetchone()[0] < PARTNERS:
+        partner = env['res.partner'].create({'name': 'Bench Partner', 'email': 'seed@bench.test'})
+        clone_rows(cr, 'res_partner', partner.id, PARTNERS, {
+            'name': "'Bench Partner ' || n",
+            'complete_name': "'Bench Partner ' || n",
+            'email': "'customer' || n || '@bench.test'",
+            'shopify_customer_id': "'bench-' || n",
+        })
+    cr.execute("SELECT count(*) FROM product_product WHERE default_code LIKE 'BENCH-%'")
+    if cr.fetchone()[0] < PRODUCTS:
+        product = env['product.product'].create({'name': 'Bench Product', 'type': 'product'})
+        clone_rows(cr, 'product_product', product.id, PRODUCTS, {
+            'default_code': "'BENCH-' || n",
+            'shopify_product_id': "(7000000000 + n)::text",
+            # variants of one template must have distinct combinations
+            'combination_indices': "'bench-' || n",
+        })
+    store = env['shopify.store'].search([], limit=1)
+    if store:
+        cr.execute("SELECT count(*) FROM shopify_product_mapping WHERE sku LIKE 'BENCH-%'")
+        if cr.fetchone()[0] < PRODUCTS:
+            cr.execute("""
+                INSERT INTO shopify_product_mapping (store_id, sku, inventory_item_id)
+                SELECT %s, 'BENCH-' || n, (9000000000 + n)::text FROM generate_series(1, %s) AS n
+            """, [store.id, PRODUCTS])
+    cr.execute("ANALYZE res_partner; ANALYZE product_product; ANALYZE shopify_product_mapping; ANALYZE sale_order")
+    env.cr.commit()
+    return store
+
+
+def workload(env, store):
+    """Return ``(label, model, domain)`` for each search on the hot paths."""
+    middle = PRODUCTS // 2
+    cases = [
+        ('sync_order: sale.order by shopify_order_id',
+         'sale.order', [('shopify_order_id', '=', '5550001')]),
+        ('sync_order/sync_customer: partner by id OR email',
+         'res.partner', ['|', ('shopify_customer_id', '=', f'bench-{PARTNERS // 2}'),
+                         ('email', '=', f'customer{PARTNERS // 2}@bench.test')]),
+        ('_missing_order_skus: product by SKU OR Shopify id',
+         'product.product', ['|', ('default_code', '=', f'BENCH-{middle}'),
+                             ('shopify_product_id', '=', str(7000000000 + middle))]),
+        ('handle_inventory_update: product by SKU',
+         'product.product', [('default_code', '=', f'BENCH-{middle}')]),
+        ('product UI: SKU ilike',
+         'product.product', [('default_code', 'ilike', f'NCH-{middle}')]),
+    ]
+    if store:
+        cases.append(('handle_inventory_update: mapping by inventory item',
+                      'shopify.product.mapping', [('store_id', '=', store.id),
+                                                  ('inventory_item_id', '=', str(9000000000 + middle))]))
+    return cases
+
+
+def explain(env, model, domain):
+    query = env[model]._search(domain, limit=1)
+    sql = query.select()
+    if isinstance(sql, tuple):
+        statement, params = sql
+        env.cr.execute(f"EXPLAIN (ANALYZE, BUFFERS) {statement}", params)
+    else:
+        from odoo.tools import SQL
+        env.cr.execute(SQL("EXPLAIN (ANALYZE, BUFFERS) %s", sql))
+    return '\n'.join(row[0] for row in env.cr.fetchall())
+
+
+def timing(env, model, domain):
+    samples = []
+    for _i in range(REPEAT):
+        env.invalidate_all()
+        start = time.perf_counter()
+        env[model].search(domain, limit=1)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), max(samples)
+
+
+def report(env, store, title):
+    print(f"\n===== {title} =====")
+    for label, model, domain in workload(env, store):
+        median, worst = timing(env, model, domain)
+        print(f"\n--- {label}: median {median:.2f} ms, max {worst:.2f} ms")
+        print(explain(env, model, domain))
+
+
+def main(env):
+    store = seed(env)
+    report(env, store, "with shopify indexes")
+    env.cr.execute("SAVEPOINT bench_without_indexes")
+    for index in MODULE_INDEXES:
+        env.cr.execute(f'DROP INDEX IF EXISTS "{index}"')
+    try:
+        report(env, store, "without shopify indexes")
+    finally:
+        env.cr.execute("ROLLBACK TO SAVEPOINT bench_without_indexes")
+
+
+main(env)  # noqa: F821 -- provided by odoo-bin shell
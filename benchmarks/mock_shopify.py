@@ -0,0 +1,360 @@
+"""Local stand-in for the parts of the Shopify Admin API used by the module.
+
+Serves generated products, orders and customers with cursor pagination,
+accepts inventory and webhook writes, and answers GraphQL with the
+inventory levels of the generated catalogue, paged or as a bulk operation
+whose JSONL result is served by the mock too. Latency and 429 throttling are
+configurable so the module's retry and pagination paths can be measured
+without network access.
+
+Standalone:
+
+    python benchmarks/mock_shopify.py --port 8899 --products 2000 --latency-ms 50
+
+From a script, use :func:`start_server` and read :data:`STATS` for the
+number of requests served per endpoint.
+"""
+import argparse
+import base64
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+STATS = Counter()
+_stats_lock = threading.Lock()
+
+
+class Catalogue:
+    """Deterministic fake shop data; SKUs are ``BENCH-<product>-<variant>``."""
+
+    def __init__(self, products=1000, variants=3, orders=1000, customers=1000, lines=3, seed=42):
+        self.products = products
+        self.variants = variants
+        self.orders = orders
+        self.customers = customers
+        self.lines = lines
+        self.seed = seed
+        self.inventory = {}
+        self.updated_at = '2024-01-01T00:00:00-05:00'
+
+    def sku(self, product, variant):
+        return f'BENCH-{product}-{variant}'
+
+    def inventory_item_id(self, product, variant):
+        return 9000000000 + product * 100 + variant
+
+    def product(self, n):
+        sizes = [f'Size {v}' for v in range(self.variants)]
+        return {
+            'id': 7000000000 + n,
+            'title': f'Bench Product {n}',
+            'updated_at': self.updated_at,
+            'options': [{'name': 'Size', 'values': sizes}],
+            'variants': [{
+                'id': 8000000000 + n * 100 + v,
+                'sku': self.sku(n, v),
+                'option1': sizes[v],
+                'price': f'{10 + v}.00',
+                'inventory_quantity': self.inventory.get(self.inventory_item_id(n, v), 100),
+                'inventory_item_id': self.inventory_item_id(n, v),
+            } for v in range(self.variants)],
+            'image': None,
+        }
+
+    def customer(self, n):
+        return {
+            'id': 6000000000 + n,
+            'email': f'bench{n}@example.com',
+            'first_name': 'Bench',
+            'last_name': f'Customer {n}',
+            'phone': None,
+            'updated_at': self.updated_at,
+            'default_address': {
+                'address1': f'{n} Bench Street', 'address2': None, 'city': 'Springfield',
+                'zip': '12345', 'country_code': 'US', 'province_code': 'NY',
+            },
+        }
+
+    def order(self, n):
+        rnd = random.Random(self.seed + n)
+        items = []
+        for line in range(self.lines):
+            product = rnd.randrange(self.products)
+            variant = rnd.randrange(self.variants)
+            items.append({
+                'id': 5000000000 + n * 10 + line,
+                'sku': self.sku(product, variant),
+                'product_id': 7000000000 + product,
+                'quantity': rnd.randint(1, 3),
+                'price': f'{10 + variant}.00',
+            })
+        return {
+            'id': 4000000000 + n,
+            'name': f'#B{n}',
+            'email': f'bench{n % max(self.customers, 1)}@example.com',
+            'created_at': '2024-01-01T00:00:00-05:00',
+            'updated_at': self.updated_at,
+            'financial_status': 'pending',
+            'fulfillment_status': None,
+            'customer': self.customer(n % max(self.customers, 1)),
+            'line_items': items,
+        }
+
+
+class MockShopifyServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, catalogue, latency_ms=0, throttle_rate=0.0, retry_after=1, page_size=None):
+        super().__init__(address, MockShopifyHandler)
+        self.catalogue = catalogue
+        self.latency_ms = latency_ms
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.page_size = page_size
+        self.random = random.Random(catalogue.seed)
+        # Query of the last bulk operation, which completes as soon as it is created.
+        self.bulk_query = None
+
+
+class MockShopifyHandler(BaseHTTPRequestHandler):
+    server_version = 'MockShopify/1.0'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _endpoint(self, path):
+        path = re.sub(r'^/admin/api/[^/]+/', '', path)
+        return re.sub(r'/\d+\.json$', '/{id}.json', path)
+
+    def _send(self, status, payload=None, headers=None):
+        body = json.dumps(payload if payload is not None else {}).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_jsonl(self, lines):
+        body = ''.join(json.dumps(line) + '\n' for line in lines).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/jsonl')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _throttled(self, endpoint):
+        with _stats_lock:
+            STATS[endpoint] += 1
+            throttle = self.server.random.random() < self.server.throttle_rate
+            if throttle:
+                STATS['429'] += 1
+        if self.server.latency_ms:
+            time.sleep(self.server.latency_ms / 1000.0)
+        if throttle:
+            self._send(429, {'errors': 'Exceeded 2 calls per second for api client.'},
+                       {'Retry-After': str(self.server.retry_after)})
+        return throttle
+
+    def _page(self, endpoint, key, total, build, query):
+        if 'page_info' in query:
+            offset = int(base64.urlsafe_b64decode(query['page_info'][0]).decode())
+        else:
+            offset = 0
+        limit = self.server.page_size or int(query.get('limit', ['50'])[0])
+        records = [build(n) for n in range(offset, min(offset + limit, total))]
+        headers = {}
+        if offset + limit < total:
+            page_info = base64.urlsafe_b64encode(str(offset + limit).encode()).decode()
+            host = self.headers.get('Host', 'localhost')
+            headers['Link'] = f'<https://{host}{urlparse(self.path).path}?limit={limit}&page_info={page_info}>; rel="next"'
+        self._send(200, {key: records}, headers)
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        endpoint = self._endpoint(parsed.path)
+        if self._throttled(endpoint):
+            return
+        query = parse_qs(parsed.query)
+        catalogue = self.server.catalogue
+        if endpoint == 'products.json':
+            self._page(endpoint, 'products', catalogue.products, catalogue.product, query)
+        elif endpoint == 'orders.json' and 'ids' in query:
+            numbers = [int(order_id) - 4000000000 for order_id in query['ids'][0].split(',') if order_id]
+            self._send(200, {'orders': [catalogue.order(n) for n in numbers if 0 <= n < catalogue.orders]})
+        elif endpoint == 'orders.json':
+            self._page(endpoint, 'orders', catalogue.orders, catalogue.order, query)
+        elif endpoint == 'orders/{id}.json':
+            n = int(parsed.path.rsplit('/', 1)[1].split('.')[0]) - 4000000000
+            if 0 <= n < catalogue.orders:
+                self._send(200, {'order': catalogue.order(n)})
+            else:
+                self._send(404, {'errors': 'Not Found'})
+        elif endpoint == 'customers.json':
+            self._page(endpoint, 'customers', catalogue.customers, catalogue.customer, query)
+        elif endpoint == 'locations.json':
+            self._send(200, {'locations': [{'id': 1000001, 'name': 'Bench Warehouse'}]})
+        elif endpoint == 'inventory_items/{id}.json':
+            item_id = int(parsed.path.rsplit('/', 1)[1].split('.')[0])
+            product, variant = divmod(item_id - 9000000000, 100)
+            self._send(200, {'inventory_item': {
+                'id': item_id, 'sku': catalogue.sku(product, variant), 'tracked': True,
+            }})
+        elif endpoint == 'webhooks.json':
+            self._send(200, {'webhooks': []})
+        elif endpoint == '/bulk/1.jsonl' and self.server.bulk_query:
+            self._send_jsonl(self._variant_nodes(self.server.bulk_query))
+        else:
+            self._send(404, {'errors': 'Not Found'})
+
+    def do_POST(self):
+        parsed = urlparse(self.path)
+        endpoint = self._endpoint(parsed.path)
+        length = int(self.headers.get('Content-Length') or 0)
+        payload = json.loads(self.rfile.read(length) or b'{}')
+        if self._throttled(endpoint):
+            return
+        catalogue = self.server.catalogue
+        if endpoint == 'inventory_levels/set.json':
+            catalogue.inventory[int(payload['inventory_item_id'])] = int(payload['available'])
+            self._send(200, {'inventory_level': payload})
+        elif endpoint == 'webhooks.json':
+            self._send(201, {'webhook': dict(payload.get('webhook', {}), id=1)})
+        elif endpoint == 'graphql.json':
+            self._send(200, self._graphql(payload))
+        else:
+            self._send(404, {'errors': 'Not Found'})
+
+    def do_DELETE(self):
+        self._throttled(self._endpoint(urlparse(self.path).path))
+        self._send(200, {})
+
+    def _graphql(self, payload):
+        """Apply inventorySetQuantities, run bulk operations and answer inventory queries with every variant."""
+        catalogue = self.server.catalogue
+        query = payload.get('query', '')
+        if 'inventorySetQuantities' in query:
+            for level in payload['variables']['input']['quantities']:
+                item_id = int(level['inventoryItemId'].rsplit('/', 1)[1])
+                catalogue.inventory[item_id] = int(level['quantity'])
+            return {'data': {'inventorySetQuantities': {'userErrors': []}}}
+        if 'bulkOperationRunQuery' in query:
+            self.server.bulk_query = query
+            operation = {'id': 'gid://shopify/BulkOperation/1', 'status': 'CREATED'}
+            return {'data': {'bulkOperationRunQuery': {'bulkOperation': operation, 'userErrors': []}}}
+        if 'currentBulkOperation' in query:
+            if not self.server.bulk_query:
+                return {'data': {'currentBulkOperation': None}}
+            host = self.headers.get('Host', 'localhost')
+            return {'data': {'currentBulkOperation': {
+                'id': 'gid://shopify/BulkOperation/1',
+                'status': 'COMPLETED',
+                'errorCode': None,
+                'objectCount': str(catalogue.products * catalogue.variants),
+                'url': f'http://{host}/bulk/1.jsonl',
+            }}}
+        nodes = self._variant_nodes(query)
+        return {'data': {'productVariants': {'nodes': nodes, 'pageInfo': {'hasNextPage': False}}}}
+
+    def _variant_nodes(self, query):
+        """Return one variant node per variant of the catalogue, with the inventory levels aliased in ``query``."""
+        catalogue = self.server.catalogue
+        # Items are only stocked at the bench location; other aliased levels are null.
+        aliases = re.findall(r'(\w+): inventoryLevel\(locationId: "gid://shopify/Location/(\d+)"\)', query)
+        return [{
+            'sku': catalogue.sku(product, variant),
+            'inventoryItem': dict({
+                'legacyResourceId': str(catalogue.inventory_item_id(product, variant)),
+                'tracked': True,
+            }, **{alias: {
+                'quantities': [{
+                    'name': 'available',
+                    'quantity': catalogue.inventory.get(catalogue.inventory_item_id(product, variant), 100),
+                }],
+            } if location_id == '1000001' else None for alias, location_id in aliases}),
+        } for product in range(catalogue.products) for variant in range(catalogue.variants)]
+
+
+def start_server(catalogue, host='127.0.0.1', port=0, **options):
+    """Start the mock server in a daemon thread and return it; ``server.server_port`` is the bound port."""
+    server = MockShopifyServer((host, port), catalogue, **options)
+    thread = threading.Thread(target=server.serve_forever, name='mock-shopify', daemon=True)
+    thread.start()
+    return server
+
+
+@contextmanager
+def redirect_requests(shop_domain, server):
+    """Send every ``requests`` (and ``httpx.AsyncClient``) call addressed to ``shop_domain`` to the mock ``server``.
+
+    The module builds ``https://key:password@<shop>/admin/api/...`` URLs; the
+    scheme, credentials and host are swapped for the local plain-HTTP server.
+    """
+    import requests
+    try:
+        import httpx
+    except ImportError:
+        httpx = None
+
+    original = requests.sessions.Session.request
+    target = f'http://{server.server_address[0]}:{server.server_port}'
+
+    def redirect(url):
+        parsed = urlparse(str(url))
+        if parsed.hostname == shop_domain:
+            return target + parsed.path + (f'?{parsed.query}' if parsed.query else '')
+        return url
+
+    def request(session, method, url, *args, **kwargs):
+        return original(session, method, redirect(url), *args, **kwargs)
+
+    requests.sessions.Session.request = request
+    if httpx:
+        original_async = httpx.AsyncClient.request
+
+        async def async_request(client, method, url, *args, **kwargs):
+            return await original_async(client, method, redirect(url), *args, **kwargs)
+
+        httpx.AsyncClient.request = async_request
+    try:
+        yield
+    finally:
+        requests.sessions.Session.request = original
+        if httpx:
+            httpx.AsyncClient.request = original_async
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8899)
+    parser.add_argument('--products', type=int, default=1000)
+    parser.add_argument('--variants', type=int, default=3)
+    parser.add_argument('--orders', type=int, default=1000)
+    parser.add_argument('--customers', type=int, default=1000)
+    parser.add_argument('--latency-ms', type=int, default=0)
+    parser.add_argument('--throttle-rate', type=float, default=0.0,
+                        help='fraction of requests answered with 429')
+    parser.add_argument('--retry-after', type=int, default=1)
+    args = parser.parse_args()
+    catalogue = Catalogue(args.products, args.variants, args.orders, args.customers)
+    server = MockShopifyServer((args.host, args.port), catalogue, latency_ms=args.latency_ms,
+                               throttle_rate=args.throttle_rate, retry_after=args.retry_after)
+    print(f'Mock Shopify listening on http://{args.host}:{server.server_port}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(dict(STATS))
+
+
+if __name__ == '__main__':
+    main()
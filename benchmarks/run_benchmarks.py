@@ -0,0 +1,166 @@
+"""Throughput benchmark of the sync paths against the local mock Shopify server.
+
+Drives ``fetch_shopify_inventory``, ``fetch_shopify_customers``,
+``fetch_shopify_orders`` and ``_sync_quantities_to_shopify`` against
+``mock_shopify.py`` and reports records/sec, SQL queries per record, API
+calls per record and peak RSS. Results can be written to JSON and compared
+with a previous run so regressions stand out.
+
+Run it from the repository root, in an Odoo shell on a disposable database
+with the module installed:
+
+    BENCH_PRODUCTS=2000 BENCH_ORDERS=2000 BENCH_OUTPUT=bench.json \\
+        odoo-bin shell -d shopify_bench < benchmarks/run_benchmarks.py
+
+Set ``BENCH_BASELINE=previous.json`` to flag metrics that got worse by more
+than ``BENCH_TOLERANCE`` (default 20%). Webhook routes need an HTTP server;
+start one with ``benchmarks/serve_with_mock.py`` and replay webhooks against
+it with ``benchmarks/webhook_load.py``.
+"""
+import json
+import os
+import resource
+import sys
+import threading
+import time
+
+# The script is piped into the shell, so locate the helpers from the working directory.
+sys.path.insert(0, os.environ.get('BENCH_DIR', 'benchmarks'))
+
+import mock_shopify  # noqa: E402
+
+SHOP_DOMAIN = 'bench.myshopify.com'
+
+CONFIG = {
+    'products': int(os.environ.get('BENCH_PRODUCTS', 500)),
+    'variants': int(os.environ.get('BENCH_VARIANTS', 3)),
+    'orders': int(os.environ.get('BENCH_ORDERS', 500)),
+    'customers': int(os.environ.get('BENCH_CUSTOMERS', 500)),
+    'qty_pushes': int(os.environ.get('BENCH_QTY_PUSHES', 200)),
+    'latency_ms': int(os.environ.get('BENCH_LATENCY_MS', 0)),
+    'throttle_rate': float(os.environ.get('BENCH_THROTTLE', 0.0)),
+}
+TOLERANCE = float(os.environ.get('BENCH_TOLERANCE', 0.2))
+
+# For these metrics lower is better; for the others higher is better.
+LOWER_IS_BETTER = {'queries_per_record', 'api_calls_per_record', 'peak_rss_mb'}
+
+
+def bench_store(env):
+    store = env['shopify.store'].search([('shopify_url', '=', SHOP_DOMAIN)], limit=1)
+    if not store:
+        store = env['shopify.store'].create({
+            'name': 'Benchmark Store',
+            'shopify_url': SHOP_DOMAIN,
+            'api_key': 'bench',
+            'api_password': 'bench',
+            'warehouse_id': env['stock.warehouse'].search([], limit=1).id,
+        })
+    store.write({
+        'current_page_info': False,
+        'product_last_fetch_date': False,
+        'order_last_fetch_date': False,
+        'customer_last_fetch_date': False,
+        'order_page_info': False,
+        'order_max_updated_at': False,
+        'customer_page_info': False,
+        'customer_max_updated_at': False,
+    })
+    env.cr.commit()
+    return store
+
+
+def measure(name, records, run):
+    """Run ``run()`` and collect the counters of one scenario."""
+    thread = threading.current_thread()
+    thread.query_count = 0
+    thread.query_time = 0
+    api_before = sum(count for endpoint, count in mock_shopify.STATS.items() if endpoint != '429')
+    throttled_before = mock_shopify.STATS['429']
+    start = time.perf_counter()
+    run()
+    elapsed = time.perf_counter() - start
+    api_calls = sum(count for endpoint, count in mock_shopify.STATS.items() if endpoint != '429') - api_before
+    return {
+        'scenario': name,
+        'records': records,
+        'seconds': round(elapsed, 3),
+        'records_per_sec': round(records / elapsed, 2) if elapsed else 0,
+        'queries_per_record': round(thread.query_count / records, 2) if records else 0,
+        'api_calls_per_record': round(api_calls / records, 3) if records else 0,
+        'throttled': mock_shopify.STATS['429'] - throttled_before,
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def scenarios(env, store):
+    yield 'fetch_shopify_inventory', CONFIG['products'], lambda: store.fetch_shopify_inventory()
+    yield 'fetch_shopify_customers', CONFIG['customers'], lambda: store.fetch_shopify_customers()
+    yield 'fetch_shopify_orders', CONFIG['orders'], lambda: store.fetch_shopify_orders()
+
+    mapped = env['shopify.product.mapping'].search([('store_id', '=', store.id)], limit=CONFIG['qty_pushes'])
+    skus = mapped.mapped('sku')
+    variants = env['product.product'].search([('default_code', 'in', skus)])
+
+    stock_location = store.warehouse_id.lot_stock_id
+
+    def push_quantities():
+        env['stock.quant']._sync_quantities_to_shopify([(product.id, stock_location.id) for product in variants])
+
+    yield '_sync_quantities_to_shopify', len(variants), push_quantities
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as baseline_file:
+        baseline = {row['scenario']: row for row in json.load(baseline_file)['results']}
+    regressions = []
+    for row in results:
+        before = baseline.get(row['scenario'])
+        if not before:
+            continue
+        for key in ('records_per_sec', 'queries_per_record', 'api_calls_per_record', 'peak_rss_mb'):
+            old, new = before.get(key), row.get(key)
+            if not old:
+                continue
+            change = (new - old) / old
+            worse = change > TOLERANCE if key in LOWER_IS_BETTER else change < -TOLERANCE
+            if worse:
+                regressions.append(f"{row['scenario']}.{key}: {old} -> {new} ({change:+.0%})")
+    return regressions
+
+
+def main(env):
+    catalogue = mock_shopify.Catalogue(
+        products=CONFIG['products'], variants=CONFIG['variants'],
+        orders=CONFIG['orders'], customers=CONFIG['customers'],
+    )
+    server = mock_shopify.start_server(catalogue, latency_ms=CONFIG['latency_ms'],
+                                       throttle_rate=CONFIG['throttle_rate'])
+    results = []
+    try:
+        with mock_shopify.redirect_requests(SHOP_DOMAIN, server):
+            store = bench_store(env)
+            for name, records, run in scenarios(env, store):
+                results.append(measure(name, records, run))
+                env.cr.commit()
+    finally:
+        server.shutdown()
+
+    columns = ['scenario', 'records', 'seconds', 'records_per_sec', 'queries_per_record',
+               'api_calls_per_record', 'throttled', 'peak_rss_mb']
+    print('\t'.join(columns))
+    for row in results:
+        print('\t'.join(str(row[column]) for column in columns))
+
+    if os.environ.get('BENCH_OUTPUT'):
+        with open(os.environ['BENCH_OUTPUT'], 'w') as output:
+            json.dump({'config': CONFIG, 'results': results}, output, indent=2)
+    if os.environ.get('BENCH_BASELINE'):
+        regressions = compare(results, os.environ['BENCH_BASELINE'])
+        for line in regressions:
+            print(f'REGRESSION {line}')
+        if not regressions:
+            print(f'No regression beyond {TOLERANCE:.0%} against the baseline.')
+
+
+main(env)  # noqa: F821 -- provided by odoo-bin shell
@@ -0,0 +1,40 @@
+"""Start an Odoo server whose Shopify calls go to the local mock server.
+
+Everything after the script name is passed to odoo-bin unchanged:
+
+    python benchmarks/serve_with_mock.py -c odoo.conf -d shopify_bench --http-port 8069
+
+The mock catalogue is sized with the same ``BENCH_*`` variables as
+``run_benchmarks.py``, so webhooks replayed by ``webhook_load.py`` refer to
+products that exist on both sides. Prefork workers inherit the redirection.
+"""
+import os
+import sys
+
+import mock_shopify
+
+SHOP_DOMAIN = os.environ.get('BENCH_SHOP_DOMAIN', 'bench.myshopify.com')
+
+
+def main():
+    catalogue = mock_shopify.Catalogue(
+        products=int(os.environ.get('BENCH_PRODUCTS', 500)),
+        variants=int(os.environ.get('BENCH_VARIANTS', 3)),
+        orders=int(os.environ.get('BENCH_ORDERS', 500)),
+        customers=int(os.environ.get('BENCH_CUSTOMERS', 500)),
+    )
+    server = mock_shopify.start_server(
+        catalogue,
+        latency_ms=int(os.environ.get('BENCH_LATENCY_MS', 0)),
+        throttle_rate=float(os.environ.get('BENCH_THROTTLE', 0.0)),
+    )
+    print(f'Mock Shopify for {SHOP_DOMAIN} on port {server.server_port}', file=sys.stderr)
+
+    import odoo.cli
+    with mock_shopify.redirect_requests(SHOP_DOMAIN, server):
+        sys.argv = ['odoo-bin'] + sys.argv[1:]
+        odoo.cli.main()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,271 @@
+"""Replay a corpus of Shopify webhooks against an Odoo server and report how it copes.
+
+The corpus is a JSON-lines file, one delivery per line::
+
+    {"topic": "orders/create", "shop_domain": "bench.myshopify.com",
+     "webhook_id": "b54557e4-...", "payload": {...}}
+
+Recorded deliveries can be exported into that shape; ``generate`` builds a
+synthetic corpus from the mock catalogue, including a share of redelivered
+(duplicate) webhooks the way Shopify retries them::
+
+    python benchmarks/webhook_load.py generate corpus.jsonl --count 5000 --duplicates 0.05
+    python benchmarks/webhook_load.py replay corpus.jsonl --url http://localhost:8069 \\
+        --rate 200 --concurrency 16 --dsn "dbname=shopify_bench"
+
+``replay`` reports p50/p95/p99 latency and error rate per topic. With
+``--dsn`` (needs psycopg2) it also samples ``pg_stat_activity`` for
+sessions waiting on locks while the replay runs, reports deadlocks, and
+counts Shopify orders that ended up as more than one sale order.
+"""
+import argparse
+import json
+import random
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import mock_shopify
+
+ROUTES = {
+    'inventory_levels/update': '/shopify_webhook/inventory',
+    'orders/create': '/shopify_webhook/sales_order',
+    'orders/updated': '/shopify_webhook/sales_order',
+    'orders/cancelled': '/shopify_webhook/sales_order',
+    'customers/create': '/shopify_webhook/customer',
+    'customers/update': '/shopify_webhook/customer',
+}
+
+DEFAULT_MIX = {
+    'inventory_levels/update': 0.5,
+    'orders/create': 0.25,
+    'orders/cancelled': 0.05,
+    'customers/update': 0.2,
+}
+
+
+def generate(path, count, shop_domain, duplicates, seed, catalogue):
+    rnd = random.Random(seed)
+    topics, weights = zip(*DEFAULT_MIX.items())
+    deliveries = []
+    for n in range(count):
+        if deliveries and rnd.random() < duplicates:
+            deliveries.append(dict(rnd.choice(deliveries)))
+            continue
+        topic = rnd.choices(topics, weights)[0]
+        if topic == 'inventory_levels/update':
+            product, variant = rnd.randrange(catalogue.products), rnd.randrange(catalogue.variants)
+            payload = {
+                'inventory_item_id': catalogue.inventory_item_id(product, variant),
+                'location_id': 1000001,
+                'available': rnd.randint(0, 500),
+                'updated_at': time.strftime('%Y-%m-%dT%H:%M:%S-00:00', time.gmtime(time.time() + n)),
+            }
+        elif topic.startswith('orders/'):
+            payload = catalogue.order(rnd.randrange(catalogue.orders))
+        else:
+            payload = catalogue.customer(rnd.randrange(catalogue.customers))
+        deliveries.append({
+            'topic': topic,
+            'shop_domain': shop_domain,
+            'webhook_id': str(uuid.UUID(int=rnd.getrandbits(128))),
+            'payload': payload,
+        })
+    with open(path, 'w') as corpus:
+        for delivery in deliveries:
+            corpus.write(json.dumps(delivery) + '\n')
+    print(f'Wrote {len(deliveries)} deliveries to {path}')
+
+
+def load_corpus(path):
+    with open(path) as corpus:
+        return [json.loads(line) for line in corpus if line.strip()]
+
+
+def send(base_url, delivery, timeout):
+    """POST one delivery; return ``(latency_seconds, error_or_None)``."""
+    body = json.dumps(delivery['payload']).encode()
+    request = urllib.request.Request(
+        base_url.rstrip('/') + ROUTES[delivery['topic']],
+        data=body,
+        method='POST',
+        headers={
+            'Content-Type': 'application/json',
+            'X-Shopify-Topic': delivery['topic'],
+            'X-Shopify-Shop-Domain': delivery['shop_domain'],
+            'X-Shopify-Webhook-Id': delivery.get('webhook_id', ''),
+        },
+    )
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            answer = json.loads(response.read() or b'{}')
+    except urllib.error.HTTPError as e:
+        return time.perf_counter() - start, f'http {e.code}'
+    except (urllib.error.URLError, TimeoutError, OSError) as e:
+        return time.perf_counter() - start, type(e).__name__
+    latency = time.perf_counter() - start
+    if 'error' in answer:
+        return latency, 'jsonrpc error'
+    status = (answer.get('result') or {}).get('status')
+    if status not in (None, 'success'):
+        return latency, f'status {status}'
+    return latency, None
+
+
+class LockSampler(threading.Thread):
+    """Sample sessions waiting on heavyweight locks while the replay runs."""
+
+    def __init__(self, dsn, interval=0.1):
+        super().__init__(daemon=True)
+        import psycopg2
+        self.connection = psycopg2.connect(dsn)
+        self.connection.autocommit = True
+        self.interval = interval
+        self.samples = []
+        self.stopped = threading.Event()
+        self.deadlocks_before = self._deadlocks()
+
+    def _deadlocks(self):
+        with self.connection.cursor() as cr:
+            cr.execute("SELECT deadlocks FROM pg_stat_database WHERE datname = current_database()")
+            return cr.fetchone()[0]
+
+    def run(self):
+        with self.connection.cursor() as cr:
+            while not self.stopped.is_set():
+                cr.execute("""
+                    SELECT count(*) FROM pg_stat_activity
+                     WHERE datname = current_database() AND wait_event_type = 'Lock'
+                """)
+                self.samples.append(cr.fetchone()[0])
+                self.stopped.wait(self.interval)
+
+    def report(self):
+        self.stopped.set()
+        self.join()
+        waiting = [sample for sample in self.samples if sample]
+        return {
+            'lock_samples': len(self.samples),
+            'samples_with_lock_waits': len(waiting),
+            'max_sessions_waiting': max(self.samples, default=0),
+            'avg_sessions_waiting': round(statistics.mean(self.samples), 2) if self.samples else 0,
+            'deadlocks': self._deadlocks() - self.deadlocks_before,
+        }
+
+    def duplicate_orders(self, order_ids):
+        with self.connection.cursor() as cr:
+            cr.execute("""
+                SELECT count(*) FROM (
+                    SELECT shopify_order_id FROM sale_order
+                     WHERE shopify_order_id = ANY(%s)
+                  GROUP BY shopify_order_id HAVING count(*) > 1
+                ) dup
+            """, [order_ids])
+            return cr.fetchone()[0]
+
+
+def percentile(values, pct):
+    if not values:
+        return 0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def replay(args):
+    deliveries = load_corpus(args.corpus)
+    if args.limit:
+        deliveries = deliveries[:args.limit]
+    webhook_ids = Counter(delivery.get('webhook_id') for delivery in deliveries)
+    redelivered = sum(count - 1 for webhook_id, count in webhook_ids.items() if webhook_id and count > 1)
+
+    sampler = LockSampler(args.dsn) if args.dsn else None
+    if sampler:
+        sampler.start()
+
+    results = defaultdict(list)
+    errors = defaultdict(Counter)
+    lock = threading.Lock()
+    interval = 1.0 / args.rate if args.rate else 0
+
+    def task(delivery):
+        latency, error = send(args.url, delivery, args.timeout)
+        with lock:
+            results[delivery['topic']].append(latency)
+            if error:
+                errors[delivery['topic']][error] += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        for n, delivery in enumerate(deliveries):
+            if interval:
+                delay = start + n * interval - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            pool.submit(task, delivery)
+    elapsed = time.perf_counter() - start
+
+    print(f'{len(deliveries)} deliveries in {elapsed:.1f}s '
+          f'({len(deliveries) / elapsed:.1f}/s, concurrency {args.concurrency}), '
+          f'{redelivered} redelivered duplicates')
+    print('topic\tcount\tp50_ms\tp95_ms\tp99_ms\terror_rate\terrors')
+    for topic, latencies in sorted(results.items()):
+        failed = sum(errors[topic].values())
+        print('\t'.join([
+            topic, str(len(latencies)),
+            f'{percentile(latencies, 50) * 1000:.1f}',
+            f'{percentile(latencies, 95) * 1000:.1f}',
+            f'{percentile(latencies, 99) * 1000:.1f}',
+            f'{failed / len(latencies):.2%}',
+            ', '.join(f'{error}: {count}' for error, count in errors[topic].most_common()) or '-',
+        ]))
+
+    if sampler:
+        for key, value in sampler.report().items():
+            print(f'{key}: {value}')
+        order_ids = sorted({str(delivery['payload'].get('id')) for delivery in deliveries
+                            if delivery['topic'].startswith('orders/')})
+        if order_ids:
+            print(f'shopify orders with duplicate sale orders: {sampler.duplicate_orders(order_ids)}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    gen = commands.add_parser('generate', help='build a synthetic corpus')
+    gen.add_argument('corpus')
+    gen.add_argument('--count', type=int, default=1000)
+    gen.add_argument('--shop-domain', default='bench.myshopify.com')
+    gen.add_argument('--duplicates', type=float, default=0.05, help='share of redelivered webhooks')
+    gen.add_argument('--seed', type=int, default=42)
+    gen.add_argument('--products', type=int, default=500)
+    gen.add_argument('--variants', type=int, default=3)
+    gen.add_argument('--orders', type=int, default=500)
+    gen.add_argument('--customers', type=int, default=500)
+
+    rep = commands.add_parser('replay', help='send a corpus to an Odoo server')
+    rep.add_argument('corpus')
+    rep.add_argument('--url', default='http://localhost:8069')
+    rep.add_argument('--rate', type=float, default=0, help='deliveries per second, 0 for as fast as possible')
+    rep.add_argument('--concurrency', type=int, default=8)
+    rep.add_argument('--timeout', type=float, default=30)
+    rep.add_argument('--limit', type=int, default=0)
+    rep.add_argument('--dsn', help='libpq connection string of the Odoo database, for lock and duplicate checks')
+
+    args = parser.parse_args()
+    if args.command == 'generate':
+        catalogue = mock_shopify.Catalogue(args.products, args.variants, args.orders, args.customers)
+        generate(args.corpus, args.count, args.shop_domain, args.duplicates, args.seed, catalogue)
+    else:
+        replay(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,5 @@
 from . import models
 from . import controllers
+from . import cli
 # from . import wizards
 from .hooks import post_init_hook
\ No newline at end of file
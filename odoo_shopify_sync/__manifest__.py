@@ -15,6 +15,11 @@
         'security/ir.model.access.csv', 
         'views/sync_log_views.xml',  
         'views/shopify_store_views.xml',
+        'views/sync_metric_views.xml',
+        'views/pending_order_views.xml',
+        'views/sync_status_views.xml',
+        'views/inventory_drift_views.xml',
+        'views/sync_job_views.xml',
         'data/scheduled_actions.xml',
         'views/sale_menus.xml', 
         
@@ -0,0 +1,43 @@
+import argparse
+import logging
+import sys
+
+import odoo
+from odoo.cli import Command
+from odoo.tools import config
+
+_logger = logging.getLogger(__name__)
+
+
+class ShopifySyncWorker(Command):
+    """Run the Shopify sync job queue in a dedicated process"""
+    name = 'shopify_sync_worker'
+
+    def run(self, args):
+        parser = argparse.ArgumentParser(
+            prog=f'{sys.argv[0].split("/")[-1]} {self.name}',
+            description=self.__doc__,
+        )
+        parser.add_argument('--shard', default='0/1',
+                            help="restrict this worker to a share of the stores, as INDEX/COUNT "
+                                 "(default 0/1, all stores)")
+        parser.add_argument('--idle-sleep', type=float, default=5,
+                            help='seconds to wait when the queue is empty (default 5)')
+        options, odoo_args = parser.parse_known_args(args)
+        shard, shards = (int(part) for part in options.shard.split('/'))
+        if not 0 <= shard < shards:
+            parser.error('--shard must be INDEX/COUNT with 0 <= INDEX < COUNT')
+
+        config.parse_config(odoo_args)
+        dbname = config['db_name'] and config['db_name'].split(',')[0]
+        if not dbname:
+            parser.error('a database is required, pass it with -d')
+        odoo.service.server.start_internal()
+
+        registry = odoo.registry(dbname)
+        with registry.cursor() as cr:
+            env = odoo.api.Environment(cr, odoo.SUPERUSER_ID, {})
+            try:
+                env['shopify.sync.job']._run_worker(shard, shards, idle_sleep=options.idle_sleep)
+            except KeyboardInterrupt:
+                _logger.info("Shopify sync worker for shard %s/%s stopped", shard, shards)
@@ -1 +1,3 @@
-from . import shopify_webhook_controller
\ No newline at end of file
+
+from . import shopify_webhook_controller
+from . import shopify_metrics_controller
@@ -0,0 +1,23 @@
+import hmac
+
+from odoo import http
+from odoo.http import request
+
+
+class ShopifyMetricsController(http.Controller):
+
+    @http.route('/shopify_sync/metrics', type='http', auth='none', methods=['GET'])
+    def shopify_sync_metrics(self, token=None):
+        """Expose the aggregated sync metrics in the Prometheus text format.
+
+        Scrapers must pass the ``odoo_shopify_sync.metrics_token`` system
+        parameter as ``?token=`` or as a bearer token. While the parameter is
+        not set the endpoint answers 403 to everyone.
+        """
+        expected = request.env['ir.config_parameter'].sudo().get_param('odoo_shopify_sync.metrics_token')
+        auth = request.httprequest.headers.get('Authorization', '')
+        given = token or (auth[7:] if auth.startswith('Bearer ') else '')
+        if not expected or not hmac.compare_digest(given, expected):
+            return request.make_response('Forbidden', status=403)
+        body = request.env['shopify.sync.metric'].sudo()._render_prometheus()
+        return request.make_response(body, headers=[('Content-Type', 'text/plain; version=0.0.4')])
@@ -1,9 +1,15 @@
 from . import shopify_store
 from . import sale_order
+from . import shopify_order_ingestion
 from . import stock_quant
 from . import res_partner
-# from . import product_template
+from . import product_template
 from . import product_product
 from . import shopify_sync_history
-
-
+from . import shopify_sync_metric
+from . import shopify_sync_state
+from . import shopify_sync_status
+from . import shopify_location_mapping
+from . import shopify_inventory_reconciliation
+from . import shopify_pending_order
+from . import shopify_sync_job
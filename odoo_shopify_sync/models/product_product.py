@@ -1,18 +1,35 @@
-from odoo import models, fields
+from odoo import api, models, fields
+from odoo.tools.sql import create_index
 
 class ProductProduct(models.Model):
     _inherit = 'product.product'
 
-    shopify_product_id = fields.Char("Shopify Product ID")
+    shopify_product_id = fields.Char("Shopify Product ID", index='btree_not_null')
     shopify_store_ids = fields.Many2many('shopify.store', string="Shopify Stores Synced")
-    last_update_source = fields.Selection(
-        [('odoo', 'Odoo'), ('shopify', 'Shopify'), ('synced', 'Synced')],
-        string='Last Update Source',
-        default='synced',
-        help='Tracks the source of the last inventory update to prevent sync loops.'
-    )
-    last_updated_at = fields.Datetime(
-        string='Last Updated At',
-        default=fields.Datetime.now,
-        help='Timestamp of the last inventory update.'
-    )
+
+    def _auto_init(self):
+        """Add a trigram index on default_code for SKU lookups done with ilike."""
+        res = super()._auto_init()
+        if self.pool.has_trigram:
+            create_index(
+                self._cr,
+                'product_product_default_code_shopify_trgm_index',
+                self._table,
+                ['default_code gin_trgm_ops'],
+                method='gin',
+            )
+        return res
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        products = super().create(vals_list)
+        # Bulk imports pass defer_sku_resolution and resolve their SKUs once at the end.
+        if not self.env.context.get('defer_sku_resolution'):
+            self.env['shopify.pending.order']._resolve_skus(products.mapped('default_code'))
+        return products
+
+    def write(self, vals):
+        res = super().write(vals)
+        if vals.get('default_code') and not self.env.context.get('defer_sku_resolution'):
+            self.env['shopify.pending.order']._resolve_skus([vals['default_code']])
+        return res
@@ -1,183 +1,146 @@
 # -*- coding: utf-8 -*-
 
 import logging
-import base64
-import requests
 
-from odoo import models, fields, api, Command
+from odoo import models, api, Command
 
 
 _logger = logging.getLogger(__name__)
 
 
+def _variant_options(shopify_product):
+    """Return the ``(option name, values)`` of a REST product, without Shopify's placeholder "Title" option."""
+    return [
+        (option['name'], option.get('values', []))
+        for option in shopify_product.get('options', [])
+        if not (option.get('name') == 'Title' and option.get('values') == ['Default Title'])
+    ]
+
+
+def _split_tags(tags):
+    """REST products carry their tags as one comma-separated string."""
+    return [tag.strip() for tag in (tags or '').split(',') if tag.strip()]
+
+
 class ProductTemplate(models.Model):
     _inherit = 'product.template'
 
-
     @api.model
-    def create_product_from_shopify(self, product, warehouse):
-
-        data = {
-            'name': product.get('title', ''),
-            'detailed_type': 'product',
-            'sale_ok': True,
-            'purchase_ok': True,
-            'list_price': 0,
-        }
-
-        tags = product.get('tags')
-        if tags:
-            data['product_tag_ids'] = self._prepare_product_tags(tags)
-
-        variant_options = product.get('options', [])
-        variant_id = inventory_id = False
-        if any("Default Title" in option["values"] for option in variant_options):
-            variants = product.get('variants', [{}])
-            product_info = variants.get('nodes')[0]
-            variant_id = product_info['legacyResourceId']
-            variant_graphql_id = product_info['id']
-            inventory_id = product_info['inventoryItem']
-            
-            data.update({
-                'default_code': product_info['sku'],
-                'barcode': product_info['barcode'],
-                'list_price': float(product_info['price']),
-            })
-
-        product_variants = self._prepare_product_variants(variant_options)
-        if product_variants.get('attribute_line_ids', []):
-            data.update(product_variants)
-
-        shopify_product = self.create(data)
-        if shopify_product.product_variant_count <= 1:
-            if variant_id:
-                shopify_product.product_variant_id.write({
-                    'product_product_id': variant_id,
-                    
-                })
-        else:
-            # Update product variants information such as shopify id, pricing, etc.
-            prod_prod_variants = shopify_product.product_variant_ids
-            data_variants = product.get('variants', [])
-
-            self._update_product_variant_info(data_variants, prod_prod_variants)
-
-        # Add an image
-        image_info = product.get('image')
-        if image_info:
-            image_url = image_info.get('src')
-            if image_url:
-                image = self._get_binary_image(image_url)
-                data['image_1920'] = image
-
-
-        
-        
-        return shopify_product
-
-    def _prepare_product_variants(self, options):
-        product_attribute = self.env['product.attribute']
-        product_attribute_value = self.env['product.attribute.value']
-
-        product_variants = []
-
-        for variant in options:
-            variant_value_ids = []
-            
-            if 'Default Title' in variant['values']:
+    def _create_from_shopify(self, store, shopify_products):
+        """Create the templates of a page of new Shopify products of ``store`` in bulk.
+
+        ``shopify_products`` are REST ``products.json`` records. Attributes,
+        attribute values and tags of the whole page are resolved with one
+        search each, and the missing ones created in one call each. All
+        templates are then created in a single ``create``, which generates
+        their variants together, and the variants get their SKU by matching
+        their attribute values with the Shopify variants' options. Every
+        template is mapped to its Shopify product with a
+        ``shopify.template.mapping``. Returns ``{shopify_product_id:
+        product.template id}``.
+        """
+        attributes = self._shopify_attributes(shopify_products)
+        values = self._shopify_attribute_values(shopify_products, attributes)
+        tags = self._shopify_tags(shopify_products)
+
+        vals_list = []
+        for product in shopify_products:
+            variants = product.get('variants', [])
+            vals = {
+                'name': product['title'],
+                'type': 'product',
+                'list_price': float(variants[0].get('price') or 0.0) if variants else 0.0,
+                'product_tag_ids': [Command.set([tags[tag] for tag in _split_tags(product.get('tags'))])],
+            }
+            options = _variant_options(product)
+            if options:
+                vals['attribute_line_ids'] = [Command.create({
+                    'attribute_id': attributes[name].id,
+                    'value_ids': [Command.set([values[attributes[name].id, value].id for value in option_values])],
+                }) for name, option_values in options if option_values]
+            elif variants:
+                vals['default_code'] = variants[0].get('sku')
+            vals_list.append(vals)
+        templates = self.with_context(defer_sku_resolution=True).create(vals_list)
+
+        self.env['shopify.template.mapping'].sudo().create([{
+            'store_id': store.id,
+            'shopify_product_id': str(product['id']),
+            'product_tmpl_id': template.id,
+        } for product, template in zip(shopify_products, templates)])
+
+        matches = []
+        for product, template in zip(shopify_products, templates):
+            options = _variant_options(product)
+            if not options:
                 continue
+            by_values = {
+                frozenset(variant.product_template_variant_value_ids.product_attribute_value_id.ids): variant
+                for variant in template.product_variant_ids
+            }
+            for shopify_variant in product.get('variants', []):
+                key = frozenset(
+                    values[attributes[name].id, shopify_variant.get(f'option{index + 1}')].id
+                    for index, (name, _values) in enumerate(options)
+                    if (attributes[name].id, shopify_variant.get(f'option{index + 1}')) in values
+                )
+                variant = by_values.get(key)
+                if variant:
+                    matches.append((variant, shopify_variant.get('sku')))
+                else:
+                    _logger.warning("No variant of %s matches Shopify variant %s", template.name, shopify_variant.get('sku'))
+        for variant, sku in matches:
+            variant.with_context(defer_sku_resolution=True).write({'default_code': sku})
+        # One lookup for the page, instead of one per created or written variant.
+        self.env['shopify.pending.order']._resolve_skus(
+            [sku for _variant, sku in matches]
+            + [vals['default_code'] for vals in vals_list if vals.get('default_code')])
+
+        _logger.info("Created %s product templates from %s", len(templates), store.name)
+        return {str(product['id']): template.id for product, template in zip(shopify_products, templates)}
+
+    def _shopify_attributes(self, shopify_products):
+        """Return ``{name: product.attribute}`` for the options of ``shopify_products``, creating the missing ones."""
+        Attribute = self.env['product.attribute']
+        names = {name for product in shopify_products for name, _values in _variant_options(product)}
+        attributes = {}
+        # Attributes sharing a name resolve to the oldest one, whichever page asks.
+        for attribute in Attribute.search([('name', 'in', list(names))], order='id'):
+            attributes.setdefault(attribute.name, attribute)
+        missing = [name for name in names if name not in attributes]
+        for attribute in Attribute.create([{'name': name} for name in missing]):
+            attributes[attribute.name] = attribute
+        return attributes
+
+    def _shopify_attribute_values(self, shopify_products, attributes):
+        """Return ``{(product.attribute id, value): product.attribute.value}``, creating the missing values."""
+        AttributeValue = self.env['product.attribute.value']
+        wanted = {
+            (attributes[name].id, value)
+            for product in shopify_products
+            for name, option_values in _variant_options(product)
+            for value in option_values
+        }
+        values = {}
+        existing = AttributeValue.search([
+            ('attribute_id', 'in', [attribute.id for attribute in attributes.values()]),
+            ('name', 'in', list({value for _attribute_id, value in wanted})),
+        ], order='id')
+        for value in existing:
+            values.setdefault((value.attribute_id.id, value.name), value)
+        missing = [key for key in wanted if key not in values]
+        created = AttributeValue.create([{'name': value, 'attribute_id': attribute_id} for attribute_id, value in missing])
+        values.update(zip(missing, created))
+        return values
+
+    def _shopify_tags(self, shopify_products):
+        """Return ``{name: product.tag id}`` for the tags of ``shopify_products``, creating the missing ones."""
+        Tag = self.env['product.tag']
+        names = {tag for product in shopify_products for tag in _split_tags(product.get('tags'))}
+        if not names:
+            return {}
+        tags = {tag.name: tag.id for tag in Tag.search([('name', 'in', list(names))])}
+        missing = [name for name in names if name not in tags]
+        tags.update({tag.name: tag.id for tag in Tag.create([{'name': name} for name in missing])})
+        return tags
 
-            # Create or search for the product attribute
-            product_attribute_id = product_attribute.search([('name', '=', variant['name']),
-                                                             ('create_variant', '=', 'always')], limit=1)
-
-            
-
-            # Auto update Graphql ID
-            if not product_attribute_id:
-                product_attribute_id = product_attribute.create({'name': variant['name'],
-                                                                
-                                                                 'create_variant': 'always'
-                                                                 })
-
-            for index, value in enumerate(variant.get('optionValues', [])):
-                
-                attrib_value_id = product_attribute_value.search([('name', '=', value.get('name')),
-                                                                 
-                                                                  ('attribute_id', '=', product_attribute_id.id)],
-                                                                 limit=1)
-
-                # Auto update Graphql ID
-                
-
-                if not attrib_value_id:
-                    attrib_value_id = product_attribute_value.create({
-                        'name': value.get('name'),
-                        
-                        'attribute_id': product_attribute_id.id,
-                        'sequence': index
-                    })
-
-                variant_value_ids.append(attrib_value_id.id)
-
-            product_variants.append(Command.create({
-                    'attribute_id': product_attribute_id.id,
-                    'value_ids': [Command.set(variant_value_ids)]
-                })
-            )
-
-        return {'attribute_line_ids': product_variants}
-
-    def _update_product_variant_info(self, variant_data, product_variants):
-
-        for data in variant_data.get('nodes'):
-            selected_options = [item["optionValue"]["id"].split('/')[-1] for item in data.get('selectedOptions')]
-
-            match_variant = False
-            for product_variant in product_variants:
-                variant_values = product_variant.product_template_variant_value_ids.mapped('product_attribute_value_id.shopify_id')
-                if sorted(selected_options) == sorted(variant_values):
-                    match_variant = product_variant
-                    break
-
-            price = data.get('price') or 0.0
-            
-            inventory_item = data.get('inventoryItem')
-            if match_variant:
-                match_variant.write({
-                    'product_product_id': data.get('legacyResourceId'),
-                    'product_graphql_id': data.get('id'),
-                    'compare_at_price': float(data.get('compareAtPrice')) if data.get('compareAtPrice') else 0,
-                   
-                    'default_code': data.get('sku'),
-                    'barcode': data.get('barcode'),
-                    'lst_price': float(price),
-                    'standard_price': float(inventory_item['unitCost']['amount']) if inventory_item['unitCost']['amount'] else 0,
-                })
-
-    def _prepare_product_tags(self, tags):
-        # Add a tag
-        tag_cmd = []
-
-        for tag in tags:
-            check_tag = self.env['product.tag'].search([('name', '=', tag)])
-            if check_tag:
-                tag_cmd.append(Command.link(check_tag.id))
-            else:
-                tag_cmd.append(Command.create({'name': tag}))
-        return tag_cmd
-
-    # For Testing
-    def _get_binary_image(self, image_url):
-        binary_data = None
-        try:
-            with requests.get(image_url) as response:
-                if response.status_code == 200:
-                    # Encode the image content to base64
-                    binary_data = base64.b64encode(response.content)
-        except requests.RequestException as e:
-            _logger.info("Request failed: %s", e)
-        except Exception as e:
-            _logger.error("An unexpected error occurred: %s", e)
-
-        return binary_data
@@ -1,7 +1,24 @@
 from odoo import models, fields
+from odoo.tools.sql import create_index
 
 class ResPartner(models.Model):
     _inherit = "res.partner"
 
+    # Orders and customers are matched with `shopify_customer_id = x OR email = y`,
+    # which only avoids a sequential scan when both columns are indexed.
+    email = fields.Char(index='btree_not_null')
     shopify_customer_id = fields.Char(string="Shopify Order ID", index=True, help="ID of the order in Shopify")
     shopify_store_id = fields.Many2one("shopify.store", string="Shopify Store", help="The store from which this order originated.")
+
+    def _auto_init(self):
+        """Add a trigram index on email for the ilike lookups of partner name_search."""
+        res = super()._auto_init()
+        if self.pool.has_trigram:
+            create_index(
+                self._cr,
+                'res_partner_email_shopify_trgm_index',
+                self._table,
+                ['email gin_trgm_ops'],
+                method='gin',
+            )
+        return res
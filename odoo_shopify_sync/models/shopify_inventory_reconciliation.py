@@ -0,0 +1,309 @@
+import json
+import logging
+import time
+from collections import defaultdict
+
+import requests
+
+from odoo import models, fields
+
+from ..tools.sync_batch import shopify_sync_batch
+
+_logger = logging.getLogger(__name__)
+
+# Shopify runs one bulk query per shop at a time; its state is polled every
+# BULK_POLL_SECONDS, and the paged query below takes over when it fails or is
+# still running after BULK_TIMEOUT_SECONDS.
+BULK_POLL_SECONDS = 2
+BULK_TIMEOUT_SECONDS = 900
+
+# The same variants as INVENTORY_LEVELS_QUERY, without pagination. The
+# inventory item and its levels are single objects, not connections, so the
+# JSONL result has one self-contained line per variant.
+BULK_INVENTORY_QUERY = '''
+mutation {
+  bulkOperationRunQuery(query: """
+    {
+      productVariants {
+        edges {
+          node {
+            sku
+            inventoryItem {
+              legacyResourceId
+              tracked
+              %(levels)s
+            }
+          }
+        }
+      }
+    }
+  """) {
+    bulkOperation { id status }
+    userErrors { field message }
+  }
+}
+'''
+
+BULK_OPERATION_QUERY = """
+query {
+  currentBulkOperation(type: QUERY) { id status errorCode objectCount url }
+}
+"""
+
+# Inventory levels read per productVariants page when the bulk operation is
+# not available: the variants per page are this divided by the number of
+# synced locations, at most 50. 500 levels keep each page well under
+# Shopify's 1000 point query cost limit.
+RECONCILE_LEVELS_PER_PAGE = 500
+RECONCILE_PAGE_SIZE = 50
+
+# One aliased inventoryLevel field per synced location is inserted in place
+# of %(levels)s, so exactly the mapped locations are read, however many
+# locations the items are stocked at.
+INVENTORY_LEVELS_QUERY = """
+query inventoryLevels($first: Int!, $after: String) {
+  productVariants(first: $first, after: $after) {
+    nodes {
+      sku
+      inventoryItem {
+        legacyResourceId
+        tracked
+        %(levels)s
+      }
+    }
+    pageInfo { hasNextPage endCursor }
+  }
+}
+"""
+
+LOCATION_LEVEL_FIELD = """
+        location_%(id)s: inventoryLevel(locationId: "gid://shopify/Location/%(id)s") {
+          quantities(names: ["available"]) { name quantity }
+        }"""
+
+
+class ShopifyInventoryDrift(models.Model):
+    _name = 'shopify.inventory.drift'
+    _description = 'Shopify Inventory Drift'
+    _order = 'run_at desc, id'
+
+    run_at = fields.Datetime('Reconciled At', required=True, index=True)
+    store_id = fields.Many2one('shopify.store', string='Store', required=True, ondelete='cascade')
+    product_id = fields.Many2one('product.product', string='Product', ondelete='cascade')
+    sku = fields.Char('SKU')
+    shopify_location_id = fields.Char('Shopify Location ID')
+    location_id = fields.Many2one('stock.location', string='Odoo Location', ondelete='cascade')
+    odoo_qty = fields.Float('Odoo Quantity')
+    shopify_qty = fields.Float('Shopify Quantity')
+    difference = fields.Float('Difference', help='Odoo quantity minus Shopify quantity.')
+    action = fields.Selection(
+        [('pushed', 'Pushed to Shopify'), ('pulled', 'Pulled into Odoo'), ('reported', 'Reported')],
+        string='Action',
+    )
+
+
+class ShopifyInventoryReconciliation(models.AbstractModel):
+    _name = 'shopify.inventory.reconciliation'
+    _description = 'Shopify Inventory Reconciliation'
+
+    def reconcile(self, store):
+        """Compare the stock of every synced location of ``store`` with Shopify and fix the drift.
+
+        Shopify's levels are read with one bulk operation over the variants,
+        with the level of each mapped location nested, and Odoo's with one grouped quant query per
+        mapped location. Items Shopify does not stock at a location are not
+        compared there. Only the mismatches are acted upon, as set
+        by ``store.inventory_source_of_truth``: pushed to Shopify, pulled into
+        Odoo, or only reported. Every mismatch gets a
+        ``shopify.inventory.drift`` line. Returns the number of mismatches.
+        """
+        locations = dict(store._inventory_locations())
+        if not locations:
+            _logger.warning("No synced location for %s, skipping inventory reconciliation", store.name)
+            return 0
+
+        shopify_levels, item_by_sku = self._fetch_shopify_levels(store, locations)
+        products = self.env['product.product'].search([('default_code', 'in', list(item_by_sku))])
+        product_by_sku = {product.default_code: product for product in products}
+        self._add_missing_mappings(store, item_by_sku, product_by_sku)
+
+        drift = []
+        for shopify_location_id, location in locations.items():
+            odoo_levels = self._odoo_quantities(location, products)
+            for sku, product in product_by_sku.items():
+                if (sku, shopify_location_id) not in shopify_levels:
+                    # Not stocked at this Shopify location: there is no level to compare with.
+                    continue
+                odoo_qty = odoo_levels.get(product.id, 0.0)
+                shopify_qty = shopify_levels[sku, shopify_location_id]
+                if int(odoo_qty) != shopify_qty:
+                    drift.append((product, sku, shopify_location_id, location, odoo_qty, shopify_qty))
+
+        policy = store.inventory_source_of_truth
+        if drift and policy == 'odoo':
+            quantities_by_location = defaultdict(dict)
+            for product, _sku, shopify_location_id, _location, odoo_qty, _shopify_qty in drift:
+                quantities_by_location[shopify_location_id][product.id] = odoo_qty
+            self.env['shopify.store']._push_inventory_levels({store: dict(quantities_by_location)})
+        elif drift and policy == 'shopify':
+            self._pull_levels(store, drift)
+
+        run_at = fields.Datetime.now()
+        action = {'odoo': 'pushed', 'shopify': 'pulled'}.get(policy, 'reported')
+        self.env['shopify.inventory.drift'].create([{
+            'run_at': run_at,
+            'store_id': store.id,
+            'product_id': product.id,
+            'sku': sku,
+            'shopify_location_id': shopify_location_id,
+            'location_id': location.id,
+            'odoo_qty': odoo_qty,
+            'shopify_qty': shopify_qty,
+            'difference': odoo_qty - shopify_qty,
+            'action': action,
+        } for product, sku, shopify_location_id, location, odoo_qty, shopify_qty in drift])
+        _logger.info("Reconciled inventory of %s: %s SKUs, %s mismatches, %s",
+                     store.name, len(product_by_sku), len(drift), action)
+        return len(drift)
+
+    def _fetch_shopify_levels(self, store, locations):
+        """Return ``({(sku, shopify_location_id): available}, {sku: inventory_item_id})`` of tracked variants.
+
+        The levels are read with a bulk operation, whose JSONL result is
+        downloaded in one request; when Shopify refuses or fails it, they are
+        read with paged ``productVariants`` queries instead. Only the levels
+        Shopify returned are in the first dict; an item not stocked at a
+        synced location has no entry for it.
+        """
+        url = f"https://{store.api_key}:{store.api_password}@{store.shopify_url}/admin/api/2025-01/graphql.json"
+        levels_fields = ''.join(LOCATION_LEVEL_FIELD % {'id': int(location_id)} for location_id in locations)
+        try:
+            return self._fetch_bulk_levels(store, locations, url, levels_fields)
+        except (ValueError, requests.exceptions.RequestException) as e:
+            _logger.warning("Bulk inventory query failed for %s, reading the levels page by page: %s", store.name, e)
+            return self._fetch_paged_levels(store, locations, url, levels_fields)
+
+    def _fetch_bulk_levels(self, store, locations, url, levels_fields):
+        """Read the levels with ``bulkOperationRunQuery``, wait for it and parse its JSONL result."""
+        body = self._graphql(store, url, BULK_INVENTORY_QUERY % {'levels': levels_fields})
+        result = body['data']['bulkOperationRunQuery']
+        if result.get('userErrors'):
+            raise ValueError(f"Bulk operation refused: {result['userErrors']}")
+        operation_id = result['bulkOperation']['id']
+
+        deadline = time.monotonic() + BULK_TIMEOUT_SECONDS
+        while True:
+            operation = self._graphql(store, url, BULK_OPERATION_QUERY)['data']['currentBulkOperation'] or {}
+            if operation.get('id') != operation_id:
+                raise ValueError(f"Bulk operation {operation_id} was replaced by {operation.get('id')}")
+            if operation['status'] == 'COMPLETED':
+                break
+            if operation['status'] not in ('CREATED', 'RUNNING'):
+                raise ValueError(f"Bulk operation {operation['status']}: {operation.get('errorCode')}")
+            if time.monotonic() > deadline:
+                raise ValueError(f"Bulk operation still {operation['status']} after {BULK_TIMEOUT_SECONDS}s")
+            time.sleep(BULK_POLL_SECONDS)
+
+        levels = {}
+        item_by_sku = {}
+        if not operation.get('url'):
+            # Completed without any object: the shop has no variant.
+            return levels, item_by_sku
+        response = store._shopify_request('get', operation['url'], 'inventory', stream=True)
+        if response.status_code != 200:
+            raise ValueError(f"Bulk operation result download failed: {response.status_code}")
+        for line in response.iter_lines():
+            if line:
+                self._read_variant(json.loads(line), locations, levels, item_by_sku)
+        _logger.info("Read %s inventory items of %s with a bulk operation", len(item_by_sku), store.name)
+        return levels, item_by_sku
+
+    def _fetch_paged_levels(self, store, locations, url, levels_fields):
+        """Read the levels with paged ``productVariants`` queries."""
+        query = INVENTORY_LEVELS_QUERY % {'levels': levels_fields}
+        page_size = max(1, min(RECONCILE_PAGE_SIZE, RECONCILE_LEVELS_PER_PAGE // len(locations)))
+        levels = {}
+        item_by_sku = {}
+        after = None
+        while True:
+            variants = self._graphql(store, url, query, {'first': page_size, 'after': after})['data']['productVariants']
+            for variant in variants['nodes']:
+                self._read_variant(variant, locations, levels, item_by_sku)
+            if not variants['pageInfo']['hasNextPage']:
+                return levels, item_by_sku
+            after = variants['pageInfo']['endCursor']
+
+    def _graphql(self, store, url, query, variables=None):
+        """Run a GraphQL query against ``store`` and return its body, raising ``ValueError`` on errors."""
+        payload = {'query': query}
+        if variables is not None:
+            payload['variables'] = variables
+        response = store._shopify_request('post', url, 'inventory', json=payload)
+        body = response.json() if response.status_code == 200 else {}
+        if response.status_code != 200 or body.get('errors'):
+            raise ValueError(f"Inventory levels query failed: {body.get('errors') or response.text[:500]}")
+        return body
+
+    def _read_variant(self, variant, locations, levels, item_by_sku):
+        """Add the inventory item and the synced locations' levels of a tracked ``variant`` node."""
+        item = variant.get('inventoryItem') or {}
+        sku = variant.get('sku')
+        if not sku or not item.get('tracked', True):
+            return
+        item_by_sku[sku] = item['legacyResourceId']
+        for shopify_location_id in locations:
+            level = item.get(f'location_{int(shopify_location_id)}')
+            available = next((q['quantity'] for q in (level or {}).get('quantities', [])
+                              if q['name'] == 'available'), None)
+            if available is not None:
+                levels[sku, shopify_location_id] = available
+
+    def _odoo_quantities(self, location, products):
+        """Return ``{product_id: quantity}`` on hand in ``location`` and its children, in one grouped query."""
+        groups = self.env['stock.quant'].read_group(
+            [('location_id', 'child_of', location.id), ('product_id', 'in', products.ids)],
+            ['quantity:sum'],
+            ['product_id'],
+        )
+        return {group['product_id'][0]: group['quantity'] for group in groups}
+
+    def _add_missing_mappings(self, store, item_by_sku, product_by_sku):
+        """Record the inventory items of known SKUs that have no ``shopify.product.mapping`` yet."""
+        Mapping = self.env['shopify.product.mapping'].sudo()
+        mapped = set(Mapping.search([('store_id', '=', store.id), ('sku', 'in', list(product_by_sku))]).mapped('sku'))
+        missing = [sku for sku in product_by_sku if sku not in mapped]
+        if missing:
+            Mapping.create([{
+                'store_id': store.id,
+                'sku': sku,
+                'inventory_item_id': item_by_sku[sku],
+            } for sku in missing])
+
+    def _pull_levels(self, store, drift):
+        """Move the Odoo quants of the mismatches to Shopify's quantities, read in one search.
+
+        The other stores syncing the same locations are updated once, when
+        the batch ends.
+        """
+        Quant = self.env['stock.quant'].sudo()
+        quant_by_pair = {}
+        for quant in Quant.search([
+            ('product_id', 'in', list({line[0].id for line in drift})),
+            ('location_id', 'in', list({line[3].id for line in drift})),
+        ], order='id'):
+            quant_by_pair.setdefault((quant.product_id.id, quant.location_id.id), quant)
+        with shopify_sync_batch(self.env, origin='shopify', source_store=store):
+            vals_list = []
+            for product, _sku, _shopify_location_id, location, odoo_qty, shopify_qty in drift:
+                quant = quant_by_pair.get((product.id, location.id))
+                difference = shopify_qty - odoo_qty
+                if quant:
+                    quant.write({'quantity': quant.quantity + difference})
+                else:
+                    vals_list.append({
+                        'product_id': product.id,
+                        'location_id': location.id,
+                        'quantity': difference,
+                        'company_id': location.company_id.id or store.warehouse_id.company_id.id,
+                    })
+            Quant.create(vals_list)
@@ -0,0 +1,43 @@
+from odoo import api, models, fields
+
+
+class ShopifyLocationMapping(models.Model):
+    _name = 'shopify.location.mapping'
+    _description = 'Shopify Location to Odoo Stock Location'
+    _order = 'store_id, id'
+
+    store_id = fields.Many2one('shopify.store', string='Store', required=True, ondelete='cascade')
+    shopify_location_id = fields.Char('Shopify Location ID', required=True)
+    name = fields.Char('Shopify Location')
+    location_id = fields.Many2one(
+        'stock.location', string='Odoo Location', domain=[('usage', '=', 'internal')], ondelete='restrict',
+        help='Stock of this location and its children is pushed to the Shopify location. '
+             'Leave empty to not sync the Shopify location.',
+    )
+    active = fields.Boolean(default=True)
+
+    _sql_constraints = [
+        ('store_location_uniq', 'unique(store_id, shopify_location_id)', 'This Shopify location is already mapped.'),
+    ]
+
+    @api.model
+    def _create_missing(self, store, locations):
+        """Create mappings for the Shopify ``locations`` (API dicts) of ``store`` not known yet.
+
+        The store's primary location is mapped to its warehouse stock
+        location; the others are created unmapped, to be set by the user.
+        """
+        known = set(self.with_context(active_test=False).search([('store_id', '=', store.id)]).mapped('shopify_location_id'))
+        vals_list = []
+        for location in locations:
+            shopify_location_id = str(location.get('id'))
+            if shopify_location_id in known or not location.get('active', True):
+                continue
+            primary = shopify_location_id == store.location_id
+            vals_list.append({
+                'store_id': store.id,
+                'shopify_location_id': shopify_location_id,
+                'name': location.get('name'),
+                'location_id': store.warehouse_id.lot_stock_id.id if primary else False,
+            })
+        return self.create(vals_list)
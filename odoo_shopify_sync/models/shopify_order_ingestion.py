@@ -0,0 +1,375 @@
+import logging
+from datetime import datetime
+
+import psycopg2
+import pytz
+
+from odoo import models, fields, tools
+
+from ..tools.sync_batch import shopify_sync_batch
+
+_logger = logging.getLogger(__name__)
+
+CANCEL_FINANCIAL_STATUSES = ('refunded', 'partially_refunded', 'voided')
+PAID_FINANCIAL_STATUSES = ('paid', 'partially_paid')
+SHIPPED_FULFILLMENT_STATUSES = ('fulfilled', 'partial')
+
+
+class ShopifyOrderIngestion(models.AbstractModel):
+    _name = 'shopify.order.ingestion'
+    _description = 'Shopify Order Ingestion'
+
+    def ingest_orders(self, store, orders):
+        """Create or update the sale orders of a batch of Shopify order payloads.
+
+        Used by the order cron, the order webhooks and ``shopify.order.sync``.
+        Customers and products of the whole batch are read in one query each,
+        and orders are locked in a fixed order so that two workers ingesting
+        overlapping batches cannot deadlock. Nothing is committed;
+        each order runs in its own savepoint so one bad payload does not undo
+        the others. Deliveries and accounting run afterwards as one stage each
+        for the whole batch, see :meth:`_run_stage`.
+
+        Returns one dict per payload, in input order, with the keys
+        ``shopify_order_id``, ``status`` (``created``, ``updated``,
+        ``skipped`` or ``error``), ``order`` and ``message``.
+        """
+        SaleOrder = self.env['sale.order']
+        results = {}
+        valid = []
+        for index, order in enumerate(orders):
+            if isinstance(order, dict) and order.get('id'):
+                valid.append((index, order))
+            else:
+                _logger.error("Invalid Shopify order payload: %s", order)
+                results[index] = self._result(order, 'error', message='Invalid order payload')
+
+        partners = self._prefetch_partners([order for _index, order in valid])
+        products = self._prefetch_products([order for _index, order in valid])
+        if any(not self._match_partner(order, partners) for _index, order in valid):
+            # Resolved before the savepoints so a rolled back order cannot take it along.
+            partners['guest'] = self._get_guest_partner()
+
+        stages = {'deliver': [], 'invoice': []}
+        for index, order in sorted(valid, key=lambda item: str(item[1]['id'])):
+            shopify_order_id = str(order['id'])
+            try:
+                with self.env.cr.savepoint():
+                    SaleOrder._lock_shopify_order(store, shopify_order_id)
+                    odoo_order = SaleOrder._find_shopify_order(store, shopify_order_id)
+                    if odoo_order:
+                        self._update_order(odoo_order, order, stages, index)
+                        results[index] = self._result(order, 'updated', odoo_order)
+                    elif order.get('cancelled_at'):
+                        _logger.info("Shopify order %s was cancelled before it was imported, skipping", shopify_order_id)
+                        results[index] = self._result(order, 'skipped', message='Cancelled before import')
+                    else:
+                        odoo_order = self._create_order(store, order, partners, products, stages, index)
+                        status = 'created' if odoo_order else 'skipped'
+                        results[index] = self._result(order, status, odoo_order)
+            except psycopg2.OperationalError:
+                # Serialization failures and lost connections invalidate the
+                # whole transaction; let the caller's retry handle them.
+                raise
+            except Exception as e:
+                _logger.error("Failed to ingest Shopify order %s: %s", shopify_order_id, e)
+                results[index] = self._result(order, 'error', message=str(e))
+
+        self._run_stage(self._deliver_orders, stages['deliver'], results)
+        self._run_stage(self._invoice_orders, stages['invoice'], results)
+        return [results[index] for index in range(len(orders))]
+
+    def _run_stage(self, stage, entries, results):
+        """Run ``stage`` on all ``(index, sale.order, payload)`` entries at once.
+
+        If the batch fails, it is retried one order at a time so a single
+        problematic order only loses its own step; the error is reported in
+        that order's result message.
+        """
+        if not entries:
+            return
+        try:
+            with self.env.cr.savepoint():
+                stage(entries)
+            return
+        except psycopg2.OperationalError:
+            raise
+        except Exception as e:
+            _logger.warning("Batched %s of %s orders failed, retrying one by one: %s", stage.__name__, len(entries), e)
+        for entry in entries:
+            try:
+                with self.env.cr.savepoint():
+                    stage([entry])
+            except psycopg2.OperationalError:
+                raise
+            except Exception as e:
+                index, odoo_order, order = entry
+                _logger.error("%s failed for Shopify Order ID %s: %s", stage.__name__, order.get('id'), e)
+                results[index]['message'] = f"{stage.__name__}: {e}"
+
+    def _result(self, order, status, odoo_order=None, message=''):
+        return {
+            'shopify_order_id': str(order.get('id')) if isinstance(order, dict) else False,
+            'status': status,
+            'order': odoo_order or self.env['sale.order'],
+            'message': message,
+        }
+
+    def _order_customer_keys(self, order):
+        customer_data = order.get('customer')
+        if customer_data and isinstance(customer_data, dict):
+            shopify_customer_id = str(customer_data['id']) if customer_data.get('id') else False
+            return shopify_customer_id, customer_data.get('email') or order.get('email')
+        return False, order.get('email')
+
+    def _prefetch_partners(self, orders):
+        """Return ``{('id', shopify_customer_id) | ('email', email): partner}`` for the batch."""
+        customer_ids, emails = set(), set()
+        for order in orders:
+            shopify_customer_id, email = self._order_customer_keys(order)
+            if shopify_customer_id:
+                customer_ids.add(shopify_customer_id)
+            if email:
+                emails.add(email)
+        partners = {}
+        if customer_ids or emails:
+            for partner in self.env['res.partner'].search([
+                '|',
+                ('shopify_customer_id', 'in', list(customer_ids)),
+                ('email', 'in', list(emails)),
+            ]):
+                if partner.shopify_customer_id:
+                    partners.setdefault(('id', partner.shopify_customer_id), partner)
+                if partner.email:
+                    partners.setdefault(('email', partner.email), partner)
+        return partners
+
+    def _prefetch_products(self, orders):
+        """Return ``{sku: product}`` for every SKU ordered in the batch."""
+        skus = {
+            line.get('sku')
+            for order in orders
+            for line in order.get('line_items') or []
+            if isinstance(line, dict) and line.get('sku')
+        }
+        products = {}
+        if skus:
+            for product in self.env['product.product'].search([('default_code', 'in', list(skus))]):
+                products.setdefault(product.default_code, product)
+        return products
+
+    def _match_partner(self, order, partners):
+        shopify_customer_id, email = self._order_customer_keys(order)
+        return partners.get(('id', shopify_customer_id)) or partners.get(('email', email))
+
+    def _get_guest_partner(self):
+        guest = self.env['res.partner'].search([('name', '=', 'Guest Customer')], limit=1)
+        if not guest:
+            guest = self.env['res.partner'].create({
+                'name': 'Guest Customer',
+                'email': 'guest@example.com',
+                'phone': '',
+            })
+        return guest
+
+    def _get_partner(self, order, partners):
+        if not isinstance(order.get('customer'), dict):
+            _logger.warning("No customer data found for Shopify Order ID %s", order.get('id'))
+        return self._match_partner(order, partners) or partners['guest']
+
+    def _parse_date_order(self, order):
+        shopify_date = order.get('created_at')
+        if shopify_date:
+            try:
+                dt = datetime.strptime(shopify_date, '%Y-%m-%dT%H:%M:%S%z')
+                return dt.astimezone(pytz.UTC).strftime('%Y-%m-%d %H:%M:%S')
+            except ValueError as e:
+                _logger.error("Invalid date format for Shopify Order ID %s: %s - %s", order.get('id'), shopify_date, e)
+        return fields.Datetime.now()
+
+    def _prepare_order_lines(self, order, products):
+        """Merge the line items per SKU and return the ``order_line`` create commands."""
+        shopify_order_id = order.get('id')
+        product_quantities = {}
+        for line in order.get('line_items') or []:
+            if not isinstance(line, dict):
+                _logger.warning("Invalid line item for Shopify Order ID %s: %s", shopify_order_id, line)
+                continue
+            sku = line.get('sku')
+            if not sku:
+                _logger.warning("Line item missing SKU for Shopify Order ID %s: %s", shopify_order_id, line)
+                continue
+            quantity = line.get('quantity', 0)
+            price = float(line.get('price', 0.0))
+            if sku in product_quantities:
+                product_quantities[sku]['quantity'] += quantity
+                product_quantities[sku]['price'] = price
+            else:
+                product_quantities[sku] = {'quantity': quantity, 'price': price}
+
+        commands = []
+        for sku, data in product_quantities.items():
+            product = products.get(sku)
+            if not product:
+                _logger.warning("Product with SKU %s not found for Shopify Order ID %s", sku, shopify_order_id)
+                continue
+            commands.append((0, 0, {
+                'product_id': product.id,
+                'product_uom_qty': data['quantity'],
+                'price_unit': data['price'],
+                'tax_id': [(6, 0, [])],
+            }))
+        return commands
+
+    def _create_order(self, store, order, partners, products, stages, index):
+        shopify_order_id = str(order['id'])
+        odoo_order = self.env['sale.order']._create_shopify_order({
+            'partner_id': self._get_partner(order, partners).id,
+            'shopify_order_id': shopify_order_id,
+            'shopify_store_id': store.id,
+            'date_order': self._parse_date_order(order),
+            'state': 'draft',
+            'origin': f"Shopify Order #{order.get('name', shopify_order_id)}",
+            'warehouse_id': store.warehouse_id.id,
+            'order_line': self._prepare_order_lines(order, products),
+        })
+        if not odoo_order:
+            return odoo_order
+
+        financial_status = order.get('financial_status', 'pending')
+        fulfillment_status = order.get('fulfillment_status')
+        if fulfillment_status in SHIPPED_FULFILLMENT_STATUSES or financial_status in PAID_FINANCIAL_STATUSES:
+            if odoo_order.state in ('draft', 'sent'):
+                odoo_order.action_confirm()
+            if financial_status in PAID_FINANCIAL_STATUSES:
+                stages['invoice'].append((index, odoo_order, order))
+            if fulfillment_status in SHIPPED_FULFILLMENT_STATUSES:
+                stages['deliver'].append((index, odoo_order, order))
+        if financial_status in CANCEL_FINANCIAL_STATUSES and odoo_order.state != 'cancel':
+            odoo_order.action_cancel()
+
+        _logger.info("Created Sales Order %s for Shopify Order %s", odoo_order.name, shopify_order_id)
+        return odoo_order
+
+    def _update_order(self, odoo_order, order, stages, index):
+        financial_status = order.get('financial_status', 'pending')
+        fulfillment_status = order.get('fulfillment_status')
+
+        if order.get('cancelled_at') or financial_status in CANCEL_FINANCIAL_STATUSES:
+            if odoo_order.state != 'cancel':
+                odoo_order.action_cancel()
+                _logger.info("Cancelled Sales Order %s for Shopify Order %s", odoo_order.name, order['id'])
+        elif ((fulfillment_status in SHIPPED_FULFILLMENT_STATUSES or financial_status in PAID_FINANCIAL_STATUSES)
+              and odoo_order.state in ('draft', 'sent')):
+            odoo_order.action_confirm()
+            if financial_status in PAID_FINANCIAL_STATUSES:
+                stages['invoice'].append((index, odoo_order, order))
+            if fulfillment_status in SHIPPED_FULFILLMENT_STATUSES:
+                stages['deliver'].append((index, odoo_order, order))
+
+        _logger.debug("Order %s already synced as %s, checked status updates", order['id'], odoo_order.name)
+
+    def _invoice_orders(self, entries):
+        """Invoice the confirmed orders of a batch and register payment for the fully paid ones.
+
+        One invoice is created per order and all invoices are posted together.
+        The cash journal of each company is cached per worker, see
+        ``_cash_journal_id``. The paid invoices of each company are
+        registered in one grouped ``account.payment.register`` run, which
+        creates one payment per customer in the journal and reconciles it
+        with all of that customer's invoices. Odoo's payments carry a single
+        partner, so that is the coarsest grouping that still reconciles.
+        """
+        orders = self.env['sale.order'].browse([odoo_order.id for _index, odoo_order, _order in entries])
+        orders = orders.filtered(lambda o: o.state == 'sale' and not o.invoice_ids)
+        if not orders:
+            return
+        paid_order_ids = {
+            odoo_order.id for _index, odoo_order, order in entries
+            if order.get('financial_status') == 'paid'
+        }
+
+        invoices = orders._create_invoices(grouped=True)
+        invoices.action_post()
+
+        invoices_by_company = {}
+        for invoice in invoices:
+            if set(invoice.invoice_line_ids.sale_line_ids.order_id.ids) & paid_order_ids:
+                invoices_by_company.setdefault(invoice.company_id, self.env['account.move'])
+                invoices_by_company[invoice.company_id] |= invoice
+
+        paid_count = 0
+        for company, company_invoices in invoices_by_company.items():
+            journal = self.env['account.journal'].browse(self._cash_journal_id(company.id)).exists()
+            if not journal:
+                # Forget the missing or deleted journal so the next batch searches again.
+                self.env.registry.clear_cache()
+                _logger.error("No cash journal found in %s for payment of %s Shopify invoices", company.name, len(company_invoices))
+                continue
+            self.env['account.payment.register'].with_context(
+                active_model='account.move',
+                active_ids=company_invoices.ids,
+            ).create({
+                'journal_id': journal.id,
+                'payment_date': fields.Date.context_today(self),
+                'group_payment': True,
+            })._create_payments()
+            paid_count += len(company_invoices)
+
+        _logger.info("Invoiced %s Shopify orders, %s of them paid", len(invoices), paid_count)
+
+    @tools.ormcache('company_id')
+    def _cash_journal_id(self, company_id):
+        """Return the id of the cash journal Shopify payments of ``company_id`` go to, or False."""
+        return self.env['account.journal'].sudo().search([
+            ('type', '=', 'cash'),
+            ('company_id', '=', company_id),
+        ], limit=1).id
+
+    def _deliver_orders(self, entries):
+        """Validate the open deliveries of the shipped orders of a batch.
+
+        Shopify already took the fulfilled quantities out of its stock and
+        Odoo's on-hand quantities follow Shopify's, so the stock the
+        validation removes is put back. The quantities come from one
+        ``read_group`` over the validated move lines, per product, location
+        and lot. Both steps run in a Shopify-origin sync batch so the quant
+        hooks do not push every intermediate quantity back to Shopify.
+        """
+        orders = self.env['sale.order'].browse([odoo_order.id for _index, odoo_order, _order in entries])
+        orders = orders.filtered(
+            lambda o: o.state == 'sale' and not o.picking_ids.filtered(lambda p: p.state == 'done')
+        )
+        if not orders:
+            return
+        unconfirmed = orders.filtered(lambda o: not o.picking_ids.filtered(lambda p: p.state not in ('done', 'cancel')))
+        if unconfirmed:
+            unconfirmed.action_confirm()
+        pickings = orders.picking_ids.filtered(lambda p: p.state not in ('done', 'cancel'))
+        for order in orders - pickings.sale_id:
+            _logger.error("No picking created for Shopify Order ID %s despite confirmation", order.shopify_order_id)
+        if not pickings:
+            return
+
+        with shopify_sync_batch(self.env, origin='shopify'):
+            pickings.with_context(skip_backorder=True).button_validate()
+
+            delivered = self.env['stock.move.line'].read_group(
+                [('picking_id', 'in', pickings.ids), ('state', '=', 'done')],
+                ['quantity_product_uom:sum'],
+                ['product_id', 'location_id', 'lot_id'],
+                lazy=False,
+            )
+            Quant = self.env['stock.quant'].sudo()
+            for group in delivered:
+                if not group['quantity_product_uom']:
+                    continue
+                Quant._update_available_quantity(
+                    self.env['product.product'].browse(group['product_id'][0]),
+                    self.env['stock.location'].browse(group['location_id'][0]),
+                    group['quantity_product_uom'],
+                    lot_id=self.env['stock.lot'].browse(group['lot_id'][0]) if group['lot_id'] else None,
+                )
+
+        _logger.info("Validated %s deliveries of %s Shopify orders and restored %s stock lines",
+                     len(pickings), len(orders), len(delivered))
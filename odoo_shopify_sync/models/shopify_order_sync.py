@@ -27,74 +27,44 @@ class ShopifySalesOrderSync(models.Model):
             response = requests.get(url)
             
             if response.status_code == 200:
-                orders = response.json().get('orders', [])
-                for order in orders:
-                    self.create_odoo_sales_order(order, store)
+                self.create_odoo_sales_orders(response.json().get('orders', []), store)
             else:
-                _logger.error(f"Failed to fetch orders from {store.name}: {response.text}")
+                _logger.error("Failed to fetch orders from %s: %s", store.name, response.text)
 
-    def create_odoo_sales_order(self, shopify_order, store):
-        """ Convert Shopify Order to Odoo Sales Order """
-        shopify_order_id = str(shopify_order.get('id'))
-        existing_mapping = self.search([('shopify_order_id', '=', shopify_order_id), ('store_id', '=', store.id)], limit=1)
-        
-        if existing_mapping:
-            _logger.info(f"Skipping existing Shopify Order {shopify_order_id} in store {store.name}")
-            return existing_mapping.odoo_order_id
+    def create_odoo_sales_orders(self, shopify_orders, store):
+        """Convert a page of Shopify orders to Odoo sales orders, in one ``ingest_orders`` batch.
 
-        # Get or create the customer
-        customer = self.get_or_create_customer(shopify_order.get('customer', {}))
-        
-        # Create sales order in Odoo
-        order_vals = {
-            'partner_id': customer.id,
-            'date_order': shopify_order.get('created_at', fields.Datetime.now()),
-            'shopify_order_id': shopify_order_id,
-            'order_line': self.get_order_lines(shopify_order, store),
+        Orders mapped already are skipped with one mapping query. Returns the
+        sale order of each Shopify order, in order; empty for the orders
+        that could not be imported.
+        """
+        shopify_order_ids = [str(order.get('id')) for order in shopify_orders]
+        existing = {
+            mapping.shopify_order_id: mapping.odoo_order_id
+            for mapping in self.search([('shopify_order_id', 'in', shopify_order_ids), ('store_id', '=', store.id)])
         }
-        
-        odoo_order = self.env['sale.order'].create(order_vals)
-        
-        # Map Shopify Order with Odoo
-        self.create({
-            'store_id': store.id,
-            'shopify_order_id': shopify_order_id,
-            'odoo_order_id': odoo_order.id,
-            'order_status': 'confirmed'
-        })
-
-        return odoo_order
-
-    def get_or_create_customer(self, shopify_customer):
-        """ Fetch or create customer in Odoo based on Shopify customer details """
-        if not shopify_customer:
-            return self.env['res.partner'].browse(self.env['res.partner'].search([], limit=1).id)
-        
-        email = shopify_customer.get('email')
-        existing_customer = self.env['res.partner'].search([('email', '=', email)], limit=1)
-        
-        if existing_customer:
-            return existing_customer
-
-        return self.env['res.partner'].create({
-            'name': shopify_customer.get('first_name', '') + ' ' + shopify_customer.get('last_name', ''),
-            'email': email,
-            'phone': shopify_customer.get('phone'),
-        })
+        if existing:
+            _logger.info("Skipping %s existing Shopify orders in store %s", len(existing), store.name)
+        new_orders = [order for order, order_id in zip(shopify_orders, shopify_order_ids) if order_id not in existing]
+        results = self.env['shopify.order.ingestion'].ingest_orders(store, new_orders) if new_orders else []
 
-    def get_order_lines(self, shopify_order, store):
-        """ Map Shopify order items to Odoo order lines """
-        order_lines = []
-        for item in shopify_order.get('line_items', []):
-            product = self.env['product.product'].search([('default_code', '=', item.get('sku'))], limit=1)
-            if not product:
-                _logger.warning(f"Product with SKU {item.get('sku')} not found in Odoo. Skipping line item.")
+        odoo_orders = dict(existing)
+        mappings = []
+        for order, result in zip(new_orders, results):
+            shopify_order_id = str(order.get('id'))
+            odoo_orders[shopify_order_id] = result['order']
+            if not result['order']:
+                _logger.warning("Shopify order %s was not imported: %s", shopify_order_id, result['message'] or result['status'])
                 continue
-            
-            order_lines.append((0, 0, {
-                'product_id': product.id,
-                'name': product.name,
-                'product_uom_qty': item.get('quantity', 1),
-                'price_unit': float(item.get('price', 0.0)),
-            }))
-        return order_lines
+            mappings.append({
+                'store_id': store.id,
+                'shopify_order_id': shopify_order_id,
+                'odoo_order_id': result['order'].id,
+                'order_status': 'confirmed',
+            })
+        self.create(mappings)
+        return [odoo_orders[order_id] for order_id in shopify_order_ids]
+
+    def create_odoo_sales_order(self, shopify_order, store):
+        """ Convert Shopify Order to Odoo Sales Order """
+        return self.create_odoo_sales_orders([shopify_order], store)[0]
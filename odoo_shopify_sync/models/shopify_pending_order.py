@@ -0,0 +1,138 @@
+import logging
+
+from odoo import api, models, fields
+
+from ..tools import metrics
+
+_logger = logging.getLogger(__name__)
+
+# Pending orders re-imported per store in one cron run.
+RETRY_BATCH_SIZE = 250
+
+# Orders fetched per orders.json?ids= call; 250 is the API's page limit.
+FETCH_CHUNK_SIZE = 250
+
+
+class ShopifyPendingOrder(models.Model):
+    _name = 'shopify.pending.order'
+    _description = 'Shopify Order Waiting for Products'
+    _order = 'create_date'
+
+    store_id = fields.Many2one('shopify.store', string='Store', required=True, ondelete='cascade')
+    shopify_order_id = fields.Char('Shopify Order ID', required=True)
+    name = fields.Char('Order Name')
+    sku_ids = fields.One2many('shopify.pending.order.sku', 'pending_id', string='Missing SKUs')
+    missing_skus = fields.Char('Missing SKUs', compute='_compute_missing_skus')
+    attempts = fields.Integer('Import Attempts', default=0)
+    last_error = fields.Char('Last Error')
+
+    _sql_constraints = [
+        ('store_order_uniq', 'unique(store_id, shopify_order_id)', 'This Shopify order is already pending.'),
+    ]
+
+    @api.depends('sku_ids.sku')
+    def _compute_missing_skus(self):
+        for pending in self:
+            pending.missing_skus = ', '.join(pending.sku_ids.mapped('sku'))
+
+    @api.model
+    def _defer(self, store, order, missing_skus):
+        """Park ``order`` until products exist for all of ``missing_skus``."""
+        shopify_order_id = str(order.get('id'))
+        pending = self.search([('store_id', '=', store.id), ('shopify_order_id', '=', shopify_order_id)], limit=1)
+        sku_commands = [(5, 0, 0)] + [(0, 0, {'sku': sku}) for sku in sorted(set(missing_skus))]
+        if pending:
+            pending.write({'sku_ids': sku_commands})
+        else:
+            self.create({
+                'store_id': store.id,
+                'shopify_order_id': shopify_order_id,
+                'name': order.get('name'),
+                'sku_ids': sku_commands,
+            })
+        _logger.info("Deferred Shopify order %s until SKUs %s exist", shopify_order_id, ', '.join(missing_skus))
+
+    @api.model
+    def _resolve_skus(self, skus):
+        """Mark ``skus`` as available; orders left without missing SKUs are re-imported by the cron."""
+        skus = [sku for sku in skus if sku]
+        if skus:
+            self.env['shopify.pending.order.sku'].sudo().search([('sku', 'in', skus)]).unlink()
+
+    @api.model
+    def _forget(self, store, shopify_order_ids):
+        if shopify_order_ids:
+            self.search([('store_id', '=', store.id), ('shopify_order_id', 'in', list(shopify_order_ids))]).unlink()
+
+    @api.model
+    def _cron_retry_ready(self):
+        """Re-import the pending orders whose products all exist now.
+
+        Only these orders are fetched again, up to 250 per ``orders.json?ids=``
+        call, so products arriving late never cause a re-scan of the order
+        history.
+        """
+        Jobs = self.env['shopify.sync.job']
+        for store in self.env['shopify.store'].search([('state', '=', 'active')]):
+            if self.search_count([('store_id', '=', store.id), ('sku_ids', '=', False)]):
+                Jobs._enqueue(store, 'pending_orders')
+            metrics.gauge(self.env, 'queue_depth', store.id, 'pending_order',
+                          self.search_count([('store_id', '=', store.id)]))
+        self.env.cr.commit()
+        Jobs._run_queue()
+
+    @api.model
+    def _retry_store(self, store):
+        ready = self.search([('store_id', '=', store.id), ('sku_ids', '=', False)], limit=RETRY_BATCH_SIZE)
+        if ready:
+            self._retry(store, ready)
+        metrics.gauge(self.env, 'queue_depth', store.id, 'pending_order',
+                      self.search_count([('store_id', '=', store.id)]))
+
+    def _retry(self, store, pending_orders):
+        orders = []
+        url = f"https://{store.api_key}:{store.api_password}@{store.shopify_url}/admin/api/2023-01/orders.json"
+        for start in range(0, len(pending_orders), FETCH_CHUNK_SIZE):
+            chunk = pending_orders[start:start + FETCH_CHUNK_SIZE]
+            response = store._shopify_request('get', url, 'order', params={
+                'ids': ','.join(chunk.mapped('shopify_order_id')),
+                'status': 'any',
+                'limit': FETCH_CHUNK_SIZE,
+            })
+            if response.status_code != 200:
+                for pending in chunk:
+                    pending.write({'attempts': pending.attempts + 1, 'last_error': f"{response.status_code}: {response.text[:200]}"})
+                continue
+            fetched = response.json().get('orders') or []
+            fetched_ids = {str(order.get('id')) for order in fetched}
+            gone = chunk.filtered(lambda p: p.shopify_order_id not in fetched_ids)
+            if gone:
+                _logger.info("Pending Shopify orders %s no longer exist, dropping them", ', '.join(gone.mapped('shopify_order_id')))
+                gone.unlink()
+            for order in fetched:
+                missing = store._missing_order_skus(order)
+                if missing:
+                    self._defer(store, order, missing)
+                else:
+                    orders.append(order)
+        self.env.cr.commit()
+        if not orders:
+            return
+
+        results = store.sync_orders(orders, store)
+        done = {result['shopify_order_id'] for result in results if result['status'] in ('created', 'updated')}
+        self._forget(store, done)
+        for result in results:
+            if result['shopify_order_id'] not in done:
+                pending = pending_orders.filtered(lambda p: p.exists() and p.shopify_order_id == result['shopify_order_id'])
+                pending.write({'attempts': pending.attempts + 1, 'last_error': result['message'] or result['status']})
+        self.env.cr.commit()
+        _logger.info("Re-imported %s of %s pending Shopify orders for %s", len(done), len(orders), store.name)
+
+
+class ShopifyPendingOrderSku(models.Model):
+    _name = 'shopify.pending.order.sku'
+    _description = 'Missing SKU of a Pending Shopify Order'
+
+    pending_id = fields.Many2one('shopify.pending.order', required=True, ondelete='cascade', index=True)
+    sku = fields.Char('SKU', required=True, index=True)
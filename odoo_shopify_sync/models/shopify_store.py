@@ -1,16 +1,24 @@
 from odoo import models, fields, api
+from odoo.tools.sql import create_index
 import requests
 import base64
 from datetime import datetime, timedelta
-from pytz import timezone
 import pytz
 import logging
 import psycopg2
 import psycopg2.extensions
+import threading
 import time
+from contextlib import contextmanager
 from functools import wraps
 import warnings
 
+from ..tools import async_client, metrics
+from ..tools.json_stream import iter_json_records
+from ..tools.retention import delete_in_chunks, retention_cutoff
+from ..tools.sync_batch import shopify_sync_batch
+from ..tools.sync_logging import PageStats
+
 # Suppress deprecation warning for invalid escape sequence
 warnings.filterwarnings("ignore", category=DeprecationWarning, message="invalid escape sequence")
 
@@ -26,7 +34,7 @@ def retry_on_db_errors(max_attempts=5, base_delay=1):
                 cr = None
                 env = args[0].env if args and hasattr(args[0], 'env') else kwargs.get('env')
                 try:
-                    _logger.debug(f"Creating new cursor for {func.__name__}, attempt {attempts + 1}")
+                    _logger.debug("Creating new cursor for %s, attempt %s", func.__name__, attempts + 1)
                     cr = env.registry.cursor()
                     new_env = env.__class__(cr, env.uid, env.context.copy())
                     if args and hasattr(args[0], 'env'):
@@ -35,7 +43,7 @@ def retry_on_db_errors(max_attempts=5, base_delay=1):
                     else:
                         kwargs['env'] = new_env
                     
-                    _logger.debug(f"Executing {func.__name__} with env type: {type(new_env)}, cursor active: {not cr.closed}")
+                    _logger.debug("Executing %s, cursor active: %s", func.__name__, not cr.closed)
                     result = func(*args, **kwargs)
                     cr.commit()
                     return result
@@ -45,13 +53,14 @@ def retry_on_db_errors(max_attempts=5, base_delay=1):
                         cr.rollback()
                         cr.close()
                     if attempts == max_attempts:
-                        _logger.error(f"Failed {func.__name__} after {max_attempts} attempts: {str(e)}")
+                        _logger.error("Failed %s after %s attempts: %s", func.__name__, max_attempts, e)
                         raise
                     delay = base_delay * (2 ** (attempts - 1))  # Exponential backoff
-                    _logger.info(f"Retrying {func.__name__} after DB error (attempt {attempts + 1}, delay {delay}s): {str(e)}")
+                    metrics.inc(env, 'db_retries', None, func.__name__)
+                    _logger.info("Retrying %s after DB error (attempt %s, delay %ss): %s", func.__name__, attempts + 1, delay, e)
                     time.sleep(delay)
                 except Exception as e:
-                    _logger.error(f"Unexpected error in {func.__name__}: {str(e)}")
+                    _logger.error("Unexpected error in %s: %s", func.__name__, e)
                     if cr and not cr.closed:
                         cr.rollback()
                         cr.close()
@@ -59,10 +68,48 @@ def retry_on_db_errors(max_attempts=5, base_delay=1):
                 finally:
                     if cr and not cr.closed:
                         cr.close()
-                        _logger.debug(f"Closed cursor for {func.__name__}")
+                        _logger.debug("Closed cursor for %s", func.__name__)
         return wrapper
     return decorator
 
+# Number of times a request is re-sent after Shopify answers 429 Too Many Requests.
+THROTTLE_RETRIES = 3
+
+# Orders ingested per transaction by the order cron.
+ORDER_BATCH_SIZE = 50
+
+# Inventory levels set per GraphQL inventorySetQuantities call.
+INVENTORY_BATCH_SIZE = 250
+
+INVENTORY_SET_MUTATION = """
+mutation inventorySetQuantities($input: InventorySetQuantitiesInput!) {
+  inventorySetQuantities(input: $input) {
+    userErrors { code field message }
+  }
+}
+"""
+
+# One requests.Session per thread, so calls reuse their TCP/TLS connections to Shopify.
+_http = threading.local()
+
+
+def _http_session():
+    session = getattr(_http, 'session', None)
+    if session is None:
+        session = _http.session = requests.Session()
+    return session
+
+
+def _parse_shopify_datetime(value):
+    """Return a Shopify ISO 8601 timestamp as a naive UTC datetime, or None."""
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%dT%H:%M:%S%z').astimezone(pytz.UTC).replace(tzinfo=None)
+    except ValueError:
+        _logger.warning("Invalid Shopify timestamp %s", value)
+        return None
+
 class ShopifyStore(models.Model):
     _name = 'shopify.store'
     _description = 'Shopify Store'
@@ -71,7 +118,15 @@ class ShopifyStore(models.Model):
     shopify_url = fields.Char('Shopify URL', required=True)
     api_key = fields.Char('API Key', required=True)
     api_password = fields.Char('API Password', required=True)
-    location_id = fields.Char('Shopify Location ID', help='Used for inventory synchronization')
+    location_id = fields.Char('Shopify Location ID', help='Primary Shopify location, mapped to the warehouse stock by default')
+    location_mapping_ids = fields.One2many('shopify.location.mapping', 'store_id', string='Locations')
+    inventory_source_of_truth = fields.Selection(
+        [('odoo', 'Odoo'), ('shopify', 'Shopify'), ('report', 'Report only')],
+        string='Inventory Source of Truth', default='odoo', required=True,
+        help='Side that wins when the inventory reconciliation finds a mismatch: '
+             'Odoo pushes its quantities, Shopify has its quantities pulled into Odoo, '
+             'Report only records the drift without changing anything.',
+    )
     warehouse_id = fields.Many2one(
         'stock.warehouse', 
         string='Warehouse', 
@@ -81,12 +136,16 @@ class ShopifyStore(models.Model):
     product_last_fetch_date = fields.Datetime('Last Product Fetch Date')
     order_last_fetch_date = fields.Datetime('Last Order Fetch Date')
     customer_last_fetch_date = fields.Datetime('Last Customer Fetch Date')
+    order_page_info = fields.Char('Order Pagination Cursor', copy=False)
+    order_max_updated_at = fields.Datetime('Latest Order Update of the Running Fetch', copy=False)
+    customer_page_info = fields.Char('Customer Pagination Cursor', copy=False)
+    customer_max_updated_at = fields.Datetime('Latest Customer Update of the Running Fetch', copy=False)
     webhook_url = fields.Char('Webhook URL', compute='_compute_webhook_url')
     state = fields.Selection([('draft', 'Draft'), ('active', 'Active')], default='active', tracking=True)
     current_page_info = fields.Char(string="Pagination Cursor")
     is_full_sync = fields.Boolean(string="Full Sync Completed", default=False)
+    sync_status_ids = fields.One2many('shopify.sync.status', 'store_id', string='Sync Health')
     log_count = fields.Integer('Sync Count', compute='_compute_log_count')
-    lock_cron = fields.Boolean(string="Cron Lock", default=False)
     
     def _valid_field_parameter(self, field, name):
         if name == 'tracking':
@@ -94,51 +153,113 @@ class ShopifyStore(models.Model):
         return super()._valid_field_parameter(field, name)
 
     def _compute_log_count(self):
+        """Count the sync logs of the displayed stores in one grouped query over the ``(store_id, sync_date)`` index."""
+        groups = self.env['shopify.sync.log'].read_group([('store_id', 'in', self.ids)], ['store_id'], ['store_id'])
+        counts = {group['store_id'][0]: group['store_id_count'] for group in groups}
         for store in self:
-            store.log_count = self.env['shopify.sync.log'].search_count([
-                ('store_id', '=', store.id)
-            ])
+            store.log_count = counts.get(store.id, 0)
+
+    @api.model
+    def _cron_purge_sync_data(self):
+        """Apply the retention of sync logs, sync history, metrics, drift reports and finished sync jobs.
+
+        Logs are purged one store at a time through the ``(store_id,
+        sync_date)`` index, in committed chunks.
+        """
+        cutoff = retention_cutoff(self.env, 'odoo_shopify_sync.log_retention_days')
+        if cutoff:
+            for store in self.with_context(active_test=False).search([]):
+                delete_in_chunks(self.env, 'shopify_sync_log', 'store_id = %s AND sync_date < %s', [store.id, cutoff])
+        self.env['shopify.sync.history'].clean_old_sync_history()
+        self.env['shopify.sync.metric']._gc_expired_hours()
+        cutoff = retention_cutoff(self.env, 'odoo_shopify_sync.drift_retention_days')
+        if cutoff:
+            delete_in_chunks(self.env, 'shopify_inventory_drift', 'run_at < %s', [cutoff])
+        cutoff = retention_cutoff(self.env, 'odoo_shopify_sync.job_retention_days')
+        if cutoff:
+            delete_in_chunks(self.env, 'shopify_sync_job', "state = 'done' AND finished_at < %s", [cutoff])
 
     @retry_on_db_errors()
-    def fetch_shopify_customers(self):
-        """Fetch and sync customers from Shopify."""
+    @metrics.instrument('inventory', 'fetch_duration')
+    def reconcile_inventory(self):
+        """Diff the inventory of these stores against Shopify, see ``shopify.inventory.reconciliation``."""
         for store in self:
-            last_fetch_date = store.customer_last_fetch_date or datetime(1970, 1, 1)
-            updated_at_min = last_fetch_date.strftime('%Y-%m-%dT%H:%M:%S')
+            self.env['shopify.inventory.reconciliation'].reconcile(store)
+            self.env.cr.commit()
 
-            base_url = f"https://{store.api_key}:{store.api_password}@{store.shopify_url}/admin/api/2023-01/customers.json"
-            params = {
-                'updated_at_min': updated_at_min,
-                'limit': 250,
-            }
+    @api.model
+    def _cron_reconcile_inventory(self):
+        Jobs = self.env['shopify.sync.job']
+        for store in self.search([('state', '=', 'active')]):
+            Jobs._enqueue(store, 'reconcile')
+        self.env.cr.commit()
+        Jobs._run_queue()
 
-            total_customers = 0
-            while True:
-                response = requests.get(base_url, params=params)
-                if response.status_code == 200:
-                    customers = response.json().get('customers', [])
+    def _shopify_request(self, method, url, entity, **kwargs):
+        """Send a request to this store's API, waiting out 429 responses and recording call metrics."""
+        for attempt in range(THROTTLE_RETRIES + 1):
+            start = time.monotonic()
+            try:
+                response = _http_session().request(method, url, **kwargs)
+            except requests.exceptions.RequestException:
+                metrics.inc(self.env, 'api_errors', self.id, entity)
+                raise
+            finally:
+                metrics.inc(self.env, 'api_calls', self.id, entity)
+                metrics.observe(self.env, 'api_latency', self.id, entity, time.monotonic() - start)
+            if response.status_code != 429 or attempt == THROTTLE_RETRIES:
+                break
+            wait = float(response.headers.get('Retry-After', 2))
+            metrics.observe(self.env, 'throttle_wait', self.id, entity, wait)
+            _logger.debug("Shopify throttled %s for store %s, waiting %ss", url.split('@')[-1], self.name, wait)
+            time.sleep(wait)
+        if response.status_code >= 400:
+            metrics.inc(self.env, 'api_errors', self.id, entity)
+        metrics.note_api_budget(self.env, self.id, response.headers.get('X-Shopify-Shop-Api-Call-Limit'))
+        return response
+
+    @retry_on_db_errors()
+    @metrics.instrument('customer', 'fetch_duration')
+    def fetch_shopify_customers(self):
+        """Fetch and sync customers from Shopify."""
+        Status = self.env['shopify.sync.status']
+        for store in self:
+            with store._sync_status_run('customer') as stats:
+                for customers in store._iter_changed_pages('customer', 'customers'):
                     for customer in customers:
                         self.sync_customer(customer, store)
                         self.env.cr.commit()
-                        total_customers += 1
-                        _logger.info(f"Synced customer {customer.get('id')} (Total synced: {total_customers})")
-
-                    link_header = response.headers.get('Link')
-                    if not link_header or 'rel="next"' not in link_header:
-                        break
-                    
-                    next_link = [link for link in link_header.split(',') if 'rel="next"' in link][0]
-                    page_info = next_link.split('page_info=')[1].split('>')[0]
-                    params = {'page_info': page_info, 'limit': 250}
-                else:
-                    _logger.error(f"Error fetching customers: {response.status_code} - {response.text}")
-                    break
-
-            store.customer_last_fetch_date = fields.Datetime.now()
-            _logger.info(f"Updated customer_last_fetch_date to {store.customer_last_fetch_date}")
-            _logger.info(f"Total customers synced: {total_customers}")
+                        stats.record('synced', customer.get('id'))
+                    stats.flush_page()
+                    Status._page_done(store, 'customer', *stats.run_totals())
+                stats.flush_run()
+                Status._run_finished(store, 'customer', *stats.run_totals(), watermark=store.customer_last_fetch_date)
+
+    @contextmanager
+    def _sync_status_run(self, entity):
+        """Track a sync run of ``entity`` in this store's ``shopify.sync.status`` row.
+
+        Marks the row running and yields the run's :class:`PageStats`; the
+        caller records the page and run totals. When the block raises, the
+        run is recorded as failed in its own transaction.
+        """
+        stats = PageStats(_logger, entity, self)
+        Status = self.env['shopify.sync.status']
+        Status._run_started(self, entity)
+        try:
+            yield stats
+        except Exception as e:
+            try:
+                # The run's transaction is lost anyway; record the failure on its own.
+                self.env.cr.rollback()
+                Status._run_finished(self, entity, *stats.run_totals(), error=e)
+                self.env.cr.commit()
+            except Exception:
+                _logger.warning("Could not record the failed %s sync of store %s", entity, self.id, exc_info=True)
+            raise
 
     @retry_on_db_errors()
+    @metrics.instrument('customer')
     def sync_customer(self, customer, store):
         """Sync a single Shopify customer to Odoo res.partner."""
         shopify_customer_id = str(customer.get('id'))
@@ -171,36 +292,26 @@ class ShopifyStore(models.Model):
 
         if odoo_customer:
             odoo_customer.with_context(commit_transaction=True).write(customer_vals)
-            _logger.info(f"Updated existing customer {shopify_customer_id}")
+            _logger.debug("Updated existing customer %s", shopify_customer_id)
         else:
             odoo_customer = self.env['res.partner'].create(customer_vals)
             self.env.cr.commit()
-            _logger.info(f"Created new customer {shopify_customer_id}")
+            _logger.debug("Created new customer %s", shopify_customer_id)
 
     def sync_inventory_cron(self):
-        """Periodic reconciliation of Shopify inventory, orders, and customers."""
-        stores = self.search([('lock_cron', '=', False)])
-        
-        _logger.info("Starting sync for all stores")
-        for store in stores:
-            # Acquire lock
-            store.with_context(commit_transaction=True).write({'lock_cron': True})
-            try:
-                _logger.info(f"Syncing store {store.id}")
-                store.update_shopify_location_id()
-                store.fetch_shopify_inventory()
-                _logger.info(f"Completed inventory sync for store {store.id}")
-                
-                store.fetch_shopify_customers()
-                _logger.info(f"Completed customer sync for store {store.id}")
-                
-                store.fetch_shopify_orders()
-                _logger.info(f"Completed order sync for store {store.id}")
-            finally:
-                # Release lock
-                store.with_context(commit_transaction=True).write({'lock_cron': False})
-        
-        _logger.info("Sync process fully completed")
+        """Queue the product, customer and order fetches of every active store.
+
+        Each store and entity is a separate ``shopify.sync.job``, claimed
+        under a lease by whichever node or worker is free, see
+        ``shopify.sync.job._claim``. Without dedicated sync workers the cron
+        runs the queue itself.
+        """
+        Jobs = self.env['shopify.sync.job']
+        for store in self.search([('state', '=', 'active')]):
+            for job_type in ('products', 'customers', 'orders'):
+                Jobs._enqueue(store, job_type)
+        self.env.cr.commit()
+        Jobs._run_queue()
     
     def _compute_webhook_url(self):
         """Generates the webhook URL dynamically based on Odoo base URL."""
@@ -242,52 +353,103 @@ class ShopifyStore(models.Model):
                 else:
                     _logger.error(f"❌ Failed to register webhook for {webhook['topic']} - {response.text}")
 
-    @retry_on_db_errors()
-    def sync_quantity_to_shopify(self, odoo_product, new_quantity):
-        """Syncs the provided quantity to Shopify for the specific variant."""
-        if not odoo_product or odoo_product.last_update_source != 'odoo':
-            _logger.info(f"Skipping sync for {odoo_product.default_code}: Not an Odoo-initiated update.")
-            return
+    def _inventory_locations(self):
+        """Return the ``[(shopify_location_id, stock.location)]`` pairs whose stock is synced.
 
-        shopify_mappings = self.env['shopify.product.mapping'].sudo().search([('sku', '=', odoo_product.default_code)])
-        if not shopify_mappings:
-            _logger.error(f"[ERROR] No Shopify mapping found for variant {odoo_product.default_code}")
-            return
+        Stores without mapped locations keep syncing their primary location
+        with the warehouse stock location.
+        """
+        self.ensure_one()
+        mappings = self.location_mapping_ids.filtered('location_id')
+        if mappings:
+            return [(mapping.shopify_location_id, mapping.location_id) for mapping in mappings]
+        if self.location_id and self.warehouse_id:
+            return [(self.location_id, self.warehouse_id.lot_stock_id)]
+        return []
+
+    def _odoo_location_for(self, shopify_location_id):
+        """Return the Odoo stock location synced with a Shopify location, or an empty recordset."""
+        for location_id, location in self._inventory_locations():
+            if location_id == str(shopify_location_id):
+                return location
+        return self.env['stock.location']
 
-        for mapping in shopify_mappings:
-            store = mapping.store_id
-            if not store.location_id:
-                store.update_shopify_location_id()
+    @api.model
+    @metrics.instrument('inventory')
+    def _push_inventory_levels(self, levels_by_store):
+        """Set Shopify's available quantities from ``{store: {shopify_location_id: {product_id: qty}}}``.
+
+        Products are matched to inventory items with one mapping search per
+        store, and the levels of each store, across its locations, are sent in
+        ``inventorySetQuantities`` calls of ``INVENTORY_BATCH_SIZE`` levels.
+        The calls of all stores go out concurrently, see ``tools.async_client``.
+        The sync states and failure logs are written on the caller's cursor,
+        so they are rolled back with the stock change that caused the push.
+        """
+        calls = []
+        chunks = []
+        for store, quantities_by_location in levels_by_store.items():
+            store = store.with_env(self.env)
+            levels = store._inventory_levels_payload(quantities_by_location)
+            url = f"https://{store.api_key}:{store.api_password}@{store.shopify_url}/admin/api/2025-01/graphql.json"
+            for start in range(0, len(levels), INVENTORY_BATCH_SIZE):
+                chunk = levels[start:start + INVENTORY_BATCH_SIZE]
+                variables = {'input': {
+                    'name': 'available',
+                    'reason': 'correction',
+                    'ignoreCompareQuantity': True,
+                    'quantities': [level for _product_id, level in chunk],
+                }}
+                calls.append((store, 'post', url, 'inventory', {
+                    'json': {'query': INVENTORY_SET_MUTATION, 'variables': variables},
+                }))
+                chunks.append((store, [product_id for product_id, _level in chunk]))
+
+        now = fields.Datetime.now()
+        for (store, product_ids), response in zip(chunks, async_client.run_calls(self.env, calls)):
+            if isinstance(response, Exception):
+                message = str(response)
+            else:
+                body = response.json() if response.status_code == 200 else {}
+                errors = body.get('errors') or (body.get('data') or {}).get('inventorySetQuantities', {}).get('userErrors')
+                message = (errors or None) if response.status_code == 200 else f"{response.status_code} - {response.text[:500]}"
+            if message:
+                _logger.error("Failed to set %s inventory levels in %s: %s", len(product_ids), store.name, message)
+                self.env['shopify.sync.log'].create({
+                    'sync_type': 'product',
+                    'store_id': store.id,
+                    'status': 'failed',
+                    'error_message': f"Failed to set {len(product_ids)} inventory levels: {message}",
+                })
+                continue
+            self.env['shopify.sync.state']._record(product_ids, store.id, 'odoo', now)
+            _logger.info("Set %s inventory levels in %s", len(product_ids), store.name)
 
-            if store.location_id:
-                inventory_item_url = f"https://{store.api_key}:{store.api_password}@{store.shopify_url}/admin/api/2025-01/inventory_items/{mapping.inventory_item_id}.json"
-                response = requests.get(inventory_item_url)
-                if response.status_code == 200 and not response.json().get('inventory_item', {}).get('tracked', False):
-                    _logger.info(f"Skipping inventory sync for {odoo_product.default_code}: Inventory tracking disabled.")
+    def _inventory_levels_payload(self, quantities_by_location):
+        """Return ``[(product_id, inventorySetQuantities quantity input)]`` for the mapped products."""
+        self.ensure_one()
+        product_ids = {product_id for quantities in quantities_by_location.values() for product_id in quantities}
+        products = self.env['product.product'].browse(sorted(product_ids))
+        skus = {product.id: product.default_code for product in products if product.default_code}
+        mappings = self.env['shopify.product.mapping'].sudo().search([
+            ('store_id', '=', self.id),
+            ('sku', 'in', list(set(skus.values()))),
+        ])
+        item_by_sku = {mapping.sku: mapping.inventory_item_id for mapping in mappings}
+
+        levels = []
+        for shopify_location_id, quantities in sorted(quantities_by_location.items()):
+            for product_id, quantity in sorted(quantities.items()):
+                inventory_item_id = item_by_sku.get(skus.get(product_id))
+                if not inventory_item_id:
+                    _logger.debug("No Shopify inventory item for product %s in %s", product_id, self.name)
                     continue
-
-                url = f"https://{store.api_key}:{store.api_password}@{store.shopify_url}/admin/api/2025-01/inventory_levels/set.json"
-                payload = {
-                    "location_id": store.location_id,
-                    "inventory_item_id": mapping.inventory_item_id,
-                    "available": int(new_quantity)
-                }
-                headers = {"Content-Type": "application/json", "X-Shopify-Reason": "odoo_update"}
-                _logger.debug(f"Syncing to Shopify: URL={url}, Payload={payload}")
-                try:
-                    response = requests.post(url, json=payload, headers=headers)
-                    response.raise_for_status()
-                    _logger.info(f"[SUCCESS] Synced {new_quantity} for variant {odoo_product.default_code} to {store.name}")
-                except requests.exceptions.RequestException as e:
-                    _logger.error(f"[ERROR] Failed to sync to {store.name}: {e} - {response.text if 'response' in locals() else 'No response'}")
-                    self.env['shopify.sync.log'].create({
-                        'sync_type': 'product',
-                        'store_id': store.id,
-                        'status': 'failed',
-                        'error_message': f"Failed to sync SKU {odoo_product.default_code}: {str(e)}"
-                    })
-            else:
-                _logger.error(f"[ERROR] No location_id for {store.name}. Sync skipped.")
+                levels.append((product_id, {
+                    'inventoryItemId': f'gid://shopify/InventoryItem/{inventory_item_id}',
+                    'locationId': f'gid://shopify/Location/{shopify_location_id}',
+                    'quantity': int(quantity),
+                }))
+        return levels
 
     @api.model
     def create(self, vals):
@@ -345,17 +507,27 @@ class ShopifyStore(models.Model):
             _logger.error(f"❌ Failed to delete webhook {webhook_id} for {self.name} - {response.text}")
 
     def update_shopify_location_id(self):
-        """Fetch and update Shopify Location ID."""
-        for store in self.filtered(lambda s: not s.location_id):
+        """Fetch the Shopify locations and add a mapping for each new one.
+
+        The first location becomes the store's primary ``location_id`` when
+        none is set yet.
+        """
+        for store in self:
             url = f"https://{store.api_key}:{store.api_password}@{store.shopify_url}/admin/api/2023-01/locations.json"
-            response = requests.get(url)
-            if response.status_code == 200:
-                locations = response.json().get('locations', [])
-                if locations:
-                    store.location_id = locations[0].get('id')
-                    _logger.info(f"Updated location ID for {store.name}: {store.location_id}")
+            response = store._shopify_request('get', url, 'inventory')
+            if response.status_code != 200:
+                _logger.error("Failed to fetch locations of %s: %s - %s", store.name, response.status_code, response.text)
+                continue
+            locations = response.json().get('locations', [])
+            if locations and not store.location_id:
+                store.location_id = str(locations[0].get('id'))
+                _logger.info("Updated location ID for %s: %s", store.name, store.location_id)
+            created = self.env['shopify.location.mapping']._create_missing(store, locations)
+            if created:
+                _logger.info("Found %s new Shopify locations for %s", len(created), store.name)
 
     @retry_on_db_errors()
+    @metrics.instrument('product', 'fetch_duration')
     def fetch_shopify_inventory(self):
         for store in self:
             params = {}
@@ -376,31 +548,49 @@ class ShopifyStore(models.Model):
                     'limit': 25,
                 }
 
+            progress = SyncLogProgress(log)
             while True:
-                response = requests.get(base_url, params=params)
+                response = store._shopify_request('get', base_url, 'product', params=params)
                 if response.status_code != 200:
-                    log.write({
-                        'status': 'failed',
-                        'error_message': f"API Error: {response.status_code} - {response.text}"
-                    })
-                    self.env.cr.commit()
-                    _logger.error(f"Failed to fetch products: {response.status_code} - {response.text}")
+                    progress.flush(
+                        status='failed',
+                        error_message=f"API Error: {response.status_code} - {response.text}",
+                    )
+                    _logger.error("Failed to fetch products: %s - %s", response.status_code, response.text)
                     break
 
                 products = response.json().get('products', [])
                 if not products:
+                    progress.flush(status='completed', total_remaining=0)
                     break
 
                 max_updated = store.product_last_fetch_date or datetime(1970, 1, 1)
-                total_fetched = 0
-                total_skipped = 0
+                images = store._download_images(
+                    [product['image']['src'] for product in products if (product.get('image') or {}).get('src')])
+                template_ids = store._template_ids_by_product(products)
+                self.env.cr.commit()
+                new_products = [
+                    product for product in products
+                    if str(product['id']) not in template_ids
+                    and all(variant.get('sku') for variant in product.get('variants', []))
+                ]
+                if new_products:
+                    try:
+                        template_ids.update(self.env['product.template']._create_from_shopify(store, new_products))
+                    except Exception as e:
+                        # The products below then create their templates one by one.
+                        self.env.cr.rollback()
+                        _logger.warning("Bulk creation of %s products from %s failed: %s",
+                                        len(new_products), store.name, e)
+                self.env.cr.commit()
                 for product in products:
                     cr = self.env.registry.cursor()
                     try:
                         new_env = self.env.__class__(cr, self.env.uid, self.env.context.copy())
                         store_with_new_env = store.with_env(new_env)
-                        store_with_new_env.sync_product_inventory(product, store)
-                        total_fetched += 1
+                        store_with_new_env.sync_product_inventory(product, store, images=images, template_ids=template_ids)
+                        progress.record_synced()
+                        metrics.inc(self.env, 'records_synced', store.id, 'product')
                         product_updated = product.get('updated_at')
                         if product_updated:
                             product_dt = datetime.strptime(product_updated, '%Y-%m-%dT%H:%M:%S%z').replace(tzinfo=None)
@@ -408,26 +598,14 @@ class ShopifyStore(models.Model):
                                 max_updated = product_dt
                         cr.commit()
                     except Exception as e:
-                        total_skipped += 1
-                        log.write({'error_message': f"Skipped product {product.get('id')}: {str(e)}"})
-                        _logger.warning(f"Skipped product {product.get('id')}: {str(e)}")
+                        progress.record_skipped(product.get('id'), str(e))
+                        metrics.inc(self.env, 'records_skipped', store.id, 'product')
+                        _logger.warning("Skipped product %s: %s", product.get('id'), e)
                         cr.rollback()
                     finally:
                         if not cr.closed:
                             cr.close()
-
-                    log.write({
-                        'total_fetched': total_fetched,
-                        'total_skipped': total_skipped
-                    })
-                    self.env.cr.commit()
-
-                log.write({
-                    'status': 'completed',
-                    'total_fetched': total_fetched,
-                    'total_skipped': total_skipped,
-                    'total_remaining': 0
-                })
+                    progress.flush_if_due()
 
                 link_header = response.headers.get('Link', '')
                 next_link = next((link for link in link_header.split(', ') if 'rel="next"' in link), None)
@@ -437,7 +615,7 @@ class ShopifyStore(models.Model):
                         'current_page_info': page_info,
                         'product_last_fetch_date': max_updated,
                     })
-                    self.env.cr.commit()
+                    progress.flush()
                     params = {'page_info': page_info, 'limit': 25}
                 else:
                     store.with_context(commit_transaction=True).write({
@@ -445,13 +623,18 @@ class ShopifyStore(models.Model):
                         'product_last_fetch_date': datetime.now(),
                         'is_full_sync': True,
                     })
-                    self.env.cr.commit()
+                    progress.flush(status='completed', total_remaining=0)
                     break
 
     @retry_on_db_errors()
-    def sync_product_inventory(self, shopify_product, store):
+    @metrics.instrument('product')
+    def sync_product_inventory(self, shopify_product, store, images=None, template_ids=None):
         warehouse = store.warehouse_id
-        odoo_template = self.env["product.template"].search([("name", "=", shopify_product["title"])], limit=1)
+        single_location = len(store._inventory_locations()) <= 1
+        shopify_product_id = str(shopify_product["id"])
+        if template_ids is None:
+            template_ids = store._template_ids_by_product([shopify_product])
+        odoo_template = self.env["product.template"].browse(template_ids.get(shopify_product_id))
         has_sku = True
         for variant in shopify_product.get("variants", []):
             shopify_sku = variant.get("sku")
@@ -468,116 +651,138 @@ class ShopifyStore(models.Model):
                 "name": shopify_product["title"],
                 "type": "product",
             })
+            self.env["shopify.template.mapping"].sudo().create({
+                "store_id": store.id,
+                "shopify_product_id": shopify_product_id,
+                "product_tmpl_id": odoo_template.id,
+            })
+            self.env.cr.commit()
+        elif odoo_template.name != shopify_product["title"]:
+            odoo_template.with_context(commit_transaction=True).write({"name": shopify_product["title"]})
             self.env.cr.commit()
 
+        # Variants already carrying the Shopify SKUs need no attribute matching,
+        # which spares the attribute searches to every product synced before.
+        variant_by_sku = {
+            variant.default_code: variant
+            for variant in self.env["product.product"].search([
+                ("product_tmpl_id", "=", odoo_template.id),
+                ("default_code", "in", [variant.get("sku") for variant in shopify_product.get("variants", [])]),
+            ])
+        }
+        known_skus = all(variant.get("sku") in variant_by_sku for variant in shopify_product.get("variants", []))
+
         # Cache attributes and values
         attribute_cache = {}
         value_cache = {}
         attribute_map = {}
-        for option in shopify_product.get("options", []):
-            attribute_name = option.get("name")
-            if attribute_name == "Title" and option.get("values") == ["Default Title"]:
-                continue
-            attribute = attribute_cache.get(attribute_name)
-            if not attribute:
-                attribute = self.env["product.attribute"].search([("name", "=", attribute_name)], limit=1)
-                if not attribute:
-                    attribute = self.env["product.attribute"].create({"name": attribute_name})
-                    self.env.cr.commit()
-                attribute_cache[attribute_name] = attribute
-
-            attribute_values = []
-            for value in option.get("values", []):
-                cache_key = (attribute.id, value)
-                attr_value = value_cache.get(cache_key)
-                if not attr_value:
-                    attr_value = self.env["product.attribute.value"].search(
-                        [("name", "=", value), ("attribute_id", "=", attribute.id)], limit=1
-                    )
-                    if not attr_value:
-                        attr_value = self.env["product.attribute.value"].create(
-                            {"name": value, "attribute_id": attribute.id}
-                        )
-                        self.env.cr.commit()
-                    value_cache[cache_key] = attr_value
-                attribute_values.append(attr_value.id)
-
-            attribute_line = self.env["product.template.attribute.line"].search(
-                [("attribute_id", "=", attribute.id), ("product_tmpl_id", "=", odoo_template.id)], limit=1
-            )
-            if not attribute_line:
-                attribute_line = self.env["product.template.attribute.line"].create({
-                    "product_tmpl_id": odoo_template.id,
-                    "attribute_id": attribute.id,
-                    "value_ids": [(6, 0, attribute_values)],
-                })
-                self.env.cr.commit()
-            attribute_map[attribute_name] = attribute_line
-
-        # Check if variants already exist
-        existing_variants = self.env["product.product"].search_count([("product_tmpl_id", "=", odoo_template.id)])
-        if not existing_variants:
-            odoo_template._create_variant_ids()
-            self.env.cr.commit()
-
-        for variant in shopify_product.get("variants", []):
-            shopify_sku = variant.get("sku") or f"{shopify_product['id']}-{variant['id']}"
-            attribute_values = []
-            attribute_combination = []
-
-            for i, option in enumerate(shopify_product.get("options", [])):
+        if not known_skus:
+            for option in shopify_product.get("options", []):
                 attribute_name = option.get("name")
-                attribute_value_name = variant.get(f"option{i + 1}")
                 if attribute_name == "Title" and option.get("values") == ["Default Title"]:
                     continue
-                if attribute_name and attribute_value_name:
-                    attribute = attribute_cache.get(attribute_name)
-                    cache_key = (attribute.id, attribute_value_name)
+                attribute = attribute_cache.get(attribute_name)
+                if not attribute:
+                    attribute = self.env["product.attribute"].search([("name", "=", attribute_name)], limit=1)
+                    if not attribute:
+                        attribute = self.env["product.attribute"].create({"name": attribute_name})
+                        self.env.cr.commit()
+                    attribute_cache[attribute_name] = attribute
+
+                attribute_values = []
+                for value in option.get("values", []):
+                    cache_key = (attribute.id, value)
                     attr_value = value_cache.get(cache_key)
                     if not attr_value:
                         attr_value = self.env["product.attribute.value"].search(
-                            [("name", "=", attribute_value_name), ("attribute_id", "=", attribute.id)], limit=1
+                            [("name", "=", value), ("attribute_id", "=", attribute.id)], limit=1
                         )
                         if not attr_value:
                             attr_value = self.env["product.attribute.value"].create(
-                                {"name": attribute_value_name, "attribute_id": attribute.id}
+                                {"name": value, "attribute_id": attribute.id}
                             )
                             self.env.cr.commit()
                         value_cache[cache_key] = attr_value
-                    attribute_line = attribute_map[attribute_name]
-                    if attr_value.id not in attribute_line.value_ids.ids:
-                        attribute_line.with_context(commit_transaction=True).write({"value_ids": [(4, attr_value.id)]})
-                        self.env.cr.commit()
+                    attribute_values.append(attr_value.id)
+
+                attribute_line = self.env["product.template.attribute.line"].search(
+                    [("attribute_id", "=", attribute.id), ("product_tmpl_id", "=", odoo_template.id)], limit=1
+                )
+                if not attribute_line:
+                    attribute_line = self.env["product.template.attribute.line"].create({
+                        "product_tmpl_id": odoo_template.id,
+                        "attribute_id": attribute.id,
+                        "value_ids": [(6, 0, attribute_values)],
+                    })
+                    self.env.cr.commit()
+                attribute_map[attribute_name] = attribute_line
 
-                    template_attr_value = self.env["product.template.attribute.value"].search(
-                        [
-                            ("product_tmpl_id", "=", odoo_template.id),
-                            ("attribute_id", "=", attribute.id),
-                            ("product_attribute_value_id", "=", attr_value.id),
-                        ], limit=1
-                    )
-                    if not template_attr_value:
-                        template_attr_value = self.env["product.template.attribute.value"].create({
-                            "product_tmpl_id": odoo_template.id,
-                            "attribute_id": attribute.id,
-                            "product_attribute_value_id": attr_value.id,
-                            "attribute_line_id": attribute_line.id,
-                        })
-                        self.env.cr.commit()
-                    attribute_values.append(template_attr_value.id)
-                    attribute_combination.append(template_attr_value.product_attribute_value_id.id)
-
-            prods = self.env["product.product"].search([("product_tmpl_id", "=", odoo_template.id)])
-            odoo_product = None
-            for prod in prods:
-                variant_attribute_ids = set(prod.product_template_variant_value_ids.mapped("product_attribute_value_id.id"))
-                if variant_attribute_ids == set(attribute_combination):
-                    odoo_product = prod
-                    break
+            # Check if variants already exist
+            existing_variants = self.env["product.product"].search_count([("product_tmpl_id", "=", odoo_template.id)])
+            if not existing_variants:
+                odoo_template._create_variant_ids()
+                self.env.cr.commit()
 
+        for variant in shopify_product.get("variants", []):
+            shopify_sku = variant.get("sku") or f"{shopify_product['id']}-{variant['id']}"
+            odoo_product = variant_by_sku.get(shopify_sku)
             if not odoo_product:
-                _logger.warning(f"No exact variant match for SKU {shopify_sku}, attributes {attribute_combination}. Skipping sync.")
-                continue
+                attribute_values = []
+                attribute_combination = []
+
+                for i, option in enumerate(shopify_product.get("options", [])):
+                    attribute_name = option.get("name")
+                    attribute_value_name = variant.get(f"option{i + 1}")
+                    if attribute_name == "Title" and option.get("values") == ["Default Title"]:
+                        continue
+                    if attribute_name and attribute_value_name:
+                        attribute = attribute_cache.get(attribute_name)
+                        cache_key = (attribute.id, attribute_value_name)
+                        attr_value = value_cache.get(cache_key)
+                        if not attr_value:
+                            attr_value = self.env["product.attribute.value"].search(
+                                [("name", "=", attribute_value_name), ("attribute_id", "=", attribute.id)], limit=1
+                            )
+                            if not attr_value:
+                                attr_value = self.env["product.attribute.value"].create(
+                                    {"name": attribute_value_name, "attribute_id": attribute.id}
+                                )
+                                self.env.cr.commit()
+                            value_cache[cache_key] = attr_value
+                        attribute_line = attribute_map[attribute_name]
+                        if attr_value.id not in attribute_line.value_ids.ids:
+                            attribute_line.with_context(commit_transaction=True).write({"value_ids": [(4, attr_value.id)]})
+                            self.env.cr.commit()
+
+                        template_attr_value = self.env["product.template.attribute.value"].search(
+                            [
+                                ("product_tmpl_id", "=", odoo_template.id),
+                                ("attribute_id", "=", attribute.id),
+                                ("product_attribute_value_id", "=", attr_value.id),
+                            ], limit=1
+                        )
+                        if not template_attr_value:
+                            template_attr_value = self.env["product.template.attribute.value"].create({
+                                "product_tmpl_id": odoo_template.id,
+                                "attribute_id": attribute.id,
+                                "product_attribute_value_id": attr_value.id,
+                                "attribute_line_id": attribute_line.id,
+                            })
+                            self.env.cr.commit()
+                        attribute_values.append(template_attr_value.id)
+                        attribute_combination.append(template_attr_value.product_attribute_value_id.id)
+
+                prods = self.env["product.product"].search([("product_tmpl_id", "=", odoo_template.id)])
+                odoo_product = None
+                for prod in prods:
+                    variant_attribute_ids = set(prod.product_template_variant_value_ids.mapped("product_attribute_value_id.id"))
+                    if variant_attribute_ids == set(attribute_combination):
+                        odoo_product = prod
+                        break
+
+                if not odoo_product:
+                    _logger.warning(f"No exact variant match for SKU {shopify_sku}, attributes {attribute_combination}. Skipping sync.")
+                    continue
 
             self.create_product_mapping(store, variant)
             self.env.cr.commit()
@@ -589,289 +794,199 @@ class ShopifyStore(models.Model):
                 odoo_product.with_context(commit_transaction=True).write({"list_price": variant.get("price", 0.0)})
                 self.env.cr.commit()
 
-            inventory_quantity = variant.get("inventory_quantity", 0)
-            self.update_inventory_quantity(odoo_product, inventory_quantity, warehouse)
-            self.env.cr.commit()
+            # The variant only carries its total over all locations; stores
+            # with several synced locations get per-location levels from the
+            # inventory webhooks instead.
+            if single_location:
+                inventory_quantity = variant.get("inventory_quantity", 0)
+                self.update_inventory_quantity(odoo_product, inventory_quantity, warehouse)
+                self.env.cr.commit()
 
         if "image" in shopify_product and shopify_product["image"] and "src" in shopify_product["image"]:
-            self.sync_product_image(odoo_template, shopify_product["image"]["src"])
+            image_url = shopify_product["image"]["src"]
+            self.sync_product_image(odoo_template, image_url, (images or {}).get(image_url))
             self.env.cr.commit()
 
+    def _template_ids_by_product(self, shopify_products):
+        """Return ``{shopify_product_id: product.template id}`` for a page of Shopify products of this store.
+
+        Products are resolved through their ``shopify.template.mapping`` in
+        one query. Products without a mapping yet are matched on the SKUs of
+        their variants, in one more query, and get their mapping created;
+        products matching nothing are left out, to be created.
+        """
+        self.ensure_one()
+        Mapping = self.env['shopify.template.mapping'].sudo()
+        shopify_product_ids = [str(product['id']) for product in shopify_products]
+        mappings = Mapping.search_read(
+            [('store_id', '=', self.id), ('shopify_product_id', 'in', shopify_product_ids)],
+            ['shopify_product_id', 'product_tmpl_id'],
+        )
+        template_ids = {mapping['shopify_product_id']: mapping['product_tmpl_id'][0] for mapping in mappings}
+
+        unmapped = [product for product in shopify_products if str(product['id']) not in template_ids]
+        skus = [variant['sku'] for product in unmapped for variant in product.get('variants', []) if variant.get('sku')]
+        if not skus:
+            return template_ids
+        variants = self.env['product.product'].with_context(active_test=False).search_read(
+            [('default_code', 'in', skus)], ['default_code', 'product_tmpl_id'])
+        template_by_sku = {variant['default_code']: variant['product_tmpl_id'][0] for variant in variants}
+        vals_list = []
+        for product in unmapped:
+            template_id = next((template_by_sku[variant['sku']] for variant in product.get('variants', [])
+                                if variant.get('sku') in template_by_sku), None)
+            if template_id:
+                template_ids[str(product['id'])] = template_id
+                vals_list.append({
+                    'store_id': self.id,
+                    'shopify_product_id': str(product['id']),
+                    'product_tmpl_id': template_id,
+                })
+        Mapping.create(vals_list)
+        return template_ids
+
     @retry_on_db_errors()
+    @metrics.instrument('order', 'fetch_duration')
     def fetch_shopify_orders(self):
+        Status = self.env['shopify.sync.status']
         for store in self:
-            last_fetch_date = store.order_last_fetch_date or datetime(1970, 1, 1)
-            updated_at_min = last_fetch_date.strftime('%Y-%m-%dT%H:%M:%S')
-
-            base_url = f"https://{store.api_key}:{store.api_password}@{store.shopify_url}/admin/api/2023-01/orders.json"
-            params = {
-                'updated_at_min': updated_at_min,
-                'limit': 250,
-                'status': 'any',
-            }
-
-            total_orders = 0
-            skipped_orders = 0
-            while True:
-                response = requests.get(base_url, params=params)
-
-                if response.status_code == 200:
-                    orders = response.json().get('orders', [])
+            PendingOrder = self.env['shopify.pending.order']
+            with store._sync_status_run('order') as stats:
+                for orders in store._iter_changed_pages('order', 'orders', status='any'):
+                    batch = []
                     for order in orders:
-                        if self._all_products_exist_in_odoo(order, store):
-                            self.sync_order(order, store)
-                            self.env.cr.commit()
-                            total_orders += 1
-                            _logger.info(f"Synced order {order.get('id')} (Total synced: {total_orders})")
-                        else:
-                            skipped_orders += 1
-                            _logger.warning(f"Skipped order {order.get('id')} due to missing products")
-
-                    link_header = response.headers.get('Link')
-                    if not link_header or 'rel="next"' not in link_header:
-                        break
-                    
-                    next_link = [link for link in link_header.split(',') if 'rel="next"' in link][0]
-                    page_info = next_link.split('page_info=')[1].split('>')[0]
-                    params = {'page_info': page_info, 'limit': 250}
-                else:
-                    _logger.error(f"Error fetching orders: {response.status_code} - {response.text}")
-                    break
-
-            store.order_last_fetch_date = fields.Datetime.from_string(
-                datetime.now(timezone('America/New_York')).strftime('%Y-%m-%d %H:%M:%S')
-            )
-            _logger.info(f"Updated order_last_fetch_date to {store.order_last_fetch_date}")
-            _logger.info(f"Total orders synced: {total_orders}, Skipped: {skipped_orders}")
-
-    def _all_products_exist_in_odoo(self, order, store):
-        for line_item in order.get('line_items', []):
-            product = self.env['product.product'].search([
-                '|',
-                ('default_code', '=', line_item.get('sku')),
-                ('shopify_product_id', '=', str(line_item.get('product_id')))
-            ], limit=1)
-            if not product:
-                _logger.warning(f"Product not found in Odoo: SKU={line_item.get('sku')}, Shopify ID={line_item.get('product_id')}")
-                return False
-        return True
-
-    @retry_on_db_errors()
-    def sync_order(self, order, store):
-        shopify_order_id = order.get('id')
-        odoo_order = self.env['sale.order'].search([('shopify_order_id', '=', shopify_order_id)], limit=1)
-
-        if not odoo_order:
-            if not isinstance(order, dict):
-                _logger.error(f"Invalid order data for Shopify Order ID {shopify_order_id}: {order}")
-                return
-
-            customer_data = order.get('customer')
-            shopify_customer_id = False
-            email = order.get('email')
-
-            if customer_data and isinstance(customer_data, dict):
-                shopify_customer_id = str(customer_data.get('id', '')) if customer_data.get('id') else False
-                email = customer_data.get('email') or email
-            else:
-                _logger.warning(f"No customer data found for Shopify Order ID {shopify_order_id}")
-
-            customer = self.env['res.partner'].search([
-                '|',
-                ('shopify_customer_id', '=', shopify_customer_id),
-                ('email', '=', email)
-            ], limit=1)
-
-            if not customer:
-                customer = self.env['res.partner'].sudo().search([('name', '=', 'Guest Customer')], limit=1)
-                if not customer:
-                    customer = self.env['res.partner'].sudo().create({
-                        'name': 'Guest Customer',
-                        'email': 'guest@example.com',
-                        'phone': '',
-                    })
+                        missing_skus = store._missing_order_skus(order)
+                        if missing_skus:
+                            PendingOrder._defer(store, order, missing_skus)
+                            stats.record('skipped', order.get('id'))
+                            continue
+                        batch.append(order)
+                        if len(batch) >= ORDER_BATCH_SIZE:
+                            self._sync_order_batch(batch, store, stats)
+                            batch = []
+                    if batch:
+                        self._sync_order_batch(batch, store, stats)
+                    stats.flush_page()
+                    Status._page_done(store, 'order', *stats.run_totals(),
+                                      backlog=PendingOrder.search_count([('store_id', '=', store.id)]))
+                stats.flush_run()
+                Status._run_finished(store, 'order', *stats.run_totals(),
+                                     watermark=store.order_last_fetch_date,
+                                     backlog=PendingOrder.search_count([('store_id', '=', store.id)]))
+
+    def _iter_changed_pages(self, entity, resource, **filters):
+        """Page through the ``resource`` records changed since this store's ``{entity}`` watermark.
+
+        Yields one iterator of records per page. Once the caller has handled
+        a page, the next page's cursor and the largest ``updated_at`` seen so
+        far are stored in ``{entity}_page_info``/``{entity}_max_updated_at``
+        and committed, so an interrupted run resumes at the page it stopped
+        on. When the last page is done, ``{entity}_last_fetch_date`` moves to
+        that largest ``updated_at`` (UTC, as Shopify reported it), never to
+        the local clock. Records updated exactly at the watermark are fetched
+        again on the next run, which the sync methods handle as updates.
+        """
+        self.ensure_one()
+        watermark_field = f'{entity}_last_fetch_date'
+        cursor_field = f'{entity}_page_info'
+        max_field = f'{entity}_max_updated_at'
+        base_url = f"https://{self.api_key}:{self.api_password}@{self.shopify_url}/admin/api/2023-01/{resource}.json"
+
+        def first_page_params():
+            watermark = self[watermark_field] or datetime(1970, 1, 1)
+            return dict(filters, updated_at_min=watermark.strftime('%Y-%m-%dT%H:%M:%S+00:00'), limit=250)
+
+        if self[cursor_field]:
+            _logger.info("Resuming %s fetch of %s from the stored cursor", entity, self.name)
+            params = {'page_info': self[cursor_field], 'limit': 250}
+        else:
+            params = first_page_params()
+        max_updated = [self[max_field]]
+
+        def track(records):
+            for record in records:
+                updated_at = _parse_shopify_datetime(record.get('updated_at'))
+                if updated_at and (not max_updated[0] or updated_at > max_updated[0]):
+                    max_updated[0] = updated_at
+                yield record
+
+        while True:
+            response = self._shopify_request('get', base_url, entity, params=params)
+            if response.status_code != 200:
+                if 'page_info' in params and response.status_code == 400:
+                    # Cursors expire; the watermark has not moved, so start over from it.
+                    _logger.warning("Stored %s cursor of %s was rejected, restarting from the watermark", entity, self.name)
+                    self.write({cursor_field: False, max_field: False})
                     self.env.cr.commit()
-
-            shopify_date = order.get('created_at')
-            if shopify_date:
-                try:
-                    dt = datetime.strptime(shopify_date, '%Y-%m-%dT%H:%M:%S%z')
-                    dt_utc = dt.astimezone(pytz.UTC)
-                    date_order = dt_utc.strftime('%Y-%m-%d %H:%M:%S')
-                except ValueError as e:
-                    _logger.error(f"Invalid date format for Shopify Order ID {shopify_order_id}: {shopify_date} - {str(e)}")
-                    date_order = fields.Datetime.now()
-            else:
-                date_order = fields.Datetime.now()
-
-            financial_status = order.get('financial_status', 'pending')
-            fulfillment_status = order.get('fulfillment_status')
-            state = 'draft'
-
-            order_vals = {
-                'partner_id': customer.id,
-                'shopify_order_id': shopify_order_id,
-                'date_order': date_order,
-                'state': state,
-                'origin': f"Shopify Order #{order.get('name', shopify_order_id)}",
-                'warehouse_id': store.warehouse_id.id,
-            }
-            odoo_order = self.env['sale.order'].create(order_vals)
-            self.env.cr.commit()
-
-            line_items = order.get('line_items', [])
-            product_quantities = {}
-
-            for line in line_items:
-                if not isinstance(line, dict):
-                    _logger.warning(f"Invalid line item for Shopify Order ID {shopify_order_id}: {line}")
+                    params = first_page_params()
+                    max_updated = [False]
                     continue
+                _logger.error("Error fetching %s: %s - %s", resource, response.status_code, response.text)
+                return
 
-                sku = line.get('sku')
-                if not sku:
-                    _logger.warning(f"Line item missing SKU for Shopify Order ID {shopify_order_id}: {line}")
-                    continue
-
-                quantity = line.get('quantity', 0)
-                price = float(line.get('price', 0.0))
-
-                if sku in product_quantities:
-                    product_quantities[sku]['quantity'] += quantity
-                    product_quantities[sku]['price'] = price
-                else:
-                    product_quantities[sku] = {'quantity': quantity, 'price': price}
-
-            for sku, data in product_quantities.items():
-                product = self.env['product.product'].search([('default_code', '=', sku)], limit=1)
-                if product:
-                    self.env['sale.order.line'].create({
-                        'order_id': odoo_order.id,
-                        'product_id': product.id,
-                        'product_uom_qty': data['quantity'],
-                        'price_unit': data['price'],
-                        'tax_id': [(6, 0, [])],
-                    })
-                    self.env.cr.commit()
-                else:
-                    _logger.warning(f"Product with SKU {sku} not found for Shopify Order ID {shopify_order_id}")
-
-            if fulfillment_status in ('fulfilled', 'partial') or financial_status in ('paid', 'partially_paid'):
-                if odoo_order.state in ('draft', 'sent'):
-                    odoo_order.action_confirm()
-                    self.env.cr.commit()
-                
-                if financial_status in ('paid', 'partially_paid'):
-                    self._handle_invoicing(odoo_order, order, financial_status)
-                
-                if fulfillment_status in ('fulfilled', 'partial'):
-                    self._handle_delivery(odoo_order, order, fulfillment_status)
-
-            if financial_status in ('refunded', 'partially_refunded', 'voided') and odoo_order.state != 'cancel':
-                odoo_order.action_cancel()
-                self.env.cr.commit()
-
-        else:
-            financial_status = order.get('financial_status', 'pending')
-            fulfillment_status = order.get('fulfillment_status')
+            yield track(iter_json_records(response, resource))
 
-            if financial_status in ('refunded', 'partially_refunded', 'voided') and odoo_order.state != 'cancel':
-                odoo_order.action_cancel()
-                self.env.cr.commit()
-            elif (fulfillment_status in ('fulfilled', 'partial') or financial_status in ('paid', 'partially_paid')) and odoo_order.state in ('draft', 'sent'):
-                odoo_order.action_confirm()
+            link_header = response.headers.get('Link') or ''
+            next_link = next((link for link in link_header.split(',') if 'rel="next"' in link), None)
+            if next_link:
+                page_info = next_link.split('page_info=')[1].split('>')[0]
+                self.write({cursor_field: page_info, max_field: max_updated[0]})
                 self.env.cr.commit()
-                if financial_status in ('paid', 'partially_paid'):
-                    self._handle_invoicing(odoo_order, order, financial_status)
-                if fulfillment_status in ('fulfilled', 'partial'):
-                    self._handle_delivery(odoo_order, order, fulfillment_status)
-
-            _logger.info(f"Order {shopify_order_id} already synced as {odoo_order.name}, checked status updates")
-
-        _logger.info(f"Processed order {shopify_order_id}")
-
-    def _handle_invoicing(self, odoo_order, order, financial_status):
-        """Handle invoice creation and payment based on Shopify financial status."""
-        if odoo_order.state == 'sale' and not odoo_order.invoice_ids:
-            invoice = odoo_order._create_invoices()
-            invoice.action_post()
-            self.env.cr.commit()
-
-            if financial_status == 'paid':
-                journal = self.env['account.journal'].search([('type', '=', 'cash')], limit=1)
-                if not journal:
-                    _logger.error(f"No cash journal found for payment of Shopify Order ID {order.get('id')}")
-                    return
-
-                payment = self.env['account.payment'].create({
-                    'partner_id': odoo_order.partner_id.id,
-                    'amount': invoice.amount_total,
-                    'payment_type': 'inbound',
-                    'partner_type': 'customer',
-                    'journal_id': journal.id,
-                    'date': fields.Date.today(),
+                params = {'page_info': page_info, 'limit': 250}
+            else:
+                self.write({
+                    cursor_field: False,
+                    max_field: False,
+                    watermark_field: max_updated[0] or self[watermark_field],
                 })
-                payment.action_post()
                 self.env.cr.commit()
+                _logger.info("Updated %s to %s", watermark_field, self[watermark_field])
+                return
 
-                invoice_line = invoice.line_ids.filtered(lambda l: l.account_id.account_type == 'asset_receivable')
-                payment_line = payment.line_ids.filtered(lambda l: l.account_id.account_type == 'asset_receivable')
-                if invoice_line and payment_line:
-                    (invoice_line + payment_line).reconcile()
-                    self.env.cr.commit()
-                    _logger.info(f"Invoice created and paid for Shopify Order ID {order.get('id')}")
-                else:
-                    _logger.error(f"Failed to reconcile payment for Shopify Order ID {order.get('id')}")
-            else:
-                _logger.info(f"Invoice created but not paid for Shopify Order ID {order.get('id')} (status: {financial_status})")
-
-    def _handle_delivery(self, odoo_order, order, fulfillment_status):
-        """Handle delivery creation, validation, and stock reversion."""
-        if odoo_order.state == 'sale' and not odoo_order.picking_ids.filtered(lambda p: p.state == 'done'):
-            picking = odoo_order.picking_ids.filtered(lambda p: p.state not in ('done', 'cancel'))
-            if not picking:
-                odoo_order.action_confirm()
-                picking = odoo_order.picking_ids.filtered(lambda p: p.state not in ('done', 'cancel'))
-                self.env.cr.commit()
+    def _missing_order_skus(self, order):
+        """Return the SKUs ordered in ``order`` that match no Odoo product, sorted."""
+        lines = [line for line in order.get('line_items') or [] if isinstance(line, dict) and line.get('sku')]
+        if not lines:
+            return []
+        skus = {line['sku'] for line in lines}
+        shopify_product_ids = {str(line['product_id']) for line in lines if line.get('product_id')}
+        products = self.env['product.product'].search_read([
+            '|',
+            ('default_code', 'in', list(skus)),
+            ('shopify_product_id', 'in', list(shopify_product_ids)),
+        ], ['default_code', 'shopify_product_id'])
+        known_skus = {product['default_code'] for product in products}
+        known_ids = {product['shopify_product_id'] for product in products}
+        missing = sorted({
+            line['sku'] for line in lines
+            if line['sku'] not in known_skus and str(line.get('product_id')) not in known_ids
+        })
+        if missing:
+            _logger.warning("Products not found in Odoo for order %s: SKUs %s", order.get('id'), ', '.join(missing))
+        return missing
+
+    def _sync_order_batch(self, orders, store, stats):
+        imported = []
+        for result in self.sync_orders(orders, store):
+            outcome = 'synced' if result['status'] in ('created', 'updated') else 'skipped'
+            stats.record(outcome, result['shopify_order_id'])
+            if outcome == 'synced':
+                imported.append(result['shopify_order_id'])
+        # An order fetched again once its products exist is no longer pending.
+        self.env['shopify.pending.order']._forget(store, imported)
 
-            if picking:
-                original_stock = {}
-                for move in picking.move_ids:
-                    product = move.product_id
-                    location = move.location_id
-                    original_stock[product.id] = self.env['stock.quant'].search([
-                        ('product_id', '=', product.id),
-                        ('location_id', '=', location.id)
-                    ], limit=1).quantity or 0
-                    _logger.debug(f"Before delivery - {product.default_code}: {original_stock[product.id]}")
-
-                picking.with_context(skip_backorder=True).button_validate()
-                self.env.cr.commit()
+    @retry_on_db_errors()
+    @metrics.instrument('order')
+    def sync_orders(self, orders, store):
+        """Ingest a batch of Shopify orders in one transaction, see ``shopify.order.ingestion``.
 
-                for move in picking.move_ids:
-                    product = move.product_id
-                    location = move.location_id
-                    original_qty = original_stock.get(product.id, 0)
-                    current_quant = self.env['stock.quant'].search([
-                        ('product_id', '=', product.id),
-                        ('location_id', '=', location.id)
-                    ], limit=1)
-                    if current_quant:
-                        current_quant.sudo().with_context(commit_transaction=True).write({'quantity': original_qty})
-                    else:
-                        self.env['stock.quant'].sudo().create({
-                            'product_id': product.id,
-                            'location_id': location.id,
-                            'quantity': original_qty,
-                        })
-                    self.env.cr.commit()
-                    _logger.debug(f"After revert - {product.default_code}: {original_qty}")
+        The returned results hold records of the committed transaction's
+        cursor; only their ids and statuses are usable afterwards.
+        """
+        return self.env['shopify.order.ingestion'].ingest_orders(store, orders)
 
-                if fulfillment_status == 'fulfilled':
-                    _logger.info(f"Delivery validated and stock reverted for Shopify Order ID {order.get('id')}")
-                elif fulfillment_status == 'partial':
-                    _logger.info(f"Partial delivery validated and stock reverted for Shopify Order ID {order.get('id')}")
-            else:
-                _logger.error(f"No picking created for Shopify Order ID {order.get('id')} despite confirmation")
+    def sync_order(self, order, store):
+        return self.sync_orders([order], store)[0]
 
     def create_product_mapping(self, store, product):
         """Create or update a mapping for the Shopify product in Odoo"""
@@ -884,7 +999,7 @@ class ShopifyStore(models.Model):
             ], limit=1)
             if existing_mapping:
                 existing_mapping.with_context(commit_transaction=True).write({'inventory_item_id': inventory_item_id})
-                _logger.info(f"Updated product mapping for SKU {product_sku} for store {store.name}")
+                _logger.debug("Updated product mapping for SKU %s for store %s", product_sku, store.name)
             else:
                 self.env['shopify.product.mapping'].sudo().create({
                     'store_id': store.id,
@@ -892,7 +1007,7 @@ class ShopifyStore(models.Model):
                     'inventory_item_id': inventory_item_id
                 })
                 self.env.cr.commit()
-                _logger.info(f"Created product mapping for SKU {product_sku} for store {store.name}")
+                _logger.debug("Created product mapping for SKU %s for store %s", product_sku, store.name)
 
     @retry_on_db_errors()
     def update_inventory_quantity(self, odoo_product, new_quantity, warehouse):
@@ -905,15 +1020,17 @@ class ShopifyStore(models.Model):
         stock_quant = self.env["stock.quant"].search(
             [("product_id", "=", odoo_product.id), ("location_id", "=", location_id)], limit=1
         )
-        if stock_quant:
-            stock_quant.sudo().with_context(commit_transaction=True).write({"quantity": new_quantity})
-        else:
-            self.env["stock.quant"].sudo().create({
-                "product_id": odoo_product.id,
-                "location_id": location_id,
-                "quantity": new_quantity,
-                "company_id": warehouse.company_id.id,
-            })
+        # The quantity comes from Shopify; don't push it back.
+        with shopify_sync_batch(self.env, origin='shopify'):
+            if stock_quant:
+                stock_quant.sudo().with_context(commit_transaction=True).write({"quantity": new_quantity})
+            else:
+                self.env["stock.quant"].sudo().create({
+                    "product_id": odoo_product.id,
+                    "location_id": location_id,
+                    "quantity": new_quantity,
+                    "company_id": warehouse.company_id.id,
+                })
         self.env.cr.commit()
 
     def create_inventory_adjustment(self, odoo_product, qty_difference, warehouse):
@@ -924,21 +1041,37 @@ class ShopifyStore(models.Model):
             ('location_id', '=', location_id)
         ], limit=1)
 
-        if stock_quant:
-            stock_quant.with_context(commit_transaction=True).write({'quantity': stock_quant.quantity + qty_difference})
-        else:
-            self.env['stock.quant'].create({
-                'product_id': odoo_product.id,
-                'location_id': location_id,
-                'quantity': qty_difference,
-                'company_id': warehouse.company_id.id
-            })
+        with shopify_sync_batch(self.env, origin='shopify'):
+            if stock_quant:
+                stock_quant.with_context(commit_transaction=True).write({'quantity': stock_quant.quantity + qty_difference})
+            else:
+                self.env['stock.quant'].create({
+                    'product_id': odoo_product.id,
+                    'location_id': location_id,
+                    'quantity': qty_difference,
+                    'company_id': warehouse.company_id.id
+                })
         self.env.cr.commit()
 
-    def sync_product_image(self, odoo_template, image_url):
-        """Syncs Shopify product images to Odoo."""
+    def _download_images(self, image_urls):
+        """Download ``image_urls`` concurrently and return ``{url: content}`` of the successful ones."""
+        self.ensure_one()
+        image_urls = list(dict.fromkeys(image_urls))
+        responses = async_client.run_calls(self.env, [(self, 'get', url, 'image', {}) for url in image_urls])
+        images = {}
+        for url, response in zip(image_urls, responses):
+            if isinstance(response, Exception) or response.status_code != 200:
+                _logger.warning("Could not download image %s: %s", url,
+                                response if isinstance(response, Exception) else response.status_code)
+                continue
+            images[url] = response.content
+        return images
+
+    def sync_product_image(self, odoo_template, image_url, image_data=None):
+        """Syncs Shopify product images to Odoo, downloading the image unless ``image_data`` is given."""
         try:
-            image_data = requests.get(image_url).content
+            if image_data is None:
+                image_data = requests.get(image_url).content
             odoo_template.with_context(commit_transaction=True).write({'image_1920': base64.b64encode(image_data)})
             self.env.cr.commit()
         except Exception as e:
@@ -967,6 +1100,79 @@ class ShopifyProductMapping(models.Model):
     sku = fields.Char(string="SKU", required=True, index=True)
     inventory_item_id = fields.Char(string="Inventory Item ID", required=True, index=True)
 
+    @api.model_create_multi
+    def create(self, vals_list):
+        mappings = super().create(vals_list)
+        self.env['shopify.pending.order']._resolve_skus(mappings.mapped('sku'))
+        return mappings
+
+class ShopifyTemplateMapping(models.Model):
+    _name = "shopify.template.mapping"
+    _description = "Shopify Product to Odoo Template Mapping"
+
+    store_id = fields.Many2one('shopify.store', ondelete='cascade', string="Shopify Store", required=True)
+    shopify_product_id = fields.Char(string="Shopify Product ID", required=True)
+    product_tmpl_id = fields.Many2one('product.template', ondelete='cascade', string="Product Template",
+                                      required=True, index=True)
+
+    _sql_constraints = [
+        ('store_product_uniq', 'unique(store_id, shopify_product_id)',
+         'This Shopify product is already mapped to a template.'),
+    ]
+
+class SyncLogProgress:
+    """In-memory progress of one sync run, written to its ``shopify.sync.log`` at intervals.
+
+    Totals are kept in memory and per-record errors are queued, so the log
+    row is written once per page (or every ``flush_interval`` seconds on slow
+    pages) instead of once per record, and the queued errors are inserted in
+    a single batch as ``shopify.sync.log.error`` lines. Each flush also
+    updates the store's ``shopify.sync.status`` row for the log's entity.
+    """
+
+    def __init__(self, log, flush_interval=30):
+        self.log = log
+        self.flush_interval = flush_interval
+        self.total_fetched = 0
+        self.total_skipped = 0
+        self.pending_errors = []
+        self.last_flush = time.monotonic()
+        log.env['shopify.sync.status']._run_started(log.store_id, log.sync_type)
+
+    def record_synced(self):
+        self.total_fetched += 1
+
+    def record_skipped(self, record_ref, message):
+        self.total_skipped += 1
+        self.pending_errors.append({
+            'log_id': self.log.id,
+            'record_ref': str(record_ref or ''),
+            'message': message,
+        })
+
+    def flush_if_due(self):
+        if time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self, **vals):
+        """Write the totals and queued errors, plus any extra ``vals``, and commit."""
+        if self.pending_errors:
+            self.log.env['shopify.sync.log.error'].create(self.pending_errors)
+            self.pending_errors = []
+        self.log.write(dict(vals, total_fetched=self.total_fetched, total_skipped=self.total_skipped))
+        status = self.log.env['shopify.sync.status']
+        store, entity = self.log.store_id, self.log.sync_type
+        if vals.get('status') == 'completed':
+            status._run_finished(store, entity, self.total_fetched, self.total_skipped,
+                                 watermark=store[f'{entity}_last_fetch_date'])
+        elif vals.get('status') == 'failed':
+            status._run_finished(store, entity, self.total_fetched, self.total_skipped,
+                                 error=vals.get('error_message') or 'Failed')
+        else:
+            status._page_done(store, entity, self.total_fetched, self.total_skipped)
+        self.log.env.cr.commit()
+        self.last_flush = time.monotonic()
+
 class ShopifySyncLog(models.Model):
     _name = 'shopify.sync.log'
     _description = 'Shopify Synchronization Log'
@@ -991,4 +1197,19 @@ class ShopifySyncLog(models.Model):
         ('failed', 'Failed')
     ], string='Status', default='in_progress')
     
-    error_message = fields.Text('Error Details')
\ No newline at end of file
+    error_message = fields.Text('Error Details')
+    error_ids = fields.One2many('shopify.sync.log.error', 'log_id', string='Record Errors')
+
+    def _auto_init(self):
+        res = super()._auto_init()
+        create_index(self._cr, 'shopify_sync_log_store_date_index', self._table, ['store_id', 'sync_date'])
+        return res
+
+class ShopifySyncLogError(models.Model):
+    _name = 'shopify.sync.log.error'
+    _description = 'Shopify Synchronization Record Error'
+    _order = 'id'
+
+    log_id = fields.Many2one('shopify.sync.log', string='Sync Log', required=True, ondelete='cascade', index=True)
+    record_ref = fields.Char('Shopify Record ID')
+    message = fields.Text('Error')
\ No newline at end of file
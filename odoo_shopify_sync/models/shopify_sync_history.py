@@ -1,18 +1,19 @@
 from odoo import models, fields
 
+from ..tools.retention import delete_in_chunks, retention_cutoff
+
 class ShopifySyncHistory(models.Model):
     _name = 'shopify.sync.history'
     _description = 'Shopify Sync History'
 
     product_id = fields.Many2one('product.product', string='Odoo Product', required=True)
     shopify_product_id = fields.Char(string='Shopify Product ID', required=True)
-    sync_time = fields.Datetime(string='Sync Time', default=fields.Datetime.now, required=True)
+    sync_time = fields.Datetime(string='Sync Time', default=fields.Datetime.now, required=True, index=True)
     source = fields.Selection([('odoo', 'Odoo'), ('shopify', 'Shopify')], default='odoo', string='Sync Source')
 
 
     def clean_old_sync_history(self):
-        """Deletes old sync history records."""
-        expiry_date = fields.Datetime.now() - fields.timedelta(days=30)
-        old_records = self.env['shopify.sync.history'].sudo().search([('sync_time', '<', expiry_date)])
-        old_records.unlink()
-        
+        """Deletes sync history older than ``odoo_shopify_sync.history_retention_days`` (30 by default)."""
+        expiry_date = retention_cutoff(self.env, 'odoo_shopify_sync.history_retention_days')
+        if expiry_date:
+            delete_in_chunks(self.env, self._table, 'sync_time < %s', [expiry_date])
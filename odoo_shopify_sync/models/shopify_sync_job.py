@@ -0,0 +1,310 @@
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg2
+
+from odoo import SUPERUSER_ID, api, models, fields
+
+from ..tools import metrics
+
+_logger = logging.getLogger(__name__)
+
+# Attempts of a job before it stays failed, and the delay before each retry, in seconds.
+MAX_ATTEMPTS = 3
+RETRY_DELAY = 60
+
+# Seconds a claimed job stays owned by its worker without a heartbeat, and
+# the interval at which a running job's worker renews it.
+LEASE_SECONDS = 300
+HEARTBEAT_INTERVAL = 60
+
+# ir.config_parameter telling that dedicated sync workers consume the job queue:
+# the crons then only queue jobs and the order webhooks are queued too.
+WORKER_PARAM = 'odoo_shopify_sync.sync_worker'
+
+# Queued order webhooks of one store ingested together in one batch.
+ORDER_JOB_BATCH_SIZE = 50
+
+# Job types of which a store runs one at a time.
+EXCLUSIVE_TYPES = ('products', 'customers', 'orders', 'pending_orders', 'reconcile')
+
+
+def _worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+class ShopifySyncJob(models.Model):
+    _name = 'shopify.sync.job'
+    _description = 'Shopify Sync Job'
+    _order = 'id desc'
+
+    store_id = fields.Many2one('shopify.store', string='Store', required=True, ondelete='cascade')
+    job_type = fields.Selection([
+        ('products', 'Fetch Products'),
+        ('customers', 'Fetch Customers'),
+        ('orders', 'Fetch Orders'),
+        ('pending_orders', 'Retry Pending Orders'),
+        ('reconcile', 'Reconcile Inventory'),
+        ('order', 'Ingest Order Webhook'),
+    ], string='Job', required=True)
+    payload = fields.Text('Payload', help='JSON payload of webhook jobs.')
+    state = fields.Selection([
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ], string='Status', default='pending', required=True)
+    scheduled_at = fields.Datetime('Run After', default=fields.Datetime.now, required=True)
+    started_at = fields.Datetime('Started')
+    worker = fields.Char('Worker', help='Host and process id of the worker that claimed the job.')
+    lease_until = fields.Datetime('Lease Expires',
+                                  help='The job is reclaimed by another worker when its lease expires without a heartbeat.')
+    finished_at = fields.Datetime('Finished')
+    attempts = fields.Integer('Attempts', default=0)
+    last_error = fields.Text('Last Error')
+
+    def init(self):
+        self.env.cr.execute("""
+            CREATE INDEX IF NOT EXISTS shopify_sync_job_queue_index
+                ON shopify_sync_job (scheduled_at, id) WHERE state IN ('pending', 'running')
+        """)
+        # One queued fetch job per store and type. Duplicates queued before
+        # the index existed are closed first, keeping the oldest.
+        self.env.cr.execute("""
+            UPDATE shopify_sync_job j
+               SET state = 'done', finished_at = now() at time zone 'UTC'
+             WHERE j.state IN ('pending', 'running') AND j.job_type != 'order'
+               AND EXISTS (SELECT 1 FROM shopify_sync_job o
+                            WHERE o.store_id = j.store_id AND o.job_type = j.job_type
+                              AND o.state IN ('pending', 'running') AND o.id < j.id)
+        """)
+        self.env.cr.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS shopify_sync_job_queued_uniq
+                ON shopify_sync_job (store_id, job_type)
+             WHERE state IN ('pending', 'running') AND job_type != 'order'
+        """)
+
+    @api.model
+    def _worker_enabled(self):
+        return self.env['ir.config_parameter'].sudo().get_param(WORKER_PARAM) in ('1', 'True', 'true')
+
+    @api.model
+    def _enqueue(self, store, job_type, payload=None):
+        """Queue a job; fetch jobs already queued or running for the store are not queued twice.
+
+        The search skips the common case cheaply; the partial unique index
+        ``shopify_sync_job_queued_uniq`` settles concurrent enqueues, the
+        loser getting an empty recordset.
+        """
+        if job_type != 'order' and self.search_count([
+            ('store_id', '=', store.id), ('job_type', '=', job_type), ('state', 'in', ('pending', 'running')),
+        ]):
+            return self.browse()
+        try:
+            with self.env.cr.savepoint():
+                return self.create({
+                    'store_id': store.id,
+                    'job_type': job_type,
+                    'payload': json.dumps(payload) if payload is not None else False,
+                })
+        except psycopg2.errors.UniqueViolation:
+            _logger.debug("A %s job of store %s was queued concurrently, skipping", job_type, store.id)
+            return self.browse()
+
+    @api.model
+    def _claim(self, shard=0, shards=1):
+        """Take the oldest due job of the stores of ``shard`` under a lease and return it.
+
+        Pending jobs and running jobs whose lease expired, because their
+        worker died, are both claimable. ``FOR UPDATE SKIP LOCKED`` lets any
+        number of workers on any number of nodes claim concurrently without
+        waiting on each other or taking the same job, and a store never runs
+        two jobs of one ``EXCLUSIVE_TYPES`` type at once. Jobs that lost
+        their lease ``MAX_ATTEMPTS`` times are failed instead.
+        """
+        self._fail_expired()
+        self.env.cr.execute("""
+            WITH job AS (
+                SELECT j.id FROM shopify_sync_job j
+                 WHERE ((j.state = 'pending' AND j.scheduled_at <= now() at time zone 'UTC')
+                        OR (j.state = 'running' AND j.lease_until < now() at time zone 'UTC'))
+                   AND j.store_id %% %s = %s
+                   AND (j.job_type NOT IN %s OR NOT EXISTS (
+                            SELECT 1 FROM shopify_sync_job r
+                             WHERE r.store_id = j.store_id AND r.job_type = j.job_type AND r.id != j.id
+                               AND r.state = 'running' AND r.lease_until >= now() at time zone 'UTC'))
+              ORDER BY j.scheduled_at, j.id
+                 LIMIT 1
+                   FOR UPDATE SKIP LOCKED
+            )
+            UPDATE shopify_sync_job
+               SET state = 'running', worker = %s, attempts = attempts + 1,
+                   started_at = now() at time zone 'UTC',
+                   lease_until = now() at time zone 'UTC' + make_interval(secs => %s)
+              FROM job
+             WHERE shopify_sync_job.id = job.id
+         RETURNING shopify_sync_job.id
+        """, [shards, shard, EXCLUSIVE_TYPES, _worker_name(), LEASE_SECONDS])
+        row = self.env.cr.fetchone()
+        self.env.cr.commit()
+        job = self.browse(row[0] if row else [])
+        if job.job_type == 'order':
+            job |= job._claim_order_batch()
+        return job
+
+    def _claim_order_batch(self):
+        """Claim more due order webhook jobs of this job's store, to be ingested with it in one batch."""
+        self.env.cr.execute("""
+            UPDATE shopify_sync_job
+               SET state = 'running', worker = %s, attempts = attempts + 1,
+                   started_at = now() at time zone 'UTC',
+                   lease_until = now() at time zone 'UTC' + make_interval(secs => %s)
+             WHERE id IN (SELECT id FROM shopify_sync_job
+                           WHERE store_id = %s AND job_type = 'order' AND state = 'pending'
+                             AND scheduled_at <= now() at time zone 'UTC'
+                        ORDER BY scheduled_at, id
+                           LIMIT %s
+                             FOR UPDATE SKIP LOCKED)
+         RETURNING id
+        """, [_worker_name(), LEASE_SECONDS, self.store_id.id, ORDER_JOB_BATCH_SIZE - 1])
+        ids = [row[0] for row in self.env.cr.fetchall()]
+        self.env.cr.commit()
+        return self.browse(sorted(ids))
+
+    @api.model
+    def _fail_expired(self):
+        self.env.cr.execute("""
+            UPDATE shopify_sync_job
+               SET state = 'failed', last_error = 'Worker lost its lease ' || attempts || ' times'
+             WHERE state = 'running' AND lease_until < now() at time zone 'UTC' AND attempts >= %s
+        """, [MAX_ATTEMPTS])
+        if self.env.cr.rowcount:
+            _logger.warning("Failed %s Shopify sync jobs whose workers kept dying", self.env.cr.rowcount)
+
+    @contextmanager
+    def _heartbeat(self):
+        """Renew the lease of these jobs every ``HEARTBEAT_INTERVAL`` seconds while the block runs.
+
+        The renewal runs in a thread on its own cursor, so it is committed
+        while the job's own transactions are still open.
+        """
+        stop = threading.Event()
+        registry, job_ids = self.env.registry, tuple(self.ids)
+
+        def beat():
+            while not stop.wait(HEARTBEAT_INTERVAL):
+                try:
+                    with registry.cursor() as cr:
+                        cr.execute("""
+                            UPDATE shopify_sync_job
+                               SET lease_until = now() at time zone 'UTC' + make_interval(secs => %s)
+                             WHERE id IN %s AND state = 'running'
+                        """, [LEASE_SECONDS, job_ids])
+                except Exception as e:
+                    _logger.warning("Heartbeat of Shopify sync jobs %s failed: %s", job_ids, e)
+
+        thread = threading.Thread(target=beat, name=f'shopify-sync-job-{job_ids[0]}', daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+
+    def _run(self):
+        """Run these claimed jobs and record their outcome; failed jobs are retried later.
+
+        Several jobs are only claimed together for the order webhooks of one
+        store, which are ingested as one batch.
+        """
+        store = self[:1].store_id
+        job_type = self[:1].job_type
+        try:
+            with self._heartbeat():
+                errors = self._dispatch(store)
+        except Exception as e:
+            self.env.cr.rollback()
+            _logger.error("Shopify sync jobs %s (%s) of %s failed: %s", self.ids, job_type, store.name, e)
+            errors = dict.fromkeys(self.ids, str(e))
+        for job in self:
+            if job.id in errors:
+                job._retry_later(errors[job.id])
+            else:
+                job.write({'state': 'done', 'finished_at': fields.Datetime.now(), 'lease_until': False, 'last_error': False})
+        self.env.cr.commit()
+
+    def _retry_later(self, error):
+        self.ensure_one()
+        self.write({
+            'state': 'pending' if self.attempts < MAX_ATTEMPTS else 'failed',
+            'scheduled_at': fields.Datetime.add(fields.Datetime.now(), seconds=RETRY_DELAY * self.attempts),
+            'lease_until': False,
+            'last_error': error,
+        })
+
+    def _dispatch(self, store):
+        """Run the work of these jobs and return ``{job id: error}`` of the jobs that failed on their own."""
+        job_type = self[:1].job_type
+        if job_type == 'order':
+            # Same user as the synchronous webhook, so the orders get a company.
+            admin_user = self.env['res.users'].search([('login', '=', 'admin')], limit=1)
+            ingestion = self.env['shopify.order.ingestion'].with_user(admin_user or SUPERUSER_ID).sudo()
+            results = ingestion.ingest_orders(store, [json.loads(job.payload) for job in self])
+            return {job.id: result['message'] or result['status'] for job, result in zip(self, results)
+                    if result['status'] == 'error'}
+        self.ensure_one()
+        if job_type == 'products':
+            store.update_shopify_location_id()
+            store.fetch_shopify_inventory()
+        elif job_type == 'customers':
+            store.fetch_shopify_customers()
+        elif job_type == 'orders':
+            store.fetch_shopify_orders()
+        elif job_type == 'pending_orders':
+            self.env['shopify.pending.order']._retry_store(store)
+        elif job_type == 'reconcile':
+            store.reconcile_inventory()
+        return {}
+
+    @api.model
+    def _run_queue(self):
+        """Run the queued jobs from a cron, unless dedicated sync workers consume the queue."""
+        if not self._worker_enabled():
+            self._run_worker(until_empty=True)
+        metrics.flush_if_due(self.env)
+
+    @api.model
+    def _run_worker(self, shard=0, shards=1, idle_sleep=5, max_jobs=None, until_empty=False):
+        """Consume the job queue of ``shard`` until ``max_jobs`` jobs ran (forever by default).
+
+        Meant for a dedicated process, see the ``shopify_sync_worker``
+        command, or ``odoo-bin shell``. The process keeps its database and
+        HTTP connections between jobs, so it does not pay the cron workers'
+        per-run start-up, and it is not bound by their time limits. Any
+        number of workers can run on any number of nodes; ``shard`` only
+        narrows a worker to part of the stores. With ``until_empty`` it
+        returns as soon as no job is claimable.
+        """
+        _logger.info("Shopify sync worker started for shard %s/%s", shard, shards)
+        done = 0
+        while max_jobs is None or done < max_jobs:
+            job = self._claim(shard, shards)
+            if not job:
+                if until_empty:
+                    break
+                metrics.flush_if_due(self.env)
+                time.sleep(idle_sleep)
+                continue
+            job._run()
+            done += len(job)
+            store = job[:1].store_id
+            metrics.gauge(self.env, 'queue_depth', store.id, 'job',
+                          self.search_count([('store_id', '=', store.id), ('state', '=', 'pending')]))
+            metrics.flush_if_due(self.env)
+            self.env.invalidate_all()
+        return done
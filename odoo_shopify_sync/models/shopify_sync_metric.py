@@ -0,0 +1,178 @@
+from odoo import models, fields, tools
+from odoo.tools.sql import create_unique_index
+
+from ..tools.metrics import METRICS
+from ..tools.retention import delete_in_chunks, retention_cutoff
+
+
+class ShopifySyncMetric(models.Model):
+    _name = 'shopify.sync.metric'
+    _description = 'Shopify Sync Metric (hourly)'
+    _order = 'hour desc'
+
+    hour = fields.Datetime('Hour', required=True, index=True)
+    store_id = fields.Many2one('shopify.store', string='Store', ondelete='cascade')
+    entity = fields.Char('Entity', default='')
+    metric = fields.Char('Metric', required=True)
+    bucket = fields.Char('Bucket', default='',
+                         help='Upper bound of a histogram bucket; empty for the metric totals.')
+    count = fields.Float('Count')
+    total = fields.Float('Total')
+    max_value = fields.Float('Max')
+
+    def _auto_init(self):
+        res = super()._auto_init()
+        create_unique_index(
+            self._cr,
+            'shopify_sync_metric_key_uniq',
+            self._table,
+            ['hour', 'COALESCE(store_id, 0)', 'entity', 'metric', 'bucket'],
+        )
+        return res
+
+    def _upsert_buffer(self, values):
+        """Add the buffered ``{(hour, store_id, entity, metric, bucket): [count, total, max]}``
+        values of one worker to the hourly rows. Gauges replace the stored value.
+        """
+        for (hour, store_id, entity, metric, bucket), (count, total, max_value) in values.items():
+            if METRICS.get(metric, ('counter',))[0] == 'gauge':
+                update = "count = EXCLUDED.count, total = EXCLUDED.total"
+            else:
+                update = "count = m.count + EXCLUDED.count, total = m.total + EXCLUDED.total"
+            self.env.cr.execute(f"""
+                INSERT INTO shopify_sync_metric AS m
+                       (hour, store_id, entity, metric, bucket, count, total, max_value,
+                        create_date, write_date, create_uid, write_uid)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s,
+                        now() at time zone 'UTC', now() at time zone 'UTC', %s, %s)
+                ON CONFLICT (hour, COALESCE(store_id, 0), entity, metric, bucket)
+                DO UPDATE SET {update},
+                              max_value = GREATEST(m.max_value, EXCLUDED.max_value),
+                              write_date = EXCLUDED.write_date
+            """, [hour, store_id, entity, metric, bucket, count, total, max_value,
+                  self.env.uid, self.env.uid])
+
+    def _gc_expired_hours(self):
+        """Delete the hourly rows older than ``odoo_shopify_sync.metric_retention_days``."""
+        cutoff = retention_cutoff(self.env, 'odoo_shopify_sync.metric_retention_days')
+        if cutoff:
+            delete_in_chunks(self.env, self._table, 'hour < %s', [cutoff])
+
+    def _render_prometheus(self):
+        """Render all retained metrics in the Prometheus text exposition format.
+
+        Counters and histograms are summed over every retained hour; gauges
+        report the value of the most recent hour.
+        """
+        gauges = self._gauge_names()
+        self.env.cr.execute("""
+            SELECT m.metric, s.name, m.entity, m.bucket, sum(m.count), sum(m.total)
+              FROM shopify_sync_metric m
+         LEFT JOIN shopify_store s ON s.id = m.store_id
+             WHERE m.metric NOT IN %s
+          GROUP BY m.metric, s.name, m.entity, m.bucket
+        """, [gauges])
+        rows = self.env.cr.fetchall()
+        self.env.cr.execute("""
+            SELECT DISTINCT ON (m.metric, m.store_id, m.entity)
+                   m.metric, s.name, m.entity, m.bucket, m.count, m.total
+              FROM shopify_sync_metric m
+         LEFT JOIN shopify_store s ON s.id = m.store_id
+             WHERE m.metric IN %s
+          ORDER BY m.metric, m.store_id, m.entity, m.hour DESC
+        """, [gauges])
+        rows += self.env.cr.fetchall()
+
+        series_by_metric = {}
+        for metric, store, entity, bucket, count, total in rows:
+            series_by_metric.setdefault(metric, []).append((store or '', entity, bucket, count, total))
+
+        lines = []
+        for metric in sorted(series_by_metric):
+            kind, help_text = METRICS.get(metric, ('counter', metric))
+            name = f'shopify_{metric}_seconds' if kind == 'histogram' else f'shopify_{metric}'
+            if kind == 'counter':
+                name += '_total'
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            series = sorted(series_by_metric[metric],
+                            key=lambda row: (row[0], row[1], float(row[2]) if row[2] else float('inf')))
+            for store, entity, bucket, count, total in series:
+                labels = f'store="{_escape(store)}",entity="{_escape(entity)}"'
+                if kind == 'histogram':
+                    if bucket:
+                        lines.append(f'{name}_bucket{{{labels},le="{bucket}"}} {count:g}')
+                    else:
+                        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {count:g}')
+                        lines.append(f'{name}_sum{{{labels}}} {total:g}')
+                        lines.append(f'{name}_count{{{labels}}} {count:g}')
+                elif kind == 'gauge':
+                    lines.append(f'{name}{{{labels}}} {total:g}')
+                else:
+                    lines.append(f'{name}{{{labels}}} {count:g}')
+        return '\n'.join(lines) + '\n'
+
+    def _gauge_names(self):
+        return tuple(name for name, (kind, _help) in METRICS.items() if kind == 'gauge')
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class ShopifySyncMetricReport(models.Model):
+    _name = 'shopify.sync.metric.report'
+    _description = 'Shopify Sync Dashboard (hourly)'
+    _auto = False
+    _order = 'hour desc'
+
+    hour = fields.Datetime('Hour', readonly=True)
+    store_id = fields.Many2one('shopify.store', string='Store', readonly=True)
+    entity = fields.Char('Entity', readonly=True)
+    api_calls = fields.Integer('API Calls', readonly=True)
+    api_errors = fields.Integer('API Errors', readonly=True)
+    api_latency_avg = fields.Float('Avg API Latency (s)', readonly=True, group_operator='avg')
+    api_latency_max = fields.Float('Max API Latency (s)', readonly=True, group_operator='max')
+    throttle_wait = fields.Float('Throttle Wait (s)', readonly=True)
+    sql_queries = fields.Integer('SQL Queries', readonly=True)
+    records_synced = fields.Integer('Records Synced', readonly=True)
+    records_skipped = fields.Integer('Records Skipped', readonly=True)
+    fetch_seconds = fields.Float('Fetch Time (s)', readonly=True)
+    records_per_second = fields.Float('Records/sec', readonly=True, group_operator='avg')
+    sync_errors = fields.Integer('Sync Errors', readonly=True)
+    db_retries = fields.Integer('DB Retries', readonly=True)
+    webhooks = fields.Integer('Webhooks', readonly=True)
+    webhook_latency_avg = fields.Float('Avg Webhook Time (s)', readonly=True, group_operator='avg')
+    queue_depth = fields.Float('Queue Depth', readonly=True, group_operator='max')
+
+    def init(self):
+        tools.drop_view_if_exists(self.env.cr, self._table)
+        self.env.cr.execute(f"""
+            CREATE OR REPLACE VIEW {self._table} AS (
+                SELECT min(m.id) AS id,
+                       m.hour,
+                       m.store_id,
+                       m.entity,
+                       sum(m.count) FILTER (WHERE m.metric = 'api_calls') AS api_calls,
+                       sum(m.count) FILTER (WHERE m.metric = 'api_errors') AS api_errors,
+                       sum(m.total) FILTER (WHERE m.metric = 'api_latency')
+                         / NULLIF(sum(m.count) FILTER (WHERE m.metric = 'api_latency'), 0) AS api_latency_avg,
+                       max(m.max_value) FILTER (WHERE m.metric = 'api_latency') AS api_latency_max,
+                       sum(m.total) FILTER (WHERE m.metric = 'throttle_wait') AS throttle_wait,
+                       sum(m.count) FILTER (WHERE m.metric = 'sql_queries') AS sql_queries,
+                       sum(m.count) FILTER (WHERE m.metric = 'records_synced') AS records_synced,
+                       sum(m.count) FILTER (WHERE m.metric = 'records_skipped') AS records_skipped,
+                       sum(m.total) FILTER (WHERE m.metric = 'fetch_duration') AS fetch_seconds,
+                       sum(m.count) FILTER (WHERE m.metric = 'records_synced')
+                         / NULLIF(sum(m.total) FILTER (WHERE m.metric = 'fetch_duration'), 0) AS records_per_second,
+                       sum(m.count) FILTER (WHERE m.metric = 'sync_errors') AS sync_errors,
+                       sum(m.count) FILTER (WHERE m.metric = 'db_retries') AS db_retries,
+                       sum(m.count) FILTER (WHERE m.metric = 'webhook_duration') AS webhooks,
+                       sum(m.total) FILTER (WHERE m.metric = 'webhook_duration')
+                         / NULLIF(sum(m.count) FILTER (WHERE m.metric = 'webhook_duration'), 0) AS webhook_latency_avg,
+                       max(m.total) FILTER (WHERE m.metric = 'queue_depth') AS queue_depth
+                  FROM shopify_sync_metric m
+                 WHERE m.bucket = ''
+              GROUP BY m.hour, m.store_id, m.entity
+            )
+        """)
@@ -0,0 +1,55 @@
+from odoo import api, models, fields
+
+
+class ShopifySyncState(models.Model):
+    _name = 'shopify.sync.state'
+    _description = 'Shopify Inventory Sync State'
+
+    product_id = fields.Many2one('product.product', string='Product', required=True, ondelete='cascade')
+    store_id = fields.Many2one('shopify.store', string='Store', required=True, ondelete='cascade')
+    source = fields.Selection(
+        [('odoo', 'Odoo'), ('synced', 'Synced')],
+        string='Last Update Source',
+        help='Odoo when the last change was pushed to this store, Synced when it came from its webhook.',
+    )
+    updated_at = fields.Datetime('Last Updated At', help='Time of the last inventory change, in UTC.')
+
+    _sql_constraints = [
+        ('product_store_uniq', 'unique(product_id, store_id)', 'One sync state per product and store.'),
+    ]
+
+    @api.model
+    def _record(self, product_ids, store_id, source, updated_at):
+        """Record the origin of an inventory change of ``product_ids`` in ``store_id``.
+
+        This is the loop-prevention metadata that used to be written on
+        ``product.product``. It is upserted in SQL so hot products are not
+        written, locked or invalidated on every stock movement, and the
+        timestamp never moves backwards. Only the timestamp is read back, to
+        drop stale webhooks; whether a stock change is pushed is decided by
+        the origin of the open sync batch, not by this state.
+        """
+        if not product_ids:
+            return
+        self.env.cr.execute("""
+            INSERT INTO shopify_sync_state AS s
+                   (product_id, store_id, source, updated_at,
+                    create_date, write_date, create_uid, write_uid)
+            SELECT product_id, %s, %s, %s,
+                   now() at time zone 'UTC', now() at time zone 'UTC', %s, %s
+              FROM unnest(%s) AS product_id
+            ON CONFLICT (product_id, store_id)
+            DO UPDATE SET source = EXCLUDED.source,
+                          updated_at = GREATEST(s.updated_at, EXCLUDED.updated_at),
+                          write_date = EXCLUDED.write_date
+        """, [store_id, source, updated_at, self.env.uid, self.env.uid, sorted(set(product_ids))])
+
+    @api.model
+    def _get_updated_at(self, product_id, store_id):
+        """Return the time of the last recorded inventory change, or None."""
+        self.env.cr.execute(
+            "SELECT updated_at FROM shopify_sync_state WHERE product_id = %s AND store_id = %s",
+            [product_id, store_id],
+        )
+        row = self.env.cr.fetchone()
+        return row[0] if row else None
@@ -0,0 +1,107 @@
+from datetime import datetime
+
+from odoo import api, models, fields
+
+from ..tools import metrics
+
+ENTITIES = [('product', 'Products'), ('customer', 'Customers'), ('order', 'Orders')]
+
+
+class ShopifySyncStatus(models.Model):
+    _name = 'shopify.sync.status'
+    _description = 'Shopify Sync Status'
+    _order = 'store_id, entity'
+
+    store_id = fields.Many2one('shopify.store', string='Store', required=True, ondelete='cascade')
+    entity = fields.Selection(ENTITIES, string='Entity', required=True)
+    state = fields.Selection(
+        [('running', 'Running'), ('ok', 'Healthy'), ('failed', 'Failed')],
+        string='Status',
+    )
+    last_run_at = fields.Datetime('Last Run')
+    last_success_at = fields.Datetime('Last Success')
+    last_error = fields.Char('Last Error')
+    watermark = fields.Datetime('Synced Up To', help='Shopify updated_at up to which all records are synced, in UTC.')
+    lag_hours = fields.Float('Lag (hours)', compute='_compute_lag_hours',
+                             help='Time since the last successful sync run.')
+    run_synced = fields.Integer('Synced (last run)')
+    run_skipped = fields.Integer('Skipped (last run)')
+    error_rate = fields.Float('Error Rate (%)', compute='_compute_error_rate')
+    backlog = fields.Integer('Backlog', help='Records waiting to be synced, e.g. orders waiting for products.')
+    api_calls_used = fields.Integer('API Calls Used')
+    api_call_limit = fields.Integer('API Call Limit')
+
+    _sql_constraints = [
+        ('store_entity_uniq', 'unique(store_id, entity)', 'One sync status per store and entity.'),
+    ]
+
+    def _compute_lag_hours(self):
+        now = datetime.utcnow()
+        for status in self:
+            # An idle store has nothing newer than its watermark to sync, so
+            # the lag is measured from the last run that caught up with Shopify.
+            status.lag_hours = (now - status.last_success_at).total_seconds() / 3600 if status.last_success_at else 0.0
+
+    @api.depends('run_synced', 'run_skipped')
+    def _compute_error_rate(self):
+        for status in self:
+            processed = status.run_synced + status.run_skipped
+            status.error_rate = 100.0 * status.run_skipped / processed if processed else 0.0
+
+    # The methods below are called from the sync paths. Each one only touches
+    # the (store, entity) row, so keeping the dashboard current costs the
+    # same whatever the size of the sync log.
+
+    def _upsert(self, store, entity, assignments, params):
+        used, limit = metrics.api_budget(self.env, store.id)
+        self.env.cr.execute("""
+            INSERT INTO shopify_sync_status (store_id, entity, create_date, write_date, create_uid, write_uid)
+            VALUES (%s, %s, now() at time zone 'UTC', now() at time zone 'UTC', %s, %s)
+            ON CONFLICT (store_id, entity) DO NOTHING
+        """, [store.id, entity, self.env.uid, self.env.uid])
+        self.env.cr.execute(f"""
+            UPDATE shopify_sync_status AS s
+               SET {assignments},
+                   api_calls_used = COALESCE(%s, s.api_calls_used),
+                   api_call_limit = COALESCE(%s, s.api_call_limit),
+                   write_date = now() at time zone 'UTC'
+             WHERE s.store_id = %s AND s.entity = %s
+        """, [*params, used, limit, store.id, entity])
+        self.invalidate_model()
+
+    @api.model
+    def _run_started(self, store, entity):
+        self._upsert(store, entity, """
+            state = 'running',
+            last_run_at = now() at time zone 'UTC',
+            run_synced = 0,
+            run_skipped = 0
+        """, [])
+
+    @api.model
+    def _page_done(self, store, entity, synced, skipped, backlog=None):
+        self._upsert(store, entity, """
+            run_synced = %s,
+            run_skipped = %s,
+            backlog = COALESCE(%s, s.backlog)
+        """, [synced, skipped, backlog])
+
+    @api.model
+    def _run_finished(self, store, entity, synced, skipped, watermark=None, backlog=None, error=None):
+        if error:
+            self._upsert(store, entity, """
+                state = 'failed',
+                run_synced = %s,
+                run_skipped = %s,
+                last_error = %s
+            """, [synced, skipped, str(error)[:500]])
+        else:
+            self._upsert(store, entity, """
+                state = 'ok',
+                last_success_at = now() at time zone 'UTC',
+                last_error = NULL,
+                run_synced = %s,
+                run_skipped = %s,
+                watermark = COALESCE(%s, s.watermark),
+                backlog = COALESCE(%s, s.backlog)
+            """, [synced, skipped, watermark, backlog])
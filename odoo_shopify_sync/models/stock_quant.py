@@ -1,61 +1,94 @@
-from odoo import models, api, fields
+from odoo import models, api
 import requests
 import logging
-from datetime import datetime
-import pytz
+from collections import defaultdict
+
+from ..tools.sync_batch import current_batch
 
 _logger = logging.getLogger(__name__)
 
 class StockQuant(models.Model):
     _inherit = 'stock.quant'
 
-    @api.model
-    def create(self, vals):
-        record = super(StockQuant, self).create(vals)
-        if 'quantity' in vals and not self._should_skip_shopify_sync():
-            product = record.product_id  # This is the variant (product.product)
-            actual_quantity = product.with_context(warehouse=record.location_id.warehouse_id.id).qty_available  # Total available qty for the variant
-            
-            # Set last_updated_at to current US Eastern Time
-            us_eastern = pytz.timezone('America/New_York')
-            current_time_us = fields.Datetime.to_string(datetime.now(us_eastern))
-            
-            product.sudo().write({
-                'last_update_source': 'odoo',
-                'last_updated_at': current_time_us  # Updated to US Eastern Time
-            })
-            _logger.info(f"[SYNC] Created stock quant for variant {product.default_code}. Total available qty: {actual_quantity}")
-            self.env['shopify.store'].sync_quantity_to_shopify(product, actual_quantity)
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super(StockQuant, self).create(vals_list)
+        quants = self.browse([record.id for record, vals in zip(records, vals_list) if 'quantity' in vals])
+        if quants and not self._should_skip_shopify_sync():
+            quants._queue_shopify_sync()
         else:
-            _logger.debug(f"Skipping Shopify sync on create for variant {record.product_id.default_code or 'unknown'}")
-        return record
+            _logger.debug("Skipping Shopify sync on create for quants %s", records.ids)
+        return records
 
     def write(self, vals):
         res = super(StockQuant, self).write(vals)
         if 'quantity' in vals and not self._should_skip_shopify_sync():
-            for quant in self:
-                product = quant.product_id  # This is the variant (product.product)
-                actual_quantity = product.with_context(warehouse=quant.location_id.warehouse_id.id).qty_available  # Total available qty for the variant
-                
-                # Set last_updated_at to current US Eastern Time
-                us_eastern = pytz.timezone('America/New_York')
-                current_time_us = fields.Datetime.to_string(datetime.now(us_eastern))
-                
-                product.sudo().write({
-                    'last_update_source': 'odoo',
-                    'last_updated_at': current_time_us  # Updated to US Eastern Time
-                })
-                _logger.info(f"[SYNC] Updated stock quant for variant {product.default_code}. Total available qty: {actual_quantity}")
-                self.env['shopify.store'].sync_quantity_to_shopify(product, actual_quantity)
+            self._queue_shopify_sync()
         else:
-            for quant in self:
-                _logger.debug(f"Skipping Shopify sync on write for variant {quant.product_id.default_code or 'unknown'}")
+            _logger.debug("Skipping Shopify sync on write for quants %s", self.ids)
         return res
 
+    def _queue_shopify_sync(self):
+        """Push the quantities of these quants' products now, or at the end of the open sync batch."""
+        pairs = [(quant.product_id.id, quant.location_id.id) for quant in self if quant.location_id.usage == 'internal']
+        batch = current_batch(self.env)
+        if batch is not None:
+            batch.add(pairs)
+        elif pairs:
+            self._sync_quantities_to_shopify(pairs)
+
+    @api.model
+    def _sync_quantities_to_shopify(self, pairs, exclude_store_ids=()):
+        """Push the available quantities behind the ``(product_id, location_id)`` pairs to Shopify.
+
+        Every Shopify location mapped to one of the changed locations or to a
+        parent of them gets the product's quantity in its mapped location.
+        Quantities are computed with one ``_compute_quantities_dict`` call per
+        mapped location, shared by the stores that map it, and the levels of
+        all stores are sent in concurrent batched calls. The products themselves are not written;
+        the sync origin is kept in ``shopify.sync.state`` once a push succeeds.
+        """
+        product_ids_by_location = defaultdict(set)
+        for product_id, location_id in pairs:
+            product_ids_by_location[location_id].add(product_id)
+        changed_locations = self.env['stock.location'].browse(list(product_ids_by_location))
+
+        stores = self.env['shopify.store'].search([('state', '=', 'active'), ('id', 'not in', list(exclude_store_ids))])
+        wanted = defaultdict(set)  # stock.location -> product ids to compute there
+        targets = []  # (store, shopify_location_id, stock.location, product ids)
+        for store in stores:
+            for shopify_location_id, location in store._inventory_locations():
+                product_ids = set()
+                for changed in changed_locations:
+                    if changed.parent_path.startswith(location.parent_path):
+                        product_ids |= product_ids_by_location[changed.id]
+                if product_ids:
+                    wanted[location] |= product_ids
+                    targets.append((store, shopify_location_id, location, product_ids))
+
+        Product = self.env['product.product']
+        quantities = {}
+        for location, product_ids in wanted.items():
+            products = Product.browse(sorted(product_ids)).with_context(location=location.id)
+            qties = products._compute_quantities_dict(None, None, None)
+            quantities[location] = {product_id: qties[product_id]['qty_available'] for product_id in product_ids}
+
+        levels_by_store = defaultdict(dict)
+        for store, shopify_location_id, location, product_ids in targets:
+            levels_by_store[store][shopify_location_id] = {
+                product_id: quantities[location][product_id] for product_id in product_ids
+            }
+        if levels_by_store:
+            self.env['shopify.store']._push_inventory_levels(dict(levels_by_store))
+
     def _should_skip_shopify_sync(self):
         """
         Determine if Shopify sync should be skipped.
         Returns True to skip sync, False to proceed.
+
+        Changes applied from Shopify are not skipped here: they run in a
+        ``shopify_sync_batch`` with origin ``'shopify'``, which leaves their
+        source store out of the push. ``shopify.sync.state`` is not consulted.
         """
         if self.env.context.get('from_shopify', False):
             _logger.debug("Skipping Shopify sync: Update originated from Shopify.")
@@ -65,9 +98,4 @@ class StockQuant(models.Model):
             _logger.debug("Skipping Shopify sync: Update from order processing or stock move.")
             return True
 
-        product = self.product_id
-        if product and product.last_update_source == 'shopify':
-            _logger.debug(f"Skipping Shopify sync: Last update for {product.default_code} was from Shopify.")
-            return True
-
-        return False
\ No newline at end of file
+        return False
@@ -0,0 +1,6 @@
+from . import async_client
+from . import json_stream
+from . import metrics
+from . import retention
+from . import sync_batch
+from . import sync_logging
@@ -0,0 +1,99 @@
+"""Concurrent outbound Shopify calls on asyncio and httpx.
+
+Batched operations describe their calls up front, send them with
+:func:`run_calls` and process the responses afterwards, so the ORM is only
+touched by the calling thread and never while requests are in flight.
+httpx is optional: without it the calls go out one by one through
+``shopify.store._shopify_request``, which is how the module worked before.
+"""
+import asyncio
+import logging
+import time
+
+from . import metrics
+
+_logger = logging.getLogger(__name__)
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+try:
+    import h2  # noqa: F401 -- lets httpx multiplex the calls of a store over one HTTP/2 connection
+    HTTP2 = True
+except ImportError:
+    HTTP2 = False
+
+# Calls in flight at once per store.
+STORE_CONCURRENCY = 4
+
+# Share of the store's REST call budget above which new calls wait for it to drain.
+BUDGET_HIGH_WATER = 0.8
+
+# Number of times a call is re-sent after Shopify answers 429 Too Many Requests.
+THROTTLE_RETRIES = 3
+
+TIMEOUT = 30
+
+
+def run_calls(env, calls):
+    """Send ``calls`` concurrently and return their responses, in order.
+
+    Each call is ``(store, method, url, entity, kwargs)``, with the same
+    arguments as ``store._shopify_request``. Calls to one store are limited to
+    ``STORE_CONCURRENCY`` at a time and slow down when the store's call
+    budget runs low; different stores proceed independently. A call that
+    failed to get a response has its exception in place of the response.
+    """
+    if not calls:
+        return []
+    if httpx is None:
+        results = []
+        for store, method, url, entity, kwargs in calls:
+            try:
+                results.append(store._shopify_request(method, url, entity, **kwargs))
+            except Exception as e:
+                results.append(e)
+        return results
+    # Only plain values cross into the event loop.
+    plain = [(store.id, method, url, entity, kwargs) for store, method, url, entity, kwargs in calls]
+    return asyncio.run(_run(env, plain))
+
+
+async def _run(env, calls):
+    semaphores = {}
+    async with httpx.AsyncClient(http2=HTTP2, timeout=TIMEOUT, follow_redirects=True) as client:
+        return await asyncio.gather(*[
+            _send(env, client, semaphores.setdefault(store_id, asyncio.Semaphore(STORE_CONCURRENCY)),
+                  store_id, method, url, entity, kwargs)
+            for store_id, method, url, entity, kwargs in calls
+        ], return_exceptions=True)
+
+
+async def _send(env, client, semaphore, store_id, method, url, entity, kwargs):
+    async with semaphore:
+        for attempt in range(THROTTLE_RETRIES + 1):
+            used, limit = metrics.api_budget(env, store_id)
+            if used and limit and used >= BUDGET_HIGH_WATER * limit:
+                # The REST bucket drains by about two calls per second.
+                await asyncio.sleep(0.5)
+            start = time.monotonic()
+            try:
+                response = await client.request(method, url, **kwargs)
+            except httpx.HTTPError:
+                metrics.inc(env, 'api_errors', store_id, entity)
+                raise
+            finally:
+                metrics.inc(env, 'api_calls', store_id, entity)
+                metrics.observe(env, 'api_latency', store_id, entity, time.monotonic() - start)
+            metrics.note_api_budget(env, store_id, response.headers.get('X-Shopify-Shop-Api-Call-Limit'))
+            if response.status_code != 429 or attempt == THROTTLE_RETRIES:
+                break
+            wait = float(response.headers.get('Retry-After', 2))
+            metrics.observe(env, 'throttle_wait', store_id, entity, wait)
+            _logger.debug("Shopify throttled store %s, waiting %ss", store_id, wait)
+            await asyncio.sleep(wait)
+    if response.status_code >= 400:
+        metrics.inc(env, 'api_errors', store_id, entity)
+    return response
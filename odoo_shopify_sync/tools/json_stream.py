@@ -0,0 +1,24 @@
+import io
+import logging
+
+_logger = logging.getLogger(__name__)
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+    _logger.info("ijson is not installed; Shopify pages will be decoded in one piece.")
+
+
+def iter_json_records(response, key):
+    """Yield the items of the top-level ``key`` array of a Shopify response one at a time.
+
+    The body is buffered as bytes so the connection is released before the
+    records are processed, but only one record at a time is turned into Python
+    objects, which is where a full ``response.json()`` spends its memory.
+    Falls back to ``response.json()`` when ijson is not available.
+    """
+    if ijson is None:
+        yield from response.json().get(key, [])
+        return
+    yield from ijson.items(io.BytesIO(response.content), f'{key}.item', use_float=True)
@@ -0,0 +1,172 @@
+import logging
+import threading
+import time
+from datetime import datetime
+from functools import wraps
+
+from odoo import SUPERUSER_ID, api, models
+
+_logger = logging.getLogger(__name__)
+
+# Upper bounds, in seconds, of the latency histogram buckets.
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# How often each worker process writes its buffered metrics to the database.
+FLUSH_INTERVAL = 60
+
+# metric name -> (kind, help text). Histograms are recorded in seconds.
+METRICS = {
+    'api_calls': ('counter', 'Shopify API requests sent'),
+    'api_errors': ('counter', 'Shopify API requests that failed or returned an error status'),
+    'api_latency': ('histogram', 'Shopify API request latency'),
+    'throttle_wait': ('histogram', 'Time spent waiting after Shopify 429 responses'),
+    'sql_queries': ('counter', 'SQL queries issued by sync methods'),
+    'sync_duration': ('histogram', 'Duration of single-record sync methods'),
+    'fetch_duration': ('histogram', 'Duration of paginated fetch runs'),
+    'sync_errors': ('counter', 'Sync methods that raised'),
+    'records_synced': ('counter', 'Shopify records synced'),
+    'records_skipped': ('counter', 'Shopify records skipped'),
+    'db_retries': ('counter', 'Transactions retried after a serialization or connection error'),
+    'webhook_duration': ('histogram', 'Webhook request handling time'),
+    'queue_depth': ('gauge', 'Items waiting to be processed'),
+}
+
+
+class MetricsBuffer:
+    """Process-local buffer of sync metrics, periodically added to ``shopify.sync.metric``.
+
+    Each Odoo worker only sees its own calls, so the buffer is flushed into
+    hourly rows in the database where all workers' numbers add up; the
+    Prometheus endpoint and the dashboard both read from there.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buffers = {}
+        self._last_flush = {}
+
+    def _bucket(self, dbname, metric, store_id, entity, bucket=''):
+        hour = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+        values = self._buffers.setdefault(dbname, {})
+        key = (hour, store_id or None, entity or '', metric, bucket)
+        if key not in values:
+            values[key] = [0, 0.0, 0.0]
+        return values[key]
+
+    def inc(self, dbname, metric, store_id, entity, value=1):
+        """Add ``value`` to a counter."""
+        with self._lock:
+            self._bucket(dbname, metric, store_id, entity)[0] += value
+
+    def observe(self, dbname, metric, store_id, entity, seconds):
+        """Record one histogram observation."""
+        with self._lock:
+            row = self._bucket(dbname, metric, store_id, entity)
+            row[0] += 1
+            row[1] += seconds
+            row[2] = max(row[2], seconds)
+            for bound in LATENCY_BUCKETS:
+                if seconds <= bound:
+                    self._bucket(dbname, metric, store_id, entity, str(bound))[0] += 1
+
+    def gauge(self, dbname, metric, store_id, entity, value):
+        """Set the current value of a gauge."""
+        with self._lock:
+            row = self._bucket(dbname, metric, store_id, entity)
+            row[0] = 1
+            row[1] = value
+            row[2] = max(row[2], value)
+
+    def flush_if_due(self, registry):
+        if time.monotonic() - self._last_flush.get(registry.db_name, 0) >= FLUSH_INTERVAL:
+            self.flush(registry)
+
+    def flush(self, registry):
+        """Add the buffered values of ``registry``'s database to the hourly metric rows."""
+        with self._lock:
+            values = self._buffers.pop(registry.db_name, None)
+            self._last_flush[registry.db_name] = time.monotonic()
+        if not values:
+            return
+        try:
+            with registry.cursor() as cr:
+                env = api.Environment(cr, SUPERUSER_ID, {})
+                env['shopify.sync.metric']._upsert_buffer(values)
+        except Exception as e:
+            # Metrics must never break a sync; losing one interval is acceptable.
+            _logger.warning("Could not flush %s Shopify sync metrics: %s", len(values), e)
+
+
+buffer = MetricsBuffer()
+
+
+def inc(env, metric, store_id, entity, value=1):
+    buffer.inc(env.cr.dbname, metric, store_id, entity, value)
+
+
+def observe(env, metric, store_id, entity, seconds):
+    buffer.observe(env.cr.dbname, metric, store_id, entity, seconds)
+
+
+def gauge(env, metric, store_id, entity, value):
+    buffer.gauge(env.cr.dbname, metric, store_id, entity, value)
+
+
+def flush_if_due(env):
+    buffer.flush_if_due(env.registry)
+
+
+# (dbname, store_id) -> (calls used, bucket size) from the latest API response of this process.
+_api_budgets = {}
+
+
+def note_api_budget(env, store_id, header):
+    """Remember the ``X-Shopify-Shop-Api-Call-Limit`` header (``"32/40"``) of a response."""
+    try:
+        used, limit = (int(part) for part in header.split('/'))
+    except (AttributeError, ValueError):
+        return
+    _api_budgets[env.cr.dbname, store_id] = (used, limit)
+
+
+def api_budget(env, store_id):
+    """Return ``(used, limit)`` of the last seen API call budget of a store, or ``(None, None)``."""
+    return _api_budgets.get((env.cr.dbname, store_id), (None, None))
+
+
+def _find_store(record, args):
+    for arg in args:
+        if isinstance(arg, models.BaseModel) and arg._name == 'shopify.store':
+            return arg
+    if record._name == 'shopify.store' and len(record) == 1:
+        return record
+    return None
+
+
+def instrument(entity, metric='sync_duration'):
+    """Record duration, SQL query count and failures of a sync method.
+
+    The store label is taken from the first ``shopify.store`` argument, or
+    from the record itself when the method is called on a single store.
+    Apply it below ``retry_on_db_errors`` so the counts are taken on the
+    cursor the method actually runs on.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(self, *args, **kwargs):
+            store = _find_store(self, args)
+            store_id = store.id if store else None
+            cr = self.env.cr
+            queries = cr.sql_log_count
+            start = time.monotonic()
+            try:
+                return func(self, *args, **kwargs)
+            except Exception:
+                inc(self.env, 'sync_errors', store_id, entity)
+                raise
+            finally:
+                observe(self.env, metric, store_id, entity, time.monotonic() - start)
+                inc(self.env, 'sql_queries', store_id, entity, cr.sql_log_count - queries)
+                flush_if_due(self.env)
+        return wrapper
+    return decorator
@@ -0,0 +1,62 @@
+import logging
+from datetime import datetime, timedelta
+
+_logger = logging.getLogger(__name__)
+
+# Rows removed per DELETE statement; each chunk is committed on its own.
+CHUNK_SIZE = 5000
+
+# ir.config_parameter key -> retention in days used when the key is not set.
+RETENTION_DAYS = {
+    'odoo_shopify_sync.log_retention_days': 90,
+    'odoo_shopify_sync.history_retention_days': 30,
+    'odoo_shopify_sync.metric_retention_days': 90,
+    'odoo_shopify_sync.drift_retention_days': 30,
+    'odoo_shopify_sync.job_retention_days': 7,
+}
+
+
+def retention_cutoff(env, key):
+    """Return the UTC datetime before which rows covered by ``key`` expire.
+
+    Returns None when the parameter is set to 0 or less, which keeps the
+    rows forever.
+    """
+    value = env['ir.config_parameter'].sudo().get_param(key, RETENTION_DAYS[key])
+    try:
+        days = int(value)
+    except (TypeError, ValueError):
+        _logger.warning("Invalid retention %r for %s, using %s days", value, key, RETENTION_DAYS[key])
+        days = RETENTION_DAYS[key]
+    if days <= 0:
+        return None
+    return datetime.utcnow() - timedelta(days=days)
+
+
+def delete_in_chunks(env, table, where, params, chunk_size=CHUNK_SIZE):
+    """Delete the rows of ``table`` matching the SQL condition ``where``.
+
+    Rows go in chunks of ``chunk_size``, each in its own committed
+    transaction, so a large backlog never holds long locks, bloats one
+    transaction or loads records into memory. Rows locked by another
+    transaction are left for the next run. ORM caches are invalidated
+    afterwards. Returns the number of deleted rows.
+    """
+    total = 0
+    while True:
+        env.cr.execute(f"""
+            DELETE FROM {table}
+             WHERE id IN (SELECT id FROM {table}
+                           WHERE {where}
+                           LIMIT %s
+                             FOR UPDATE SKIP LOCKED)
+        """, [*params, chunk_size])
+        deleted = env.cr.rowcount
+        env.cr.commit()
+        total += deleted
+        if deleted < chunk_size:
+            break
+    if total:
+        env.invalidate_all()
+        _logger.info("Deleted %s expired rows from %s", total, table)
+    return total
@@ -0,0 +1,66 @@
+import logging
+import threading
+from contextlib import contextmanager
+
+_logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+
+class SyncBatch:
+    """Quant changes collected while a :func:`shopify_sync_batch` block runs."""
+
+    __slots__ = ('origin', 'source_store_id', 'pending')
+
+    def __init__(self, origin, source_store_id=None):
+        self.origin = origin
+        self.source_store_id = source_store_id
+        # (product_id, location_id) pairs, in the order they were first touched.
+        self.pending = {}
+
+    def add(self, pairs):
+        for pair in pairs:
+            self.pending.setdefault(pair, None)
+
+
+def _stack(env):
+    stacks = _local.__dict__.setdefault('stacks', {})
+    return stacks.setdefault(env.cr.dbname, [])
+
+
+def current_batch(env):
+    """Return the innermost open batch of this thread for ``env``'s database, if any."""
+    stack = _stack(env)
+    return stack[-1] if stack else None
+
+
+@contextmanager
+def shopify_sync_batch(env, origin='odoo', source_store=None):
+    """Defer the Shopify pushes triggered by ``stock.quant`` changes until the block exits.
+
+    Each product and location touched in the block is pushed once when it
+    ends, with its final quantity. With ``origin='shopify'`` the block applies
+    quantities that came from Shopify and the pushes are dropped instead, or,
+    when ``source_store`` is given, only sent to the other stores. Nested
+    batches hand their products to the enclosing one, and nothing is pushed
+    when the block raises. The batch is kept per thread, so it survives the
+    commits done inside the block.
+    """
+    stack = _stack(env)
+    batch = SyncBatch(origin, source_store.id if source_store else None)
+    stack.append(batch)
+    try:
+        yield batch
+    finally:
+        stack.pop()
+
+    if origin == 'shopify':
+        if batch.pending and batch.source_store_id:
+            env['stock.quant']._sync_quantities_to_shopify(
+                list(batch.pending), exclude_store_ids=[batch.source_store_id])
+        elif batch.pending:
+            _logger.debug("Dropped %s Shopify-originated quantity pushes", len(batch.pending))
+    elif stack:
+        stack[-1].add(batch.pending)
+    elif batch.pending:
+        env['stock.quant']._sync_quantities_to_shopify(list(batch.pending))
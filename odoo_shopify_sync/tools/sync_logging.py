@@ -0,0 +1,95 @@
+import itertools
+import logging
+import time
+from collections import defaultdict
+
+from . import metrics
+
+
+class _EventFields:
+    """Render event fields as ``key=value`` pairs, only when a handler formats the record."""
+
+    __slots__ = ('fields',)
+
+    def __init__(self, fields):
+        self.fields = fields
+
+    def __str__(self):
+        return ' '.join(f'{key}={value}' for key, value in self.fields.items())
+
+
+def log_event(logger, level, event, **fields):
+    """Log a structured sync event.
+
+    Nothing is formatted unless ``level`` is enabled for ``logger``. The raw
+    fields are attached to the record as ``shopify_event``/``shopify_fields``
+    so JSON handlers can emit them without parsing the message.
+    """
+    if logger.isEnabledFor(level):
+        logger.log(level, "%s %s", event, _EventFields(fields),
+                   extra={'shopify_event': event, 'shopify_fields': fields})
+
+
+_sample_counters = defaultdict(itertools.count)
+
+
+def log_sampled(logger, event, sample_rate=100, **fields):
+    """Log a per-record event at INFO once every ``sample_rate`` occurrences, at DEBUG otherwise."""
+    if sample_rate and next(_sample_counters[event]) % sample_rate == 0:
+        level = logging.INFO
+    else:
+        level = logging.DEBUG
+    if logger.isEnabledFor(level):
+        log_event(logger, level, event, **fields)
+
+
+class PageStats:
+    """Accumulate per-record outcomes of one fetched page and log them as a single summary.
+
+    Individual records go through :func:`log_sampled`, so long runs still
+    show progress at the default log level without one line per record.
+    """
+
+    def __init__(self, logger, entity, store, sample_rate=100):
+        self.logger = logger
+        self.entity = entity
+        self.store = store
+        self.sample_rate = sample_rate
+        self.page = 0
+        self.total = 0
+        self.run_counts = {}
+        self._reset_page()
+
+    def _reset_page(self):
+        self.counts = {}
+        self.started = time.monotonic()
+
+    def run_totals(self):
+        """Return ``(synced, skipped)`` over the whole run so far."""
+        return self.run_counts.get('synced', 0), self.total - self.run_counts.get('synced', 0)
+
+    def record(self, outcome, record_id):
+        """Count one record and log it, sampled at INFO and in full at DEBUG."""
+        self.counts[outcome] = self.counts.get(outcome, 0) + 1
+        self.run_counts[outcome] = self.run_counts.get(outcome, 0) + 1
+        self.total += 1
+        metrics.inc(self.store.env, f'records_{outcome}', self.store.id, self.entity)
+        log_sampled(self.logger, f'{self.entity}.{outcome}', self.sample_rate,
+                    store=self.store.id, id=record_id, total=self.total)
+
+    def flush_page(self):
+        """Log the summary of the current page and start a new one."""
+        self.page += 1
+        records = sum(self.counts.values())
+        elapsed = time.monotonic() - self.started
+        log_event(self.logger, logging.INFO, f'{self.entity}.page',
+                  store=self.store.id, page=self.page, records=records,
+                  seconds=round(elapsed, 3),
+                  per_second=round(records / elapsed, 1) if elapsed else records,
+                  **self.counts)
+        self._reset_page()
+
+    def flush_run(self):
+        """Log the summary of the whole run."""
+        log_event(self.logger, logging.INFO, f'{self.entity}.run',
+                  store=self.store.id, pages=self.page, records=self.total)